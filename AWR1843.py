@@ -1,11 +1,16 @@
 import serial
+import threading
 import time
 import numpy as np
 import platform
+from Profiler import profiler
 
 byteBuffer = np.zeros(2**15, dtype="uint8")
 byteBufferLength = 0
 
+# Serialises the access to the CLI port of the radar, shared by the threads reconfiguring it
+cliLock = threading.RLock()
+
 
 def serialConfig(configFileName):
     """
@@ -21,6 +26,27 @@ def serialConfig(configFileName):
 
     """
 
+    CLIport, Dataport = openPorts()
+
+    # Read configuration data from the file and send it to the radar
+    config = [line.rstrip("\r\n") for line in open(configFileName)]
+    sendConfig(CLIport, config)
+
+    # Return the configured serial ports
+    return CLIport, Dataport
+
+
+def openPorts():
+    """
+    Open the serial ports of the radar, e.g. again after the sensor was reset or unplugged.
+
+    Returns:
+        tuple: A tuple containing:
+            - CLIport (Serial): The serial port for configuration.
+            - Dataport (Serial): The serial port for data transmission.
+
+    """
+
     # Define global variables to store serial ports
     global CLIport
     global Dataport
@@ -34,17 +60,27 @@ def serialConfig(configFileName):
         CLIport = serial.Serial("COM4", 115200)
         Dataport = serial.Serial("COM3", 921600)
 
-    # Read configuration data from the file and send it to the radar
-    config = [line.rstrip("\r\n") for line in open(configFileName)]
+    return CLIport, Dataport
 
-    for i in config:
-        # Write each line from the configuration file to the CLI port
-        CLIport.write((i + "\n").encode())
-        # Add a short delay to allow time for the radar to process the command
-        time.sleep(0.01)
 
-    # Return the configured serial ports
-    return CLIport, Dataport
+def sendConfig(CLIport, config):
+    """
+    Send configuration commands to the radar.
+
+    The commands are sent while holding cliLock, so the configurations sent by several threads (e.g. the
+    RadarController, the ScenarioWatcher and the recovery of the SensorWatchdog) are never interleaved.
+
+    Parameters:
+        CLIport (Serial): The serial port for configuration.
+        config (list): The configuration commands, one per line.
+
+    """
+    with cliLock:
+        for i in config:
+            # Write each line from the configuration file to the CLI port
+            CLIport.write((i + "\n").encode())
+            # Add a short delay to allow time for the radar to process the command
+            time.sleep(0.01)
 
 
 def parseConfigFile(configFileName, numRxAnt=1, numTxAnt=1):
@@ -59,13 +95,29 @@ def parseConfigFile(configFileName, numRxAnt=1, numTxAnt=1):
     Returns:
         dict: A dictionary containing radar configuration parameters.
 
+    """
+    config = [line.rstrip("\r\n") for line in open(configFileName)]
+    return parseConfigLines(config, numRxAnt=numRxAnt, numTxAnt=numTxAnt)
+
+
+def parseConfigLines(config, numRxAnt=1, numTxAnt=1):
+    """
+    Parse configuration commands for radar parameters.
+
+    Parameters:
+        config (list): The configuration commands, one per line.
+        numRxAnt (int): Number of receiving antennas (default is 1).
+        numTxAnt (int): Number of transmitting antennas (default is 1).
+
+    Returns:
+        dict: A dictionary containing radar configuration parameters.
+
     """
 
     # Initialize an empty dictionary to store radar configuration parameters
     configParameters = {}
 
-    # Read the configuration file and process each line
-    config = [line.rstrip("\r\n") for line in open(configFileName)]
+    # Process each line of the configuration
     for i in config:
         # Split each line by space to extract information
         splitWords = i.split(" ")
@@ -120,11 +172,58 @@ def parseConfigFile(configFileName, numRxAnt=1, numTxAnt=1):
     configParameters["maxVelocity"] = 3e8 / (
         4 * startFreq * 1e9 * (idleTime + rampEndTime) * 1e-6 * numTxAnt
     )
+    configParameters["framePeriodicity"] = framePeriodicity
 
     # Return the dictionary containing radar configuration parameters
     return configParameters
 
 
+def parseFovConfig(configFileName):
+    """
+    Parse the field of view of the radar from the configuration file.
+
+    Parameters:
+        configFileName (str): The path to the configuration file.
+
+    Returns:
+        tuple: A tuple containing:
+            - thetamin (float): The minimum azimuth angle in degrees (aoaFovCfg).
+            - thetamax (float): The maximum azimuth angle in degrees (aoaFovCfg).
+            - maxdistance (float): The maximum range in meters (first cfarFovCfg).
+
+    """
+    config = [line.rstrip("\r\n") for line in open(configFileName)]
+    return parseFovLines(config)
+
+
+def parseFovLines(config):
+    """
+    Parse the field of view of the radar from configuration commands.
+
+    Parameters:
+        config (list): The configuration commands, one per line.
+
+    Returns:
+        tuple: A tuple containing:
+            - thetamin (float): The minimum azimuth angle in degrees (aoaFovCfg).
+            - thetamax (float): The maximum azimuth angle in degrees (aoaFovCfg).
+            - maxdistance (float): The maximum range in meters (first cfarFovCfg).
+
+    """
+    first_FovCfg = True
+    for i in config:
+        if i.startswith("aoaFovCfg"):
+            _, _, thetamin, thetamax, _, _ = i.split(" ")
+            thetamax = float(thetamax)
+            thetamin = float(thetamin)
+        if i.startswith("cfarFovCfg") and first_FovCfg:
+            first_FovCfg = False
+            _, _, _, _, maxdistance = i.split(" ")
+            maxdistance = float(maxdistance)
+
+    return thetamin, thetamax, maxdistance
+
+
 def readAndParseData18xx_3d(Dataport, configParameters):
     """
     Read and parse incoming data in 3D format.
@@ -338,25 +437,46 @@ def readAndParseData18xx_3d(Dataport, configParameters):
     return dataOK, frameNumber, detObj
 
 
-def readAndParseData18xx_2d(Dataport, configParameters):
+def dropPacket():
+    """
+    Drop the packet at the start of the byte buffer, e.g. after it failed to be parsed.
+
+    Only its magic word is removed: the next call of readAndParseData18xx_2d searches the following one
+    and removes the rest of the packet before it.
+    """
+    global byteBuffer, byteBufferLength
+
+    shiftSize = min(8, byteBufferLength)
+    byteBuffer[: byteBufferLength - shiftSize] = byteBuffer[shiftSize:byteBufferLength]
+    byteBuffer[byteBufferLength - shiftSize :] = 0
+    byteBufferLength = byteBufferLength - shiftSize
+
+
+def readAndParseData18xx_2d(Dataport, configParameters, out=None, header=None):
     """
     Read and parse incoming data in 2D format.
 
     Parameters:
         Dataport (Serial): The serial port for data reception.
         configParameters (dict): Radar configuration parameters.
+        out (dict): Optional preallocated float32 arrays ("x", "y", "z", "velocity") to write the
+                    detected points into, in which case the arrays of detObj are views of them.
+        header (dict): Optional dictionary receiving the "frameNumber" and "numDetectedObj" of the packet
+                       processed, if any, including the packets without detected points (dataOK is 0 then).
 
     Returns:
         tuple: A tuple containing:
             - dataOK (bool): Indicates if data was read correctly.
             - frameNumber (int): The frame number.
-            - detObj (dict): A dictionary containing detected object information.
+            - detObj (dict): A dictionary containing detected object information, with the SNR of
+                             the objects in dB ("snr") when the radar sends their side information.
 
     """
     global byteBuffer, byteBufferLength
 
     # Constants
     MMWDEMO_UART_MSG_DETECTED_POINTS = 1
+    MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO = 7
     maxBufferSize = 2**15
     magicWord = [2, 1, 4, 3, 6, 5, 8, 7]
 
@@ -379,6 +499,7 @@ def readAndParseData18xx_2d(Dataport, configParameters):
         byteBufferLength = byteBufferLength + byteCount
 
     # Check if the buffer has some data
+    syncStart = time.perf_counter()
     if byteBufferLength > 16:
         # Check for all possible locations of the magic word
         possibleLocs = np.where(byteBuffer == magicWord[0])[0]
@@ -415,6 +536,7 @@ def readAndParseData18xx_2d(Dataport, configParameters):
             # Check if the entire packet has been read
             if (byteBufferLength >= totalPacketLen) and (byteBufferLength != 0):
                 magicOK = 1
+    profiler.record("sync", syncStart, time.perf_counter())
 
     # If magicOK is 1 then process the message
     if magicOK:
@@ -443,6 +565,9 @@ def readAndParseData18xx_2d(Dataport, configParameters):
         idX += 4
         subFrameNumber = np.matmul(byteBuffer[idX : idX + 4], word)
         idX += 4
+        if header is not None:
+            header["frameNumber"] = int(frameNumber)
+            header["numDetectedObj"] = int(numDetectedObj)
 
         # Read the TLV messages
         for tlvIdx in range(numTLVs):
@@ -457,24 +582,30 @@ def readAndParseData18xx_2d(Dataport, configParameters):
 
             # Read the data depending on the TLV message
             if tlv_type == MMWDEMO_UART_MSG_DETECTED_POINTS:
-                # Initialize the arrays
-                x = np.zeros(numDetectedObj, dtype=np.float32)
-                y = np.zeros(numDetectedObj, dtype=np.float32)
-                z = np.zeros(numDetectedObj, dtype=np.float32)
-                velocity = np.zeros(numDetectedObj, dtype=np.float32)
-
-                for objectNum in range(numDetectedObj):
-                    # Read the data for each object
-                    x[objectNum] = byteBuffer[idX : idX + 4].view(dtype=np.float32)
-                    idX += 4
-                    y[objectNum] = byteBuffer[idX : idX + 4].view(dtype=np.float32)
-                    idX += 4
-                    z[objectNum] = byteBuffer[idX : idX + 4].view(dtype=np.float32)
-                    idX += 4
-                    velocity[objectNum] = byteBuffer[idX : idX + 4].view(
-                        dtype=np.float32
-                    )
-                    idX += 4
+                # View the x, y, z and velocity of every object as one row of float32
+                points = byteBuffer[idX : idX + 16 * numDetectedObj].view(
+                    dtype=np.float32
+                )
+                points = points.reshape(numDetectedObj, 4)
+                idX += 16 * numDetectedObj
+
+                if out is None:
+                    # Copy the data, the byte buffer is reused for the next packets
+                    x = points[:, 0].copy()
+                    y = points[:, 1].copy()
+                    z = points[:, 2].copy()
+                    velocity = points[:, 3].copy()
+                else:
+                    # Write the data in place, dropping the objects that do not fit
+                    numDetectedObj = min(numDetectedObj, len(out["x"]))
+                    x = out["x"][:numDetectedObj]
+                    y = out["y"][:numDetectedObj]
+                    z = out["z"][:numDetectedObj]
+                    velocity = out["velocity"][:numDetectedObj]
+                    x[:] = points[:numDetectedObj, 0]
+                    y[:] = points[:numDetectedObj, 1]
+                    z[:] = points[:numDetectedObj, 2]
+                    velocity[:] = points[:numDetectedObj, 3]
 
                 # Store the data in the detObj dictionary
                 detObj = {
@@ -485,9 +616,22 @@ def readAndParseData18xx_2d(Dataport, configParameters):
                     "velocity": velocity,
                 }
                 dataOK = 1
+            elif tlv_type == MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO and "x" in detObj:
+                # View the SNR and noise of every object (in 0.1 dB) as one row of int16
+                sideInfo = byteBuffer[idX : idX + tlv_length].view(dtype=np.int16)
+                sideInfo = sideInfo.reshape(-1, 2)[: detObj["numObj"]]
+                detObj["snr"] = sideInfo[:, 0] * np.float32(0.1)
+                idX += tlv_length
+            else:
+                # Skip the other messages (range profile, heat maps, statistics)
+                idX += tlv_length
+
+        # The messages of a corrupt packet, e.g. with a wrong number of objects, overrun its length
+        if idX > totalPacketLen:
+            raise ValueError("packet %d is corrupt, its messages overrun its length" % frameNumber)
 
         # Remove already processed data
-        if idX > 0 and byteBufferLength > idX:
+        if idX > 0 and byteBufferLength >= idX:
             shiftSize = totalPacketLen
 
             byteBuffer[: byteBufferLength - shiftSize] = byteBuffer[
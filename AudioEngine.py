@@ -0,0 +1,243 @@
+import threading
+import time
+import numpy as np
+import pygame
+from Profiler import profiler
+
+
+class AudioEngine:
+    """
+    A streaming synthesizer playing any number of simultaneous voices through a single mixer channel.
+
+    The output is produced in fixed-size blocks: a few Sound objects are created once, and each block
+    is rendered in place in the samples of the next free one and queued on the channel, so no memory
+    is allocated and no thread is started per note. Every voice is an oscillator whose phase carries
+    over from one block to the next, and its amplitude is ramped over a block when it changes, so
+    changing the pitch or starting and stopping a note does not click.
+
+    Attributes:
+        sample_rate (int): Sample rate of the mixer in Hz.
+        block_size (int): Number of samples per block.
+        n_voices (int): Number of voices.
+        frequency (ndarray): Frequency of each voice in Hz.
+        amplitude (ndarray): Target amplitude of each voice (0 to 1).
+
+    Methods:
+        start: Start streaming the blocks to the mixer.
+        stop: Stop streaming and release the channel.
+        set_voice: Set the frequency, amplitude and speaker of a voice.
+        release: Silence a voice.
+        render: Render the next block of samples.
+    """
+
+    def __init__(
+        self, n_voices=8, block_size=1024, sample_rate=44100, n_buffers=3, oscillator=None, envelope=None
+    ):
+        """
+        Initialize the AudioEngine object, initializing the mixer if needed.
+
+        Parameters:
+            n_voices (int): Number of voices.
+            block_size (int): Number of samples per block.
+            sample_rate (int): Sample rate requested for the mixer in Hz, if it is not initialized yet.
+            n_buffers (int): Number of blocks rendered in advance.
+            oscillator (Wavetable): Optional oscillator computing the waveform of the voices from their
+                                    phases, None computes a sine.
+            envelope (ndarray): Optional gain of each sample applied from the start of every note, e.g. to
+                                play separate beeps (see Wavetable.envelope_table).
+        """
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(sample_rate, -16, 2)
+        self.sample_rate, _, self.n_channels = pygame.mixer.get_init()
+        self.block_size = block_size
+        self.n_voices = n_voices
+        self.oscillator = oscillator
+        self.envelope = envelope
+
+        # State of the voices
+        self.frequency = np.zeros(n_voices)
+        self.amplitude = np.zeros(n_voices)
+        self.current_amplitude = np.zeros(n_voices)
+        self.phase = np.zeros(n_voices)
+        self.gains = np.ones((self.n_channels, n_voices))
+        self.voice_envelopes = [None] * n_voices
+        self.envelope_position = [0] * n_voices
+        self.envelope_level = [1.0] * n_voices
+        self.envelope_start = [None] * n_voices
+
+        # Work buffers of a block
+        self.ramp = np.arange(block_size) / block_size
+        self.steps = np.arange(block_size, dtype=float)
+        self.wave = np.zeros((n_voices, block_size))
+        self.envelope_ramp = np.zeros((n_voices, block_size))
+        self.envelope_gain = np.zeros(block_size)
+        self.increment = np.zeros(n_voices)
+        self.delta = np.zeros(n_voices)
+        self.mix = np.zeros((self.n_channels, block_size))
+        self.block = np.zeros((block_size, self.n_channels), dtype=np.int16)
+        self.max_sample = 2**15 - 1
+
+        # Sounds whose samples are rendered in place, queued one after the other on the channel
+        self.sounds = [
+            pygame.mixer.Sound(buffer=self.block.tobytes()) for _ in range(n_buffers)
+        ]
+        self.samples = [pygame.sndarray.samples(sound) for sound in self.sounds]
+        self.next_sound = 0
+        self.channel = None
+        self.thread = None
+        self.stop_flag = False
+
+    def set_voice(self, voice, frequency, amplitude=1.0, speaker=None, envelope=None):
+        """
+        Set the frequency, amplitude and speaker of a voice, starting a new note.
+
+        The envelope of the new note is ramped over the first block from the gain the envelope of the voice
+        had reached, so restarting a voice that is still sounding does not click.
+
+        Parameters:
+            voice (int): Index of the voice.
+            frequency (float): Frequency in Hz.
+            amplitude (float): Amplitude (0 to 1).
+            speaker (str): Speaker to play the voice from ('l' for left, 'r' for right, None for both).
+            envelope (ndarray): Gain of each sample of the note, None uses the envelope of the engine.
+        """
+        self.envelope_start[voice] = self.envelope_level[voice]
+        self.envelope_position[voice] = 0
+        self.voice_envelopes[voice] = envelope if envelope is not None else self.envelope
+        self.frequency[voice] = frequency
+        self.amplitude[voice] = amplitude
+        if self.n_channels == 2:
+            self.gains[0, voice] = 0.0 if speaker == "r" else 1.0
+            self.gains[1, voice] = 0.0 if speaker == "l" else 1.0
+
+    def release(self, voice=None):
+        """
+        Silence a voice.
+
+        Parameters:
+            voice (int): Index of the voice, None silences all of them.
+        """
+        if voice is None:
+            self.amplitude[:] = 0.0
+        else:
+            self.amplitude[voice] = 0.0
+
+    def oscillate(self, phase, out):
+        """
+        Compute the waveform of the voices for their phases (in radians), with the oscillator if any.
+
+        Parameters:
+            phase (ndarray): The phase of each voice for each sample of the block.
+            out (ndarray): The buffer receiving the samples of each voice, may be phase itself.
+
+        Returns:
+            ndarray: out.
+        """
+        if self.oscillator is not None:
+            return self.oscillator(phase, out)
+        return np.sin(phase, out=out)
+
+    def render(self, out=None):
+        """
+        Render the next block of samples.
+
+        Parameters:
+            out (ndarray): The (block_size, n_channels) int16 buffer receiving the block,
+                           None uses a buffer owned by the engine.
+
+        Returns:
+            ndarray: The block.
+        """
+        if out is None:
+            out = self.block
+
+        # Phase of each voice for each sample, continuing from the end of the previous block
+        np.multiply(self.frequency, 2 * np.pi / self.sample_rate, out=self.increment)
+        np.multiply(self.increment[:, None], self.steps, out=self.wave)
+        self.wave += self.phase[:, None]
+        self.phase += self.increment * self.block_size
+        np.mod(self.phase, 2 * np.pi, out=self.phase)
+        self.oscillate(self.wave, out=self.wave)
+
+        # Ramp the amplitude of the voices from their previous value to the new one over the block
+        np.subtract(self.amplitude, self.current_amplitude, out=self.delta)
+        np.multiply(self.delta[:, None], self.ramp, out=self.envelope_ramp)
+        self.envelope_ramp += self.current_amplitude[:, None]
+        self.current_amplitude[:] = self.amplitude
+        self.wave *= self.envelope_ramp
+
+        # Apply the envelope of the notes from their start, holding its last gain once it is over
+        gain = self.envelope_gain
+        for voice, envelope in enumerate(self.voice_envelopes):
+            start = self.envelope_start[voice]
+            if envelope is None and start is None:
+                continue
+            if envelope is None:
+                gain[:] = 1.0
+            else:
+                position = self.envelope_position[voice]
+                n = max(0, min(self.block_size, len(envelope) - position))
+                gain[:n] = envelope[position : position + n]
+                gain[n:] = envelope[-1]
+                self.envelope_position[voice] = position + self.block_size
+            if start is not None:
+                # First block of a note: ramp from the gain reached by the previous one
+                gain -= start
+                gain *= self.ramp
+                gain += start
+                self.envelope_start[voice] = None
+            self.wave[voice] *= gain
+            self.envelope_level[voice] = gain[-1]
+
+        # Mix the voices of each speaker and convert to 16 bit samples
+        np.dot(self.gains, self.wave, out=self.mix)
+        np.clip(self.mix, -1.0, 1.0, out=self.mix)
+        self.mix *= self.max_sample
+        out[:] = self.mix.T
+        return out
+
+    def start(self):
+        """
+        Start streaming the blocks to the mixer in a separate thread.
+        """
+        self.channel = pygame.mixer.find_channel(True)
+        self.stop_flag = False
+
+        def stream():
+            """
+            Helper function keeping the queue of the channel filled.
+            """
+            block_duration = self.block_size / self.sample_rate
+            while not self.stop_flag:
+                if not self.channel.get_busy():
+                    self.channel.play(self.next_block())
+                elif self.channel.get_queue() is None:
+                    self.channel.queue(self.next_block())
+                else:
+                    time.sleep(block_duration / 4)
+
+        self.thread = threading.Thread(target=stream, name="AudioEngine", daemon=True)
+        self.thread.start()
+
+    def next_block(self):
+        """
+        Render the next block in the samples of the next free Sound.
+
+        Returns:
+            Sound: The Sound holding the block.
+        """
+        sound = self.sounds[self.next_sound]
+        with profiler.span("synth"):
+            self.render(out=self.samples[self.next_sound])
+        self.next_sound = (self.next_sound + 1) % len(self.sounds)
+        return sound
+
+    def stop(self):
+        """
+        Stop streaming and release the channel.
+        """
+        self.stop_flag = True
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        if self.channel is not None:
+            self.channel.stop()
@@ -0,0 +1,251 @@
+import numpy as np
+from matplotlib.colors import to_rgb
+from PIL import Image
+from Pipeline import Stage
+
+# Width of the car in meters, to scale its figure
+CAR_WIDTH = 1.8
+
+
+class BirdsEyeView:
+    """
+    A top-down view of the area behind the car, rasterising the accumulated points into a fixed-size image.
+
+    The points of each frame are added with np.add.at to an intensity image (uint8) of square cells of
+    scale x scale pixels, which decays at every frame, so it shows the points of the last frames fading
+    out. The contour of the obstacles is the closest cell of each column whose intensity reaches a
+    threshold. The view is composed into one RGB frame over a background rendered once, with the figure
+    of the car at the bottom, the rings of the levels and the edges of the sectors. Every step works on
+    preallocated arrays of the size of the image, so the cost of a frame is the same whatever the number
+    of points.
+
+    Attributes:
+        width (int): Width of the frame in pixels.
+        height (int): Height of the frame in pixels.
+        scale (int): Size of the cells of the intensity image in pixels.
+        cell_size (float): Size of a cell in meters.
+        intensity (ndarray): The decaying intensity of the points, shape (height, width) // scale, uint8.
+        frame (ndarray): The composed RGB frame, shape (height, width, 3), uint8.
+
+    Methods:
+        add: Decay the intensity and add the points of a frame.
+        contour: Find the closest obstacle of each column.
+        render: Compose the RGB frame.
+    """
+
+    def __init__(
+        self,
+        theta_grids,
+        r_distances,
+        imageFileName="car.jpg",
+        size=(320, 240),
+        scale=4,
+        decay=0.8,
+        gain=96,
+        threshold=128,
+        background="white",
+        point_color="tab:blue",
+        contour_color="red",
+        grid_color="lightgray",
+    ):
+        """
+        Initialize the BirdsEyeView object.
+
+        Parameters:
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            imageFileName (str): The path to the figure of the car.
+            size (tuple): Width and height of the frame in pixels, multiples of scale.
+            scale (int): Size of the cells of the intensity image in pixels.
+            decay (float): Factor applied to the intensity at every frame.
+            gain (int): Intensity added by each point.
+            threshold (int): Intensity from which a cell is part of an obstacle.
+            background (str): Color of the background.
+            point_color (str): Color of the cells of highest intensity.
+            contour_color (str): Color of the contour of the obstacles.
+            grid_color (str): Color of the rings of the levels and of the edges of the sectors.
+        """
+        self.width, self.height = size
+        if self.width % scale or self.height % scale:
+            raise ValueError("the width and height should be multiples of scale")
+        self.scale = scale
+        self.gain = gain
+        self.threshold = threshold
+        # Decay as a fixed point factor of 1/256, applied with integer operations
+        self.decay = int(round(decay * 256))
+        self.contour_color = np.array(to_rgb(contour_color)) * 255
+
+        # Figure of the car at the bottom, scaled to its width, the rest of the height showing the maximum distance
+        maxdistance = r_distances[-1]
+        car = Image.open(imageFileName).convert("RGB")
+        pixel_size = max(2 * maxdistance / self.width, 1.25 * maxdistance / self.height)
+        self.cell_size = pixel_size * scale
+        car_width = max(1, int(round(CAR_WIDTH / pixel_size)))
+        car_height = max(1, min(self.height // 5, car_width * car.height // car.width))
+        # The bumper is on the edge of a cell
+        car_height = -(-car_height // scale) * scale
+        car = np.asarray(car.resize((car_width, car_height)))
+        bumper_row = self.height - car_height
+        self.bumper_row = bumper_row // scale
+        self.center_col = self.width / 2 / scale
+
+        # Position of the center of every pixel behind the car, relative to the radar
+        cols = (np.arange(self.width) + 0.5 - self.width / 2) * pixel_size
+        rows = (bumper_row - np.arange(self.height) - 0.5) * pixel_size
+        lateral, depth = np.meshgrid(cols, rows)
+        distance = np.hypot(lateral, depth)
+        # Same angle as the sectors: 0 degrees points straight behind the car and the angles grow to the left
+        angle = np.degrees(np.arctan2(-lateral, depth))
+
+        # Background rendered once: the rings of the levels and the edges of the sectors within the field of view
+        self.base = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.base[:] = np.array(to_rgb(background)) * 255
+        behind = depth > 0
+        in_view = behind & (angle >= theta_grids[0]) & (angle <= theta_grids[-1])
+        grid = np.zeros((self.height, self.width), dtype=bool)
+        for r in r_distances[1:]:
+            grid |= in_view & (np.abs(distance - r) < pixel_size / 2)
+        for theta in theta_grids:
+            grid |= (
+                behind
+                & (distance <= maxdistance)
+                & (np.abs(np.radians(angle - theta)) * distance < pixel_size / 2)
+            )
+        self.base[grid] = np.array(to_rgb(grid_color)) * 255
+        left = int(round((self.width - car_width) / 2))
+        visible = car[:, max(0, -left) : self.width - left]
+        self.base[bumper_row:, max(0, left) : max(0, left) + visible.shape[1]] = visible
+        self.car_mask = np.zeros((self.height, self.width, 1), dtype=bool)
+        self.car_mask[bumper_row:] = True
+
+        # Look-up table of the color of each intensity, from the background to the color of the points
+        ramp = np.linspace(0.25, 1, 256)[:, None]
+        self.lut = np.round(
+            (1 - ramp) * np.array(to_rgb(background)) * 255 + ramp * np.array(to_rgb(point_color)) * 255
+        ).astype(np.uint8)
+
+        # Preallocated images, the frame and its mask being also viewed as blocks of scale x scale pixels
+        shape = (self.height // scale, self.width // scale)
+        self.intensity = np.zeros(shape, dtype=np.uint8)
+        self.work = np.zeros(shape, dtype=np.uint16)
+        self.occupied = np.zeros(shape, dtype=bool)
+        self.colors = np.zeros(shape + (3,), dtype=np.uint8)
+        self.empty = np.zeros(shape, dtype=bool)
+        self.show_base = np.zeros((self.height, self.width, 1), dtype=bool)
+        self.frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self.frame_blocks = self.frame.reshape(shape[0], scale, shape[1], scale, 3)
+        self.show_base_blocks = self.show_base.reshape(shape[0], scale, shape[1], scale)
+
+    def add(self, r, theta):
+        """
+        Decay the intensity and add the points of a frame.
+
+        Parameters:
+            r (ndarray): The ranges of the points in meters.
+            theta (ndarray): The angles of the points in degrees, as in the polar plot.
+        """
+        # Decay in a 16 bit work image, where the points are added without overflow
+        np.multiply(self.intensity, self.decay, out=self.work)
+        self.work >>= 8
+
+        angle = np.radians(theta)
+        cols = np.floor(self.center_col - r * np.sin(angle) / self.cell_size).astype(np.intp)
+        rows = np.floor(self.bumper_row - r * np.cos(angle) / self.cell_size).astype(np.intp)
+        width = self.intensity.shape[1]
+        inside = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < self.bumper_row)
+        # Several points may fall into the same cell, which np.add.at accumulates
+        np.add.at(self.work.reshape(-1), rows[inside] * width + cols[inside], self.gain)
+
+        # Saturate to the range of the intensity image
+        np.minimum(self.work, 255, out=self.work)
+        np.copyto(self.intensity, self.work, casting="unsafe")
+
+    def contour(self):
+        """
+        Find the closest obstacle of each column, the cell of highest row reaching the threshold.
+
+        Returns:
+            tuple: A tuple containing:
+                - rows (ndarray): The rows of the contour, in cells.
+                - cols (ndarray): The columns with an obstacle, in cells.
+        """
+        np.greater_equal(self.intensity, self.threshold, out=self.occupied)
+        # First occupied cell of each column going up from the car
+        closest = len(self.occupied) - 1 - np.argmax(self.occupied[::-1], axis=0)
+        cols = np.flatnonzero(self.occupied.any(axis=0))
+        return closest[cols], cols
+
+    def render(self):
+        """
+        Compose the RGB frame: the intensity through the look-up table, over the background and under the car.
+
+        Returns:
+            ndarray: The frame, reused by the next call.
+        """
+        # Color the cells, and blow them up to blocks of pixels by broadcasting
+        np.take(self.lut, self.intensity, axis=0, out=self.colors)
+        self.frame_blocks[:] = self.colors[:, None, :, None, :]
+        np.equal(self.intensity, 0, out=self.empty)
+        self.show_base_blocks[:] = self.empty[:, None, :, None]
+        self.show_base |= self.car_mask
+        np.copyto(self.frame, self.base, where=self.show_base)
+        rows, cols = self.contour()
+        self.frame_blocks[rows, :, cols] = self.contour_color
+        return self.frame
+
+
+class BirdsEyeRenderer(Stage):
+    """
+    Stage rasterising the filtered points of every frame into a BirdsEyeView and publishing the composed
+    frames on the "birds_eye" topic, for the DisplaySink or the sinks of the Renderer module.
+
+    Every frame of points is added, so the view accumulates all of them, but a single frame is composed
+    for the frames received since the last one. Each published frame is a new (height, width, 3) uint8
+    array. The view is rebuilt for the sectors and levels of a Scenario published on the "scenario" topic.
+    """
+
+    span_name = "draw"
+
+    def __init__(
+        self, bus, theta_grids, r_distances, imageFileName="car.jpg", size=(320, 240), topic="points"
+    ):
+        """
+        Initialize the BirdsEyeRenderer object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            imageFileName (str): The path to the figure of the car.
+            size (tuple): Width and height of the rendered frames in pixels.
+            topic (str): The topic of the filtered points, "points" or "motion_points".
+        """
+        super().__init__(bus)
+        self.size = size
+        self.view = BirdsEyeView(theta_grids, r_distances, imageFileName, size=size)
+        self.input = bus.subscribe(topic, depth=8)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+
+    def step(self):
+        """
+        Add the points received and publish the composed frame.
+        """
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.view = BirdsEyeView(
+                scenario.theta_grids,
+                scenario.r_distances,
+                scenario.imageFileName,
+                size=self.size,
+            )
+
+        frame = self.input.get(timeout=0.1)
+        if frame is None:
+            return
+        while frame is not None:
+            self.view.add(frame["r"], frame["theta"])
+            last = frame
+            frame = self.input.get(timeout=0)
+        self.bus.publish(
+            "birds_eye", {"frameNumber": last["frameNumber"], "image": self.view.render().copy()}
+        )
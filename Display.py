@@ -0,0 +1,93 @@
+from matplotlib import pyplot as plt
+from PolarView import PolarView, binned_with
+
+
+class DisplaySink:
+    """
+    A sink drawing the sector state as a polar bar plot over the figure of a car, in a matplotlib window.
+
+    It runs in the main thread, since matplotlib is not thread-safe, and only draws the latest
+    change of the sector state published on the bus, dropping the ones it had no time to draw.
+    Optionally, the frames of the BirdsEyeRenderer ("birds_eye" topic) are shown alongside it in a
+    second window, as a single image whose data is replaced at each update.
+
+    Methods:
+        update: Draw the latest sector state, if any.
+        pause: Let matplotlib process its events and redraw the figure.
+    """
+
+    def __init__(
+        self, bus, theta_grids, r_distances, colors, imageFileName="car.jpg", birds_eye=False
+    ):
+        """
+        Initialize the DisplaySink object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            colors (list): Color of each level.
+            imageFileName (str): The path to the figure of the car.
+            birds_eye (bool): Whether to show the bird's-eye view in a second window.
+        """
+        self.input = bus.subscribe("changes", depth=1)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+        # A reloaded scenario waiting for the binner to swap in its sectors and levels
+        self.scenario = None
+
+        # Create polar plot
+        self.figure = plt.figure()
+        self.view = PolarView(self.figure, theta_grids, r_distances, colors, imageFileName)
+
+        self.birds_eye_input = None
+        if birds_eye:
+            self.birds_eye_input = bus.subscribe("birds_eye", depth=1)
+            self.birds_eye_figure = plt.figure()
+            self.birds_eye_ax = self.birds_eye_figure.add_subplot()
+            self.birds_eye_ax.axis("off")
+            self.birds_eye_image = None
+
+    def update(self):
+        """
+        Draw the latest sector state, if any.
+        """
+        if self.birds_eye_input is not None:
+            frame = self.birds_eye_input.latest()
+            # A single image, created with the first frame, whose data is replaced by the next ones
+            if frame is not None and self.birds_eye_image is None:
+                self.birds_eye_image = self.birds_eye_ax.imshow(frame["image"])
+            elif frame is not None:
+                self.birds_eye_image.set_data(frame["image"])
+
+        state = self.input.latest()
+        if state is None:
+            return
+        # Redraw the plot for the sectors, levels and colors of a reloaded scenario, from the first state
+        # binned with them (the scenario is read after the state, as the binner swaps it in before)
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.scenario = scenario
+        if self.scenario is not None and binned_with(
+            state, self.scenario.theta_grids, self.scenario.r_distances
+        ):
+            self.figure.clear()
+            self.view = PolarView(
+                self.figure,
+                self.scenario.theta_grids,
+                self.scenario.r_distances,
+                self.scenario.colors,
+                self.scenario.imageFileName,
+            )
+            self.scenario = None
+        if binned_with(state, self.view.theta_grids, self.view.r_distances):
+            self.view.draw_state(state)
+
+    @staticmethod
+    def pause(interval=0.05):
+        """
+        Let matplotlib process its events and redraw the figure.
+
+        Parameters:
+            interval (float): Time to pause in seconds.
+        """
+        plt.pause(interval)
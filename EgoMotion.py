@@ -0,0 +1,218 @@
+import numpy as np
+import utils
+from Pipeline import Stage
+
+
+def ego_velocity_work(max_points, iterations=32):
+    """
+    Allocate the work buffers of estimate_ego_velocity for frames of up to max_points points.
+
+    The matrices are flat buffers whose front is viewed with the shape of each frame, so that they are
+    contiguous and the products of matrices neither copy nor buffer them.
+
+    Parameters:
+        max_points (int): Maximum number of points per frame.
+        iterations (int): Number of random pairs of points tried by the fit.
+
+    Returns:
+        dict: The work buffers.
+    """
+    return {
+        # The cosine and sine of the angle and the velocity of the points, as the rows of a matrix
+        "basis": np.empty(3 * max_points),
+        # The residuals of every model tried, then its inliers as ones and zeros, one row per model
+        "residuals": np.empty(iterations * max_points),
+        "inliers": np.empty(iterations * max_points, dtype=bool),
+        "values": np.empty(max_points),
+        "ones": np.ones(max_points),
+    }
+
+
+def estimate_ego_velocity(theta, velocity, iterations=32, threshold=0.1, rng=None, out=None, work=None):
+    """
+    Estimate the velocity of the vehicle from the Doppler velocity of the static points, with a vectorized RANSAC fit.
+
+    For a static point seen at the azimuth theta (from the boresight of the radar), the radial velocity
+    is vr = a * cos(theta) + b * sin(theta), where (a, b) is the opposite of the velocity of the radar.
+    RANSAC fits this model on all the candidate pairs of points at once, so moving points do not bias the estimate.
+
+    Parameters:
+        theta (ndarray): Angles of the points in degrees.
+        velocity (ndarray): Radial velocities of the points in m/s (negative when approaching).
+        iterations (int): Number of random pairs of points tried.
+        threshold (float): Maximum residual (in m/s) for a point to be considered static.
+        rng (Generator): Optional random number generator.
+        out (ndarray): Optional boolean buffer receiving the static mask, holding at least len(theta) elements.
+        work (dict): Optional work buffers built by ego_velocity_work for at least len(theta) points and
+                     as many iterations, with which no memory is allocated per point.
+
+    Returns:
+        tuple: A tuple containing:
+            - coefficients (ndarray): The fitted (a, b), zero if there are not enough points.
+            - static (ndarray): True for each point matching the model.
+
+    """
+    n = len(theta)
+    if out is None:
+        out = np.empty(n, dtype=bool)
+    if work is None:
+        work = ego_velocity_work(n, iterations)
+    static = out[:n]
+    values = work["values"][:n]
+    if n < 3:
+        # Not enough points to tell static from moving ones, assume the vehicle is stopped
+        np.less(np.abs(velocity, out=values), threshold, out=static)
+        return np.zeros(2), static
+    if rng is None:
+        rng = np.random.default_rng()
+
+    basis = work["basis"][: 3 * n].reshape(3, n)
+    cos, sin, v = basis
+    np.radians(theta, out=cos)
+    np.sin(cos, out=sin)
+    np.cos(cos, out=cos)
+    v[:] = velocity
+
+    # Solve the 2x2 system of every random pair of points at once, the pairs of a point with itself (or
+    # with a point of about the same angle) being left out. All the arrays of the pairs have the same
+    # size whatever the number of points and of pairs left out
+    pairs = rng.integers(0, n, size=(iterations, 2))
+    c, s, vr = cos[pairs], sin[pairs], v[pairs]
+    det = c[:, 0] * s[:, 1] - s[:, 0] * c[:, 1]
+    valid = np.abs(det) > 1e-3
+    if not valid.any():
+        np.less(np.abs(v, out=values), threshold, out=static)
+        return np.zeros(2), static
+    models = np.zeros((iterations, 3))
+    np.divide(vr[:, 0] * s[:, 1] - vr[:, 1] * s[:, 0], det, out=models[:, 0], where=valid)
+    np.divide(c[:, 0] * vr[:, 1] - c[:, 1] * vr[:, 0], det, out=models[:, 1], where=valid)
+    models[:, 2] = -1
+
+    # Keep the model with the most inliers, the residual of each point being a * cos + b * sin - v
+    residuals = work["residuals"][: iterations * n].reshape(iterations, n)
+    np.matmul(models, basis, out=residuals)
+    np.abs(residuals, out=residuals)
+    inliers = np.less(residuals, threshold, out=work["inliers"][: iterations * n].reshape(iterations, n))
+    # As ones and zeros, so the inliers of every model are counted by a product with a vector of ones
+    np.copyto(residuals, inliers)
+    counts = residuals @ work["ones"][:n]
+    counts[~valid] = -1
+    best = int(np.argmax(counts))
+    weights = residuals[best]
+
+    # Refine it with a least squares fit on its inliers, solving the normal equations of the fit, whose
+    # sums only take the inliers, so their points are not copied. The two points of the model are among
+    # its inliers and have different angles, so the equations have a single solution
+    np.multiply(cos, weights, out=values)
+    cc, cs, cv = float(values @ cos), float(values @ sin), float(values @ v)
+    np.multiply(sin, weights, out=values)
+    ss, sv = float(values @ sin), float(values @ v)
+    det = cc * ss - cs * cs
+    if det > 1e-12:
+        models[best, 0] = (cv * ss - cs * sv) / det
+        models[best, 1] = (cc * sv - cs * cv) / det
+    coefficients = models[best, :2]
+
+    np.matmul(models[best], basis, out=values)
+    np.less(np.abs(values, out=values), threshold, out=static)
+    return coefficients, static
+
+
+class EgoMotionFilter(Stage):
+    """
+    Filter stage estimating the reversing speed of the vehicle from the Doppler velocity of the static points,
+    labelling the points as static or moving and publishing them on the "motion_points" topic.
+
+    The published frame adds to the "points" frame the "static" mask of the points, the "ego_speed"
+    (positive when reversing towards the obstacles) and the "closing" speed of each point, i.e. the speed
+    at which the vehicle closes in on it. Moving points can optionally be discarded.
+
+    Like the CouplingFilter, the fit runs in preallocated work buffers and the arrays of the published
+    frames are written into preallocated buffers used in turn, so a frame does not allocate memory per point.
+    """
+
+    span_name = "ego_motion"
+
+    def __init__(
+        self,
+        bus,
+        drop_moving=False,
+        threshold=0.1,
+        seed=None,
+        iterations=32,
+        max_points=1024,
+        n_slots=32,
+    ):
+        """
+        Initialize the EgoMotionFilter object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            drop_moving (bool): Whether to discard the moving points.
+            threshold (float): Maximum difference (in m/s) from the fitted velocity for a point to be static.
+            seed (int): Optional seed of the random number generator of the fit.
+            iterations (int): Number of random pairs of points tried by the fit.
+            max_points (int): Maximum number of points per frame, further points are ignored.
+            n_slots (int): Number of buffers used in turn for the published frames.
+        """
+        super().__init__(bus)
+        self.drop_moving = drop_moving
+        self.threshold = threshold
+        self.rng = np.random.default_rng(seed)
+        self.iterations = iterations
+        self.max_points = max_points
+        self.work = ego_velocity_work(max_points, iterations)
+        self.index = np.empty(max_points, dtype=np.intp)
+        # The static mask and closing speed of the points, and their range, angle and velocity when the
+        # moving points are discarded
+        self.slots = [
+            (
+                np.empty(max_points, dtype=bool),
+                np.empty(max_points, dtype=np.float32),
+                np.empty(max_points, dtype=np.float32),
+                np.empty(max_points, dtype=np.float32),
+                np.empty(max_points, dtype=np.float32),
+            )
+            for _ in range(n_slots)
+        ]
+        self.slot = 0
+        self.input = bus.subscribe("points", depth=8)
+
+    def step(self):
+        """
+        Label the points of one frame and publish them.
+        """
+        frame = self.input.get(timeout=0.1)
+        if frame is None:
+            return
+        static_buffer, closing_buffer, r_buffer, theta_buffer, velocity_buffer = self.slots[self.slot]
+        self.slot = (self.slot + 1) % len(self.slots)
+        r = frame["r"][: self.max_points]
+        theta = frame["theta"][: self.max_points]
+        velocity = frame["velocity"][: self.max_points]
+        coefficients, static = estimate_ego_velocity(
+            theta,
+            velocity,
+            iterations=self.iterations,
+            threshold=self.threshold,
+            rng=self.rng,
+            out=static_buffer,
+            work=self.work,
+        )
+        if self.drop_moving:
+            r = utils.compress(static, r, r_buffer, self.index)
+            theta = utils.compress(static, theta, theta_buffer, self.index)
+            velocity = utils.compress(static, velocity, velocity_buffer, self.index)
+            static = static_buffer[: len(r)]
+            static[:] = True
+        # A negative radial velocity means the point is getting closer
+        closing = np.negative(velocity, out=closing_buffer[: len(velocity)])
+
+        frame = dict(frame)
+        frame["r"] = r
+        frame["theta"] = theta
+        frame["velocity"] = velocity
+        frame["ego_speed"] = float(-coefficients[0])
+        frame["static"] = static
+        frame["closing"] = closing
+        self.bus.publish("motion_points", frame)
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import deque
+
+
+class Subscription:
+    """
+    A bounded queue of frames delivered to one subscriber of a FrameBus topic.
+
+    When the queue is full the oldest frame is dropped, so a slow subscriber never
+    blocks the stage publishing to it.
+
+    Attributes:
+        topic (str): The topic this subscription listens to.
+        queue (deque): The pending frames, oldest first.
+        dropped (int): Number of frames dropped because the subscriber fell behind.
+        received (float): Time (time.perf_counter) at which the last frame was returned to the subscriber.
+
+    Methods:
+        put: Deliver a frame to the subscription.
+        get: Wait for and return the oldest pending frame.
+        latest: Return the newest pending frame and discard the older ones.
+    """
+
+    def __init__(self, topic, depth=1):
+        """
+        Initialize the Subscription object.
+
+        Parameters:
+            topic (str): The topic this subscription listens to.
+            depth (int): Maximum number of pending frames (1 keeps only the latest frame).
+        """
+        self.topic = topic
+        self.queue = deque(maxlen=depth)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.received = 0.0
+
+    def put(self, frame):
+        """
+        Deliver a frame to the subscription, dropping the oldest one if the queue is full.
+
+        Parameters:
+            frame: The frame to deliver.
+        """
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(frame)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for and return the oldest pending frame.
+
+        Parameters:
+            timeout (float): Maximum time to wait in seconds (None waits forever).
+
+        Returns:
+            The oldest pending frame, or None if the timeout expired.
+        """
+        with self.condition:
+            if not self.queue:
+                self.condition.wait(timeout)
+            if not self.queue:
+                return None
+            self.received = time.perf_counter()
+            return self.queue.popleft()
+
+    def latest(self):
+        """
+        Return the newest pending frame without waiting, discarding the older ones.
+
+        Returns:
+            The newest pending frame, or None if there is none.
+        """
+        with self.condition:
+            if not self.queue:
+                return None
+            frame = self.queue.pop()
+            self.queue.clear()
+            self.received = time.perf_counter()
+            return frame
+
+
+class FrameBus:
+    """
+    A lightweight in-process publish/subscribe bus connecting the pipeline stages.
+
+    Frames are passed by reference, so publishers must not modify a frame after publishing it.
+
+    Methods:
+        subscribe: Create a subscription to a topic.
+        unsubscribe: Remove a subscription.
+        publish: Deliver a frame to every subscriber of a topic.
+    """
+
+    def __init__(self):
+        """
+        Initialize the FrameBus object.
+        """
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, topic, depth=1):
+        """
+        Create a subscription to a topic.
+
+        Parameters:
+            topic (str): The topic to subscribe to.
+            depth (int): Maximum number of pending frames (1 keeps only the latest frame).
+
+        Returns:
+            Subscription: The new subscription.
+        """
+        subscription = Subscription(topic, depth)
+        with self.lock:
+            # Copy on write so publish can iterate without holding the lock
+            subscribers = list(self.subscriptions.get(topic, []))
+            subscribers.append(subscription)
+            self.subscriptions[topic] = subscribers
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Remove a subscription.
+
+        Parameters:
+            subscription (Subscription): The subscription to remove.
+        """
+        with self.lock:
+            subscribers = list(self.subscriptions.get(subscription.topic, []))
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            self.subscriptions[subscription.topic] = subscribers
+
+    def publish(self, topic, frame):
+        """
+        Deliver a frame to every subscriber of a topic.
+
+        Parameters:
+            topic (str): The topic to publish to.
+            frame: The frame to deliver.
+        """
+        for subscription in self.subscriptions.get(topic, ()):
+            subscription.put(frame)
@@ -0,0 +1,203 @@
+import collections
+import os
+import socket
+import struct
+import numpy as np
+from Pipeline import Stage
+
+# Header of every message: magic, frame number, timestamp, minimum range (NaN if none),
+# number of sectors, flags and number of points. It is followed by one int8 level per sector
+# and, optionally, by the (r, theta) float32 pair of every point.
+MESSAGE_MAGIC = b"RPAS"
+MESSAGE_HEADER = struct.Struct("<4sIdfBBH")
+FLAG_DETECTED = 1
+FLAG_SENSOR_LOST = 2
+
+
+def encode_message(state, r=None, theta=None):
+    """
+    Encode a sector state into a compact binary message.
+
+    Parameters:
+        state (dict): The sector state published by the binner.
+        r (ndarray): Optional ranges of the points in meters.
+        theta (ndarray): Optional angles of the points in degrees.
+
+    Returns:
+        bytes: The encoded message.
+    """
+    levels = np.asarray(state["levels"], dtype=np.int8)
+    distance = state["distance"] if state["distance"] is not None else np.nan
+    n_points = 0 if r is None else len(r)
+    header = MESSAGE_HEADER.pack(
+        MESSAGE_MAGIC,
+        state["frameNumber"],
+        state["timestamp"],
+        distance,
+        len(levels),
+        (FLAG_DETECTED if state["detected"] else 0)
+        | (FLAG_SENSOR_LOST if state.get("sensor_lost") else 0),
+        n_points,
+    )
+    if n_points == 0:
+        return header + levels.tobytes()
+    points = np.empty((n_points, 2), dtype=np.float32)
+    points[:, 0] = r
+    points[:, 1] = theta
+    return header + levels.tobytes() + points.tobytes()
+
+
+def decode_message(message):
+    """
+    Decode a binary message produced by encode_message.
+
+    Parameters:
+        message (bytes): The encoded message.
+
+    Returns:
+        dict: A dictionary with the frame number, timestamp, minimum range (None if there is none),
+              detection and sensor lost flags, sector levels and an (n, 2) array of (r, theta) points.
+    """
+    magic, frameNumber, timestamp, distance, n_sectors, flags, n_points = (
+        MESSAGE_HEADER.unpack_from(message)
+    )
+    if magic != MESSAGE_MAGIC:
+        raise ValueError("Invalid message magic %r" % magic)
+    idX = MESSAGE_HEADER.size
+    levels = np.frombuffer(message, dtype=np.int8, count=n_sectors, offset=idX)
+    idX += n_sectors
+    points = np.frombuffer(
+        message, dtype=np.float32, count=2 * n_points, offset=idX
+    ).reshape(n_points, 2)
+    return {
+        "frameNumber": frameNumber,
+        "timestamp": timestamp,
+        "distance": None if np.isnan(distance) else distance,
+        "detected": bool(flags & FLAG_DETECTED),
+        "sensor_lost": bool(flags & FLAG_SENSOR_LOST),
+        "levels": levels,
+        "points": points,
+    }
+
+
+class IpcPublisher(Stage):
+    """
+    Sink stage publishing every sector state to the local processes connected to a UNIX domain socket.
+
+    The socket is of type SOCK_SEQPACKET, so each message is received whole by one recv call.
+    Messages are sent without blocking: when a subscriber's socket buffer is full the message is
+    dropped for that subscriber only, and a subscriber missing too many consecutive messages is disconnected.
+
+    With send_points, each state is paired with the points of the frame of the same number. The points
+    received are held until their state arrives, and the ones received before the matching frame are
+    dropped then, so the points of the previous count are dropped once the frame counter of the radar
+    restarts (after a recovery of the sensor or a reconfiguration).
+
+    Attributes:
+        clients (dict): The connected subscriber sockets and their number of consecutive dropped messages.
+        dropped (int): Total number of messages dropped because of backpressure.
+    """
+
+    def __init__(self, bus, socketPath, send_points=False, max_missed=50):
+        """
+        Initialize the IpcPublisher object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            socketPath (str): The path of the UNIX domain socket.
+            send_points (bool): Whether to append the points of the frame to each message.
+            max_missed (int): Consecutive dropped messages after which a subscriber is disconnected.
+        """
+        super().__init__(bus)
+        self.socketPath = socketPath
+        self.send_points = send_points
+        self.max_missed = max_missed
+        self.clients = {}
+        self.dropped = 0
+        # Points received and not yet paired with their state, in order of arrival
+        self.points = collections.deque(maxlen=16)
+
+        # Remove a socket file left by a previous run
+        if os.path.exists(socketPath):
+            os.unlink(socketPath)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.server.bind(socketPath)
+        self.server.listen()
+        self.server.setblocking(False)
+
+        self.input = bus.subscribe("sectors", depth=8)
+        if send_points:
+            self.points_input = bus.subscribe("points", depth=8)
+
+    def accept(self):
+        """
+        Accept the subscribers waiting to connect.
+        """
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except BlockingIOError:
+                return
+            client.setblocking(False)
+            self.clients[client] = 0
+
+    def step(self):
+        """
+        Send the pending sector state to every subscriber.
+        """
+        state = self.input.get(timeout=0.1)
+        self.accept()
+        if state is None:
+            return
+
+        r = theta = None
+        if self.send_points and not state.get("sensor_lost"):
+            while True:
+                points = self.points_input.get(timeout=0)
+                if points is None:
+                    break
+                self.points.append(points)
+            # Pair the state with the latest points of the same frame, dropping the points received before
+            # them, which belong to skipped frames or to the count before a restart of the frame counter
+            for i in range(len(self.points) - 1, -1, -1):
+                if self.points[i]["frameNumber"] == state["frameNumber"]:
+                    r = self.points[i]["r"]
+                    theta = self.points[i]["theta"]
+                    for _ in range(i + 1):
+                        self.points.popleft()
+                    break
+        message = encode_message(state, r, theta)
+
+        for client in list(self.clients):
+            try:
+                client.send(message)
+                self.clients[client] = 0
+            except BlockingIOError:
+                # The subscriber is not keeping up, drop the message for it
+                self.dropped += 1
+                self.clients[client] += 1
+                if self.clients[client] > self.max_missed:
+                    self.disconnect(client)
+            except OSError:
+                self.disconnect(client)
+
+    def disconnect(self, client):
+        """
+        Disconnect a subscriber.
+
+        Parameters:
+            client (socket): The subscriber socket.
+        """
+        del self.clients[client]
+        client.close()
+
+    def stop(self):
+        """
+        Stop the stage thread, disconnect the subscribers and remove the socket.
+        """
+        super().stop()
+        for client in list(self.clients):
+            self.disconnect(client)
+        self.server.close()
+        if os.path.exists(self.socketPath):
+            os.unlink(self.socketPath)
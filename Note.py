@@ -1,6 +1,5 @@
 from utils_notes import NOTE_MAP
 from Tone import Tone
-import threading
 import time
 
 
@@ -40,14 +39,23 @@ class Note:
         self.note = main_note + note[1:]
         self.frequency = NOTE_MAP[self.note]
 
-    def play(self, speaker=None):
+    def play(self, speaker=None, engine=None, voice=0):
         """
         Plays the note using a sine wave.
 
         Parameters:
             speaker: Speaker object to play the note through.
+            engine (AudioEngine): Optional streaming engine playing the note on one of its voices,
+                                  instead of creating a new sound.
+            voice (int): The voice of the engine playing the note.
         """
-        if not self.is_resting:
+        if engine is not None:
+            if self.is_resting:
+                engine.release(voice)
+            else:
+                engine.set_voice(voice, self.frequency, speaker=speaker)
+            time.sleep(self.duration)
+        elif not self.is_resting:
             Tone.sine(self.frequency, duration=self.duration, speaker=speaker)
         else:
             time.sleep(self.duration)
@@ -63,20 +71,22 @@ class Note:
         return Note('rest', duration)
 
     @staticmethod
-    def play_chord(notes):
+    def play_chord(notes, engine=None):
         """
         Plays a chord (multiple notes) simultaneously.
 
         Parameters:
             notes (list): A list of Note objects.
+            engine (AudioEngine): Optional streaming engine playing each note on its own voice,
+                                  instead of one buffer mixing all notes.
         """
-        threads = []
-        for note in notes:
-            thread = threading.Thread(target=note.play)
-            threads.append(thread)
-
-        for thread in threads:
-            thread.start()
+        if engine is not None:
+            for voice, note in enumerate(notes):
+                if not note.is_resting:
+                    engine.set_voice(voice, note.frequency, amplitude=1 / len(notes))
+            time.sleep(max(note.duration for note in notes))
+            for voice in range(len(notes)):
+                engine.release(voice)
+            return
 
-        for thread in threads:
-            thread.join()
+        Tone.play_buffer(Tone.render_chord(notes), wait=True)
@@ -0,0 +1,132 @@
+import numpy as np
+import utils
+
+
+class OccupancyGrid:
+    """
+    A log-odds occupancy grid of the area behind the bumper, updated incrementally from the detected points.
+
+    The grid is a fixed top-down (Cartesian) array covering the azimuth field of view up to the maximum
+    distance, with x to the right of the radar and y away from it. Every frame the log-odds of all cells
+    decay towards 0 (unknown) and the cells hit by a point are increased, so an obstacle builds up over a
+    few frames and fades away once it is no longer detected. Each update costs the same whatever the
+    number of points.
+
+    The range and sector of every cell are precomputed, so the grid can also be read out per sector
+    for the polar view.
+
+    Attributes:
+        logodds (ndarray): The log-odds of occupancy of each cell, indexed as [y, x].
+        cell_size (float): Size of a cell in meters.
+
+    Methods:
+        update: Decay the grid and add the points of a frame.
+        probability: Return the probability of occupancy of each cell.
+        occupied: Return the mask of the cells considered occupied.
+        sector_min_range: Compute the range of the closest occupied cell of each sector.
+    """
+
+    def __init__(
+        self,
+        theta_grids,
+        maxdistance,
+        cell_size=0.05,
+        hit=0.85,
+        decay=0.7,
+        threshold=1.0,
+        limit=4.0,
+    ):
+        """
+        Initialize the OccupancyGrid object.
+
+        Parameters:
+            theta_grids (list): Edges of the sectors in degrees.
+            maxdistance (float): The maximum distance in meters.
+            cell_size (float): Size of a cell in meters.
+            hit (float): Log-odds added to a cell for each point falling in it.
+            decay (float): Factor applied to the log-odds of every cell at each update.
+            threshold (float): Log-odds above which a cell is considered occupied.
+            limit (float): Maximum log-odds of a cell, so obstacles can fade away quickly.
+        """
+        self.theta_grids = theta_grids
+        self.maxdistance = maxdistance
+        self.cell_size = cell_size
+        self.hit = hit
+        self.decay = decay
+        self.threshold = threshold
+        self.limit = limit
+
+        # The field of view is symmetric around the y axis only if thetamin = -thetamax
+        half_width = maxdistance * np.sin(
+            np.radians(min(max(abs(theta_grids[0]), abs(theta_grids[-1])), 90))
+        )
+        self.x_min = -half_width
+        self.n_x = int(np.ceil(2 * half_width / cell_size))
+        self.n_y = int(np.ceil(maxdistance / cell_size))
+        self.logodds = np.zeros((self.n_y, self.n_x), dtype=np.float32)
+
+        # Range and angle (from the y axis, positive to the left as in the polar plot) of each cell center
+        x = self.x_min + (np.arange(self.n_x) + 0.5) * cell_size
+        y = (np.arange(self.n_y) + 0.5) * cell_size
+        x, y = np.meshgrid(x, y)
+        self.cell_range = np.sqrt(x**2 + y**2).astype(np.float32)
+        cell_theta = np.degrees(np.arctan2(-x, y))
+
+        # Order the cells inside the field of view by sector, for the per-sector readout
+        n_sectors = len(theta_grids) - 1
+        sectors = utils.sector_index(cell_theta, theta_grids)
+        inside = (sectors >= 0) & (sectors < n_sectors) & (self.cell_range <= maxdistance)
+        order = np.argsort(sectors[inside], kind="stable")
+        self.sector_cells = np.flatnonzero(inside)[order]
+        self.sector_starts = np.searchsorted(sectors[inside][order], np.arange(n_sectors))
+        self.sector_counts = np.bincount(sectors[inside], minlength=n_sectors)
+
+    def update(self, r, theta):
+        """
+        Decay the grid and add the points of a frame.
+
+        Parameters:
+            r (ndarray): Ranges of the points in meters.
+            theta (ndarray): Angles of the points in degrees, as in the polar plot.
+        """
+        self.logodds *= self.decay
+
+        # Convert the points to cell indices and drop the ones outside the grid
+        theta = np.radians(theta)
+        ix = np.floor((-r * np.sin(theta) - self.x_min) / self.cell_size).astype(np.intp)
+        iy = np.floor(r * np.cos(theta) / self.cell_size).astype(np.intp)
+        inside = (ix >= 0) & (ix < self.n_x) & (iy >= 0) & (iy < self.n_y)
+        np.add.at(self.logodds, (iy[inside], ix[inside]), self.hit)
+        np.minimum(self.logodds, self.limit, out=self.logodds)
+
+    def probability(self):
+        """
+        Return the probability of occupancy of each cell.
+
+        Returns:
+            ndarray: The probability of each cell, indexed as [y, x].
+        """
+        return 1 - 1 / (1 + np.exp(self.logodds))
+
+    def occupied(self):
+        """
+        Return the mask of the cells considered occupied.
+
+        Returns:
+            ndarray: True for each occupied cell, indexed as [y, x].
+        """
+        return self.logodds > self.threshold
+
+    def sector_min_range(self):
+        """
+        Compute the range of the closest occupied cell of each sector.
+
+        Returns:
+            ndarray: The minimum range of each sector in meters, inf for sectors without occupied cells.
+        """
+        ranges = np.where(self.occupied(), self.cell_range, np.inf).ravel()[self.sector_cells]
+        min_range = np.full(len(self.sector_counts), np.inf)
+        # Sectors without any cell are skipped since reduceat does not support empty segments
+        nonempty = self.sector_counts > 0
+        min_range[nonempty] = np.minimum.reduceat(ranges, self.sector_starts[nonempty])
+        return min_range
@@ -0,0 +1,866 @@
+import json
+import threading
+import time
+import numpy as np
+import utils
+import AWR1843 as awr
+from Profiler import profiler
+from PointHistory import PointHistory
+
+
+class ByteStream:
+    """
+    A thread-safe byte queue exposing the `in_waiting`/`read` interface of a serial port.
+
+    It lets the AWR1843 parser consume bytes handed over by another stage instead of reading the port itself.
+
+    Methods:
+        write: Append bytes to the stream.
+        read: Remove and return bytes from the stream.
+    """
+
+    def __init__(self):
+        """
+        Initialize the ByteStream object.
+        """
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+
+    @property
+    def in_waiting(self):
+        """
+        Number of bytes available to read.
+        """
+        return len(self.buffer)
+
+    def write(self, data):
+        """
+        Append bytes to the stream.
+
+        Parameters:
+            data (bytes): The bytes to append.
+        """
+        with self.lock:
+            self.buffer += data
+
+    def read(self, size=1):
+        """
+        Remove and return bytes from the stream.
+
+        Parameters:
+            size (int): Maximum number of bytes to read.
+
+        Returns:
+            bytes: The bytes read.
+        """
+        with self.lock:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+
+class Stage:
+    """
+    Base class for a pipeline stage running in its own thread.
+
+    A stage either waits for frames from a FrameBus subscription or, when a period is given,
+    runs on its own fixed schedule. A step raising an exception, e.g. on a corrupt packet, is counted
+    and the stage goes on with the next one, so a single bad input does not stop its thread.
+
+    Attributes:
+        bus (FrameBus): The bus connecting the stages.
+        period (float): Time to sleep between steps in seconds (None runs the next step immediately).
+        thread (Thread): The thread running the stage.
+        stop_flag (bool): Flag to stop the stage.
+        span_name (str): Name of the steps in the traces of the profiler, None uses the class name.
+        errors (int): Number of steps that raised an exception.
+        step_error (Exception): The exception of the last step that raised one, None if there is none.
+
+    Methods:
+        start: Start the stage thread.
+        stop: Stop the stage thread.
+        step: Process one unit of work, implemented by each stage.
+        recover: Clean up after a step that raised an exception.
+    """
+
+    span_name = None
+
+    def __init__(self, bus, period=None):
+        """
+        Initialize the Stage object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            period (float): Time to sleep between steps in seconds.
+        """
+        self.bus = bus
+        self.period = period
+        self.thread = None
+        self.stop_flag = False
+        self.errors = 0
+        self.step_error = None
+
+    def start(self):
+        """
+        Start the stage thread.
+        """
+
+        def run():
+            """
+            Helper function to run the steps in a separate thread.
+            """
+            while not self.stop_flag:
+                try:
+                    profiler.run_step(self)
+                except Exception as error:
+                    self.errors += 1
+                    self.step_error = error
+                    self.recover()
+                if self.period:
+                    time.sleep(self.period)
+
+        self.thread = threading.Thread(target=run, name=type(self).__name__, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the stage thread.
+        """
+        self.stop_flag = True
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def step(self):
+        """
+        Process one unit of work.
+        """
+        raise NotImplementedError
+
+    def recover(self):
+        """
+        Clean up after a step that raised an exception, before the next step. Does nothing by default.
+        """
+
+
+class RadarSource(Stage):
+    """
+    Source stage polling the radar data port and publishing the raw bytes on the "raw" topic.
+
+    The data port is replaced by the one published on the "ports" topic when the ports are reopened
+    (see SensorWatchdog), and read errors are left to the watchdog, which sees the frames stop.
+
+    Attributes:
+        last_error (Exception): The last error reading the data port, None if there is none.
+    """
+
+    span_name = "read"
+
+    def __init__(self, bus, Dataport, period=0.01):
+        """
+        Initialize the RadarSource object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            Dataport (Serial): The serial port for data reception.
+            period (float): Polling period in seconds.
+        """
+        super().__init__(bus, period)
+        self.Dataport = Dataport
+        self.last_error = None
+        self.ports_input = bus.subscribe("ports", depth=1)
+
+    def step(self):
+        """
+        Read the bytes waiting on the data port and publish them with their arrival time.
+        """
+        ports = self.ports_input.latest()
+        if ports is not None:
+            self.Dataport = ports["Dataport"]
+        try:
+            readBuffer = self.Dataport.read(self.Dataport.in_waiting)
+        except OSError as error:
+            # Covers the errors of pyserial, e.g. when the radar is unplugged
+            self.last_error = error
+            return
+        if readBuffer:
+            self.bus.publish("raw", (time.monotonic(), readBuffer))
+
+
+class Decoder(Stage):
+    """
+    Decoder stage turning the "raw" byte chunks into frames of detected points on the "detections" topic.
+
+    When a RoiFilter is given, the points out of the region of interest are removed (and the remaining
+    ones optionally downsampled) before the frame is published, so every later stage only processes the
+    points that matter. The frames hold the number of points received from the radar ("numRaw"), and
+    the points received and kept are counted, in total and as counters of the profiler traces.
+
+    The packets without any detected point, which the radar sends in an empty scene, are published as
+    empty frames, so the sector state is cleared. A packet that cannot be parsed is dropped, and the
+    parser resynchronises on the magic word of the next one. The frame number of every packet received is also
+    published on the "heartbeat" topic, for the SensorWatchdog.
+
+    When a SharedFrameRing is given, the points are also decoded in place into its slots, so that
+    consumer processes can map them without copying. The frames published on the bus hold copies of the
+    points, as a slot is written again after n_slots packets, while the frames of a burst of packets may
+    still be queued by the subscribers. The configuration parameters are replaced by the
+    ones published on the "config" topic when the radar is reconfigured, and the RoiFilter by the one of
+    a Scenario published on the "scenario" topic when its profile is reloaded.
+
+    Attributes:
+        roi (RoiFilter): The filter of the region of interest, None keeps every point.
+        points_in (int): Number of points received from the radar.
+        points_kept (int): Number of points published.
+    """
+
+    span_name = "decode"
+
+    def __init__(self, bus, configParameters, ring=None, roi=None):
+        """
+        Initialize the Decoder object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            configParameters (dict): Radar configuration parameters.
+            ring (SharedFrameRing): Optional shared memory ring to write the frames into.
+            roi (RoiFilter): Optional filter of the region of interest.
+        """
+        super().__init__(bus)
+        self.configParameters = configParameters
+        self.ring = ring
+        self.roi = roi
+        self.points_in = 0
+        self.points_kept = 0
+        # Raw chunks must not be dropped, otherwise packets would be corrupted
+        self.input = bus.subscribe("raw", depth=1024)
+        self.config_input = bus.subscribe("config", depth=1)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+        self.stream = ByteStream()
+
+    @property
+    def reduction(self):
+        """
+        Fraction of the points received that were removed, 0 before any point is received.
+        """
+        if self.points_in == 0:
+            return 0.0
+        return 1 - self.points_kept / self.points_in
+
+    def step(self):
+        """
+        Parse every complete packet available and publish its detected points.
+        """
+        config = self.config_input.latest()
+        if config is not None:
+            self.configParameters = config["configParameters"]
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.roi = scenario.roi
+
+        chunk = self.input.get(timeout=0.1)
+        if chunk is None:
+            return
+        timestamp, readBuffer = chunk
+        self.stream.write(readBuffer)
+
+        # A chunk may complete several packets, so parse until no more packets are found
+        while True:
+            out = self.ring.begin_write() if self.ring is not None else None
+            header = {}
+            dataOk, frameNumber, detObj = awr.readAndParseData18xx_2d(
+                self.stream, self.configParameters, out=out, header=header
+            )
+            if header:
+                # Every packet received shows the sensor alive, even without any detected point
+                self.bus.publish(
+                    "heartbeat",
+                    {
+                        "frameNumber": header["frameNumber"],
+                        "timestamp": timestamp,
+                        "numObj": header["numDetectedObj"],
+                    },
+                )
+            if header and not dataOk:
+                # A packet without any detected point, e.g. in an empty scene, is an empty frame
+                detObj = {field: np.zeros(0, dtype=np.float32) for field in ("x", "y", "z", "velocity")}
+                detObj["numObj"] = 0
+            numRaw = len(detObj.get("x", ()))
+            if header and self.roi is not None:
+                # Filter in place, so the ring only holds the points kept
+                self.roi.apply(detObj)
+                profiler.counter("roi", {"points": numRaw, "kept": len(detObj["x"])})
+            if self.ring is not None:
+                self.ring.end_write(
+                    int(frameNumber), len(detObj.get("x", ())), timestamp, publish=bool(header)
+                )
+            if not header:
+                break
+            if out is not None:
+                detObj = {
+                    key: value.copy() if isinstance(value, np.ndarray) else value
+                    for key, value in detObj.items()
+                }
+            self.points_in += numRaw
+            self.points_kept += len(detObj["x"])
+            self.bus.publish(
+                "detections",
+                {
+                    "frameNumber": int(frameNumber),
+                    "timestamp": timestamp,
+                    "numRaw": numRaw,
+                    "detObj": detObj,
+                },
+            )
+            profiler.frame()
+
+    def recover(self):
+        """
+        Drop the packet that could not be parsed, e.g. with a corrupt number of objects, and abandon
+        the slot of the ring it was written into.
+        """
+        awr.dropPacket()
+        if self.ring is not None and self.ring.writing is not None:
+            self.ring.end_write(publish=False)
+
+
+class CouplingFilter(Stage):
+    """
+    Filter stage removing the points resulting from the noise coupling between antennas and converting
+    the remaining ones to the polar coordinates of the graphical representation ("points" topic).
+
+    The points are written into preallocated float32 buffers, used in turn for the published frames,
+    so filtering a frame does not allocate memory per point. A published frame stays valid until
+    n_slots more frames have been published, which the bounded queues of the subscribers guarantee
+    as long as n_slots is larger than their depth.
+    """
+
+    span_name = "filter"
+
+    def __init__(self, bus, coupling_distance=0.1, range_offset=0.01, max_points=1024, n_slots=32):
+        """
+        Initialize the CouplingFilter object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            coupling_distance (float): Points closer than this distance (in meters) are removed.
+            range_offset (float): Offset added to the range of the remaining points (in meters).
+            max_points (int): Maximum number of points per frame, further points are ignored.
+            n_slots (int): Number of buffers used in turn for the published frames.
+        """
+        super().__init__(bus)
+        self.coupling_distance = coupling_distance
+        self.range_offset = range_offset
+        self.max_points = max_points
+        self.slots = [
+            (
+                np.empty(max_points, dtype=np.float32),
+                np.empty(max_points, dtype=np.float32),
+                np.empty(max_points, dtype=bool),
+                np.empty(max_points, dtype=np.float32),
+            )
+            for _ in range(n_slots)
+        ]
+        self.slot = 0
+        self.work = (np.empty(max_points, dtype=np.float32), np.empty(max_points, dtype=np.intp))
+        self.input = bus.subscribe("detections", depth=8)
+
+    def step(self):
+        """
+        Filter one frame of detected points and publish it.
+        """
+        frame = self.input.get(timeout=0.1)
+        if frame is None:
+            return
+        detObj = frame["detObj"]
+        r_buffer, theta_buffer, keep_buffer, velocity_buffer = self.slots[self.slot]
+        self.slot = (self.slot + 1) % len(self.slots)
+        r_np, theta, keep = utils.cartesian_to_display_polar(
+            np.asarray(detObj["x"])[: self.max_points],
+            np.asarray(detObj["y"])[: self.max_points],
+            offset=self.coupling_distance,
+            range_bias=self.range_offset,
+            out=(r_buffer, theta_buffer, keep_buffer),
+            work=self.work,
+        )
+        velocity = utils.compress(
+            keep, np.asarray(detObj["velocity"])[: self.max_points], velocity_buffer, self.work[1]
+        )
+
+        self.bus.publish(
+            "points",
+            {
+                "frameNumber": frame["frameNumber"],
+                "timestamp": frame["timestamp"],
+                "numObj": len(detObj["x"]),
+                "r": r_np,
+                "theta": theta,
+                "velocity": velocity,
+            },
+        )
+
+
+class SectorBinner(Stage):
+    """
+    Binner stage clustering the filtered points into the sectors and levels of the polar plot
+    and publishing the resulting state on the "sectors" topic.
+
+    The published state holds, for each sector, the level of the closest object or -1 if there is none.
+    By default a level is only shown once it has been seen in the previous frame, to avoid isolated detections.
+    When a PointHistory is given, the points of the last frames are accumulated instead and each sector
+    shows the closest point received within the time window. When an OccupancyGrid is given, each sector
+    shows the closest occupied cell of the grid. The history and the grid are exclusive: while the tables
+    hold a grid, the history is dropped, and an empty one of the same number of frames is started
+    when tables without a grid are swapped in.
+
+    When the points come from the ego-motion filter, the state also holds the closing speed of each
+    sector and the smallest time-to-contact.
+
+    The sectors and levels are replaced by the ones of a Scenario published on the "scenario" topic
+    when its profile is reloaded. Every state holds the "n_sectors" and "n_levels" of the tables it was
+    binned with, so the sinks can tell the states binned before and after the swap.
+    While the SensorWatchdog reports the sensor lost on the "sensor" topic, the state is replaced by
+    a "sensor lost" state without any object, with "sensor_lost" set.
+
+    A state is also published on the "changes" topic when it differs from the last one published there,
+    comparing the levels, the detection flag and the distance and time-to-contact rounded to the given
+    precisions. The display, audio and recording sinks follow that topic, so they stay idle while the
+    scene does not change.
+    """
+
+    span_name = "bin"
+
+    def __init__(
+        self,
+        bus,
+        theta_grids,
+        r_distances,
+        history=None,
+        window=0.2,
+        grid=None,
+        topic="points",
+        distance_precision=2,
+        ttc_precision=1,
+        max_points=1024,
+    ):
+        """
+        Initialize the SectorBinner object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            history (PointHistory): Optional ring buffer accumulating the points of the last frames,
+                                    used while the tables hold no occupancy grid.
+            window (float): Time window of the accumulated points in seconds.
+            grid (OccupancyGrid): Optional occupancy grid updated with the points of every frame.
+            topic (str): The topic of the filtered points ("motion_points" to use the ego-motion filter).
+            distance_precision (int): Number of decimals of the distance compared to detect a change.
+            ttc_precision (int): Number of decimals of the time-to-contact compared to detect a change.
+            max_points (int): Maximum number of points per frame, the size of the work buffers.
+        """
+        super().__init__(bus)
+        self.history = history
+        self.history_frames = history.n_frames if history is not None else None
+        self.window = window
+        # Work buffers of the binning, so a frame is binned without allocating memory per point
+        self.max_points = max_points
+        self.sectors = np.empty(max_points, dtype=np.int8)
+        self.point_levels = np.empty(max_points, dtype=np.int8)
+        self.mask = np.empty(max_points, dtype=bool)
+        self.valid = np.empty(max_points, dtype=bool)
+        self.ttc = np.empty(max_points)
+        self.set_tables(self.tables(theta_grids, r_distances, grid))
+        self.distance_precision = distance_precision
+        self.ttc_precision = ttc_precision
+        self.input = bus.subscribe(topic, depth=8)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+        self.sensor_input = bus.subscribe("sensor", depth=1)
+
+    @staticmethod
+    def tables(theta_grids, r_distances, grid=None):
+        """
+        Build the tables of the binner that depend on the sectors and levels.
+
+        They are built before being handed to the binner, e.g. by a Scenario when its profile is reloaded,
+        so that the binner only swaps them in between two frames.
+
+        Parameters:
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            grid (OccupancyGrid): Optional occupancy grid of the sectors.
+
+        Returns:
+            dict: The tables.
+        """
+        n_sectors = len(theta_grids) - 1
+        return {
+            "theta_grids": theta_grids,
+            "r_distances": r_distances,
+            "n_sectors": n_sectors,
+            "n_levels": len(r_distances) - 1,
+            "grid": grid,
+            "closing": np.zeros(n_sectors),
+            # The positions of the current and previous frames, swapped after each frame
+            "positions": np.full((2, n_sectors), -1),
+            "no_levels": np.full(n_sectors, -1),
+        }
+
+    def set_tables(self, tables):
+        """
+        Swap in the tables of new sectors and levels, restarting from an empty state.
+        The history is dropped while the tables hold an occupancy grid, and started again empty after.
+
+        Parameters:
+            tables (dict): The tables built by SectorBinner.tables.
+        """
+        self.theta_grids = tables["theta_grids"]
+        self.r_distances = tables["r_distances"]
+        self.n_sectors = tables["n_sectors"]
+        self.n_levels = tables["n_levels"]
+        self.grid = tables["grid"]
+        if self.grid is not None:
+            self.history = None
+        elif self.history is None and self.history_frames is not None:
+            self.history = PointHistory(n_frames=self.history_frames, max_points=self.max_points)
+        self.closing = tables["closing"]
+        self.positions = tables["positions"]
+        self.positions[:] = -1
+        self.current = 0
+        self.previous_positions = self.positions[1]
+        self.no_levels = tables["no_levels"]
+        self.last_change = None
+
+    def step(self):
+        """
+        Bin one frame of filtered points and publish the sector state.
+        """
+        # A reloaded scenario only takes effect between two frames
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.set_tables(scenario.binner_tables)
+        sensor = self.sensor_input.latest()
+        if sensor is not None:
+            self.publish_sensor(sensor)
+
+        frame = self.input.get(timeout=0.1)
+        if frame is None:
+            return
+        if self.grid is not None:
+            self.grid.update(frame["r"], frame["theta"])
+            self.publish_ranges(frame, self.grid.sector_min_range())
+            return
+        if self.history is not None:
+            self.history.add(frame["r"], frame["theta"], frame["timestamp"])
+            min_range = self.history.sector_min_range(
+                self.theta_grids, frame["timestamp"], self.window
+            )
+            self.publish_ranges(frame, min_range)
+            return
+        r_np = frame["r"][: self.max_points]
+        theta_np = frame["theta"][: self.max_points]
+
+        # Determine the graphical position of each sector as the level of its closest point
+        sectors = utils.sector_index(theta_np, self.theta_grids, out=self.sectors, mask=self.mask)
+        point_levels = utils.sector_index(
+            r_np, self.r_distances, out=self.point_levels, mask=self.mask
+        )
+        valid = np.greater_equal(point_levels, 0, out=self.valid[: len(r_np)])
+        graphical_positions = self.positions[self.current]
+        # Ranges beyond the last level are left out by starting from n_levels
+        utils.sector_reduce(
+            point_levels,
+            sectors,
+            self.n_sectors,
+            self.n_levels,
+            graphical_positions,
+            mask=self.mask,
+            valid=valid,
+        )
+        graphical_positions[graphical_positions == self.n_levels] = -1
+
+        detected = bool((graphical_positions != -1).any())
+        if detected:
+            # A sector shows its previous position, which matches the current one when the object is stable
+            levels = self.previous_positions
+        else:
+            levels = self.no_levels
+        shown = levels[levels != -1]
+
+        self.publish_state(
+            {
+                "frameNumber": frame["frameNumber"],
+                "timestamp": frame["timestamp"],
+                "positions": graphical_positions.tolist(),
+                "levels": levels.tolist(),
+                "detected": detected,
+                "closest": int(shown.min()) if len(shown) else -1,
+                "distance": float(np.min(r_np)) if len(shown) else None,
+                **self.motion_state(frame),
+            },
+        )
+
+        # Update previous_positions with the current graphical_positions
+        self.previous_positions = graphical_positions
+        self.current = 1 - self.current
+
+    def level_index(self, r):
+        """
+        Find the level of each range.
+
+        Parameters:
+            r (ndarray): The ranges in meters.
+
+        Returns:
+            ndarray: The level of each range, -1 for ranges beyond the last level.
+        """
+        # A range on the edge between two levels belongs to the lower one
+        levels = np.searchsorted(self.r_distances, r, side="left") - 1
+        levels[r == self.r_distances[0]] = 0
+        levels[levels >= self.n_levels] = -1
+        return levels
+
+    def motion_state(self, frame, min_closing=0.05):
+        """
+        Compute the closing speed of each sector and the smallest time-to-contact of a frame.
+
+        Parameters:
+            frame (dict): The frame of filtered points.
+            min_closing (float): Closing speed (in m/s) under which a sector is considered not approaching.
+
+        Returns:
+            dict: The "closing_speed" of each sector (m/s) and the smallest "ttc" (s, None if nothing
+                  is approaching), or an empty dictionary if the frame has no closing speeds.
+        """
+        if "closing" not in frame:
+            return {}
+        r = frame["r"][: self.max_points]
+        closing = frame["closing"][: self.max_points]
+        n = len(r)
+        sectors = utils.sector_index(
+            frame["theta"][:n], self.theta_grids, out=self.sectors, mask=self.mask
+        )
+        utils.sector_reduce(
+            closing, sectors, self.n_sectors, 0.0, self.closing, reduce=np.max, mask=self.mask
+        )
+
+        # Time-to-contact of each point of the sectors getting closer
+        approaching = np.greater(closing, min_closing, out=self.valid[:n])
+        mask = self.mask[:n]
+        approaching &= np.greater_equal(sectors, 0, out=mask)
+        approaching &= np.less(sectors, self.n_sectors, out=mask)
+        ttc = np.divide(r, closing, out=self.ttc[:n], where=approaching)
+        ttc = np.min(ttc, where=approaching, initial=np.inf)
+        return {
+            "closing_speed": self.closing.tolist(),
+            "ttc": float(ttc) if np.isfinite(ttc) else None,
+        }
+
+    def publish_state(self, state):
+        """
+        Publish a sector state on the "sectors" topic, and on the "changes" topic if it changed.
+
+        Parameters:
+            state (dict): The sector state.
+        """
+        state["n_sectors"] = self.n_sectors
+        state["n_levels"] = self.n_levels
+        self.bus.publish("sectors", state)
+        distance = state["distance"]
+        ttc = state.get("ttc")
+        key = (
+            state.get("sensor_lost", False),
+            state["detected"],
+            tuple(state["levels"]),
+            None if distance is None else round(distance, self.distance_precision),
+            None if ttc is None else round(ttc, self.ttc_precision),
+        )
+        if key != self.last_change:
+            self.last_change = key
+            self.bus.publish("changes", state)
+
+    def publish_sensor(self, sensor):
+        """
+        Publish a "sensor lost" state when the sensor is lost, and publish the next state when it is back.
+
+        Parameters:
+            sensor (dict): The status of the sensor published by the SensorWatchdog.
+        """
+        if sensor["status"] != "lost":
+            # Publish the next state on the "changes" topic even if it matches the one before the outage
+            self.last_change = None
+            return
+        self.positions[:] = -1
+        self.publish_state(
+            {
+                "frameNumber": sensor["frameNumber"],
+                "timestamp": sensor["timestamp"],
+                "positions": self.no_levels.tolist(),
+                "levels": self.no_levels.tolist(),
+                "detected": False,
+                "closest": -1,
+                "distance": None,
+                "sensor_lost": True,
+            }
+        )
+
+    def publish_ranges(self, frame, min_range):
+        """
+        Publish the sector state corresponding to the minimum range of each sector.
+
+        Parameters:
+            frame (dict): The frame of filtered points.
+            min_range (ndarray): The minimum range of each sector in meters, inf if there is no object.
+        """
+        # Find the level of the closest object of each sector
+        levels = self.level_index(min_range).tolist()
+        shown = [level for level in levels if level != -1]
+
+        self.publish_state(
+            {
+                "frameNumber": frame["frameNumber"],
+                "timestamp": frame["timestamp"],
+                "positions": levels,
+                "levels": levels,
+                "detected": bool(shown),
+                "closest": min(shown) if shown else -1,
+                "distance": float(min_range.min()) if shown else None,
+                **self.motion_state(frame),
+            },
+        )
+
+
+class AudioSink(Stage):
+    """
+    Sink stage selecting the note played by a Track from the sector state.
+
+    It runs in its own thread so the audio never waits on the graphical interface.
+    When time-to-contact thresholds are given and the sector state holds a time-to-contact
+    (see EgoMotionFilter), the note is also selected from it, and the more urgent of the notes of the
+    time-to-contact and of the level of the closest object is played.
+    The notes and their sound are replaced by the ones of a Scenario published on the "scenario" topic.
+    While the sensor is lost, the fifth note of the track is played, if any.
+    """
+
+    span_name = "audio"
+
+    def __init__(self, bus, track, ttc_thresholds=None, topic="changes"):
+        """
+        Initialize the AudioSink object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            track (Track): The track playing the warning notes.
+            ttc_thresholds (tuple): Optional increasing times-to-contact (in seconds) under which
+                                    the notes 3, 2 and 1 are played.
+            topic (str): The topic of the sector states ("sectors" to follow every frame).
+        """
+        super().__init__(bus)
+        self.track = track
+        self.ttc_thresholds = ttc_thresholds
+        self.input = bus.subscribe(topic, depth=1)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+
+    def set_scenario(self, scenario):
+        """
+        Swap in the notes, the sound and the time-to-contact thresholds of a scenario.
+
+        Parameters:
+            scenario (Scenario): The scenario.
+        """
+        self.ttc_thresholds = scenario.ttc_thresholds
+        self.track.notes_array = scenario.notes
+        engine = self.track.engine
+        if engine is not None:
+            engine.oscillator = scenario.oscillator
+            engine.envelope = scenario.envelope
+
+    # Index of the note of the track played while the sensor is lost, if the track has one
+    LOST_NOTE = 4
+
+    @staticmethod
+    def note_index(closest):
+        """
+        Select the note of the track for the level of the closest object.
+
+        Parameters:
+            closest (int): The level of the closest object.
+
+        Returns:
+            int: The index of the note in the track.
+        """
+        if closest == 3 or closest == 2:
+            return 1
+        elif closest == 1:
+            return 2
+        return 3
+
+    def step(self):
+        """
+        Update the note of the track from the latest sector state.
+        """
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.set_scenario(scenario)
+
+        state = self.input.get(timeout=0.1)
+        if state is None:
+            return
+        if state.get("sensor_lost"):
+            # Play the note warning that the sensor is lost, or no sound if the track has none
+            self.track.note(self.LOST_NOTE if len(self.track.notes_array) > self.LOST_NOTE else 0)
+        elif not state["detected"]:
+            # Play no sound indicating no objects detected
+            self.track.note(0)
+        elif self.ttc_thresholds is not None and state.get("ttc") is not None:
+            # Play a note based on the time left before reaching the closest approaching object,
+            # unless the closest object calls for a more urgent one
+            note = 0
+            for i, threshold in enumerate(self.ttc_thresholds):
+                if state["ttc"] < threshold:
+                    note = 3 - i
+                    break
+            if state["closest"] != -1:
+                note = max(note, self.note_index(state["closest"]))
+            self.track.note(note)
+        elif state["closest"] != -1:
+            # Play a note based on the closest object
+            self.track.note(self.note_index(state["closest"]))
+
+
+class RecorderSink(Stage):
+    """
+    Sink stage appending the sector states to a file, one JSON object per line.
+
+    By default only the states that changed are written, the "sectors" topic records every frame.
+    """
+
+    span_name = "record"
+
+    def __init__(self, bus, fileName, topic="changes"):
+        """
+        Initialize the RecorderSink object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            fileName (str): The path to the recording file.
+            topic (str): The topic of the sector states ("sectors" to record every frame).
+        """
+        super().__init__(bus)
+        self.file = open(fileName, "a")
+        self.input = bus.subscribe(topic, depth=256)
+
+    def step(self):
+        """
+        Write the pending sector states to the file.
+        """
+        state = self.input.get(timeout=0.1)
+        if state is None:
+            return
+        self.file.write(json.dumps(state) + "\n")
+
+    def stop(self):
+        """
+        Stop the stage thread and close the file.
+        """
+        super().stop()
+        self.file.close()
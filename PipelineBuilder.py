@@ -0,0 +1,128 @@
+import AWR1843 as awr
+from PointHistory import PointHistory
+from EgoMotion import EgoMotionFilter
+from RadarController import RadarController
+from Pipeline import RadarSource, Decoder, CouplingFilter, SectorBinner, AudioSink, RecorderSink
+from Display import DisplaySink
+from Renderer import RenderWorker, FramebufferSink, MjpegSink, WindowSink
+from Sprites import SpriteCache, SpriteRenderer
+from BirdsEye import BirdsEyeRenderer
+from Scenario import ScenarioWatcher
+from Watchdog import SensorWatchdog
+
+
+def build_pipeline(
+    bus,
+    scenario,
+    track,
+    CLIport,
+    Dataport,
+    ring=None,
+    history_window=0.5,
+    recordFileName=None,
+    render_target=None,
+    render_sprites=False,
+    sprite_cache_dir=".sprites",
+    birds_eye=False,
+    birds_eye_size=(320, 240),
+    open_ports=awr.openPorts,
+    seed=None,
+):
+    """
+    Build the stages of the pipeline of main.py: source -> decoder -> filters -> binner -> sinks, connected
+    by the frame bus, with the watchdog of the sensor, the watcher of the scenario and the display.
+
+    The stages are not started, and the display, which runs in the main thread, is not a stage.
+
+    Parameters:
+        bus (FrameBus): The bus connecting the stages.
+        scenario (Scenario): The scenario profile of the vehicle or use case.
+        track (Track): The track playing the notes of the sector states.
+        CLIport (Serial): The serial port for configuration.
+        Dataport (Serial): The serial port for data reception.
+        ring (SharedFrameRing): Optional shared memory ring into which the detected points are also written.
+        history_window (float): Time window (in seconds) over which the points of the last frames are
+            accumulated when the scenario has no occupancy grid, None shows the levels of the previous frame.
+        recordFileName (str): Recording file name of the sector states, None disables the recording.
+        render_target (str): Where the polar view is rendered off the main thread: "window", a framebuffer
+            device such as "/dev/fb0" or the path of a Motion JPEG stream. None draws it in the matplotlib
+            window of the display.
+        render_sprites (bool): Whether the rendered frames are composed from tiles pre-rendered once.
+        sprite_cache_dir (str): Directory of the pre-rendered tiles, None keeps them in memory only.
+        birds_eye (bool): Whether the top-down view of the points is shown, alongside the polar bars when
+            render_target is None, or instead of them on the render target.
+        birds_eye_size (tuple): Size in pixels of the top-down view on the render target.
+        open_ports (callable): Function opening the serial ports, used by the watchdog to recover the sensor.
+        seed (int): Seed of the random generator of the ego-motion fit, None for a random one.
+
+    Returns:
+        tuple: A tuple containing:
+            - stages (list): The stages, each running in its own thread once started.
+            - display (DisplaySink): The display updated in the main thread, None if there is none.
+            - watchdog (SensorWatchdog): The watchdog of the sensor, holding the ports in use.
+    """
+    theta_grids, r_distances, colors = scenario.theta_grids, scenario.r_distances, scenario.colors
+    stages = [
+        RadarSource(bus, Dataport),
+        Decoder(bus, scenario.configParameters, ring=ring, roi=scenario.roi),
+        CouplingFilter(bus, max_points=scenario.max_points),
+        EgoMotionFilter(bus, seed=seed, max_points=scenario.max_points),
+        SectorBinner(
+            bus,
+            theta_grids,
+            r_distances,
+            # The occupancy grid of the scenario, when it has one, replaces the history
+            history=(
+                PointHistory(n_frames=8, max_points=scenario.max_points)
+                if history_window is not None
+                else None
+            ),
+            window=history_window,
+            grid=scenario.occupancy_grid,
+            topic="motion_points",
+            max_points=scenario.max_points,
+        ),
+        AudioSink(bus, track, ttc_thresholds=scenario.ttc_thresholds),
+        ScenarioWatcher(bus, scenario, CLIport),
+    ]
+    # Report the sensor lost and recover it when it stops sending frames
+    watchdog = SensorWatchdog(
+        bus, CLIport, Dataport, scenario.config, scenario.configParameters, open_ports=open_ports
+    )
+    stages.append(watchdog)
+    if recordFileName is not None:
+        stages.append(RecorderSink(bus, recordFileName))
+    if scenario.adaptive_modes is not None:
+        stages.append(RadarController(bus, CLIport, scenario.config, scenario.adaptive_modes))
+
+    imageFileName = scenario.imageFileName
+    if birds_eye:
+        stages.append(
+            BirdsEyeRenderer(bus, theta_grids, r_distances, imageFileName, size=birds_eye_size)
+        )
+    if render_target is None:
+        display = DisplaySink(bus, theta_grids, r_distances, colors, imageFileName, birds_eye=birds_eye)
+    elif birds_eye:
+        display = None
+        if render_target == "window":
+            display = WindowSink(bus, size=birds_eye_size, topic="birds_eye")
+        elif render_target.startswith("/dev/fb"):
+            stages.append(FramebufferSink(bus, render_target, topic="birds_eye"))
+        else:
+            stages.append(MjpegSink(bus, render_target, topic="birds_eye"))
+    else:
+        if render_sprites:
+            cache = SpriteCache(
+                theta_grids, r_distances, colors, imageFileName, cacheDir=sprite_cache_dir
+            )
+            stages.append(SpriteRenderer(bus, cache))
+        else:
+            stages.append(RenderWorker(bus, theta_grids, r_distances, colors, imageFileName))
+        display = None
+        if render_target == "window":
+            display = WindowSink(bus)
+        elif render_target.startswith("/dev/fb"):
+            stages.append(FramebufferSink(bus, render_target))
+        else:
+            stages.append(MjpegSink(bus, render_target))
+    return stages, display, watchdog
@@ -0,0 +1,195 @@
+import numpy as np
+import utils
+
+# Maximum number of points kept per frame
+MAX_POINTS = 1024
+
+
+class PointHistory:
+    """
+    A preallocated ring buffer of the points of the last frames, used to accumulate the sparse detections of the radar.
+
+    The points are stored one after the other in flat float32 arrays, together with the time of the frame
+    they belong to. Since every frame holds at most max_points points and the arrays can hold n_frames
+    times as many, the points of the last n_frames frames are always available. The points of a time
+    window are contiguous in the ring, so a query costs O(points in the window) and uses constant memory.
+
+    Attributes:
+        n_frames (int): Number of frames kept.
+        max_points (int): Maximum number of points per frame.
+        r (ndarray): Ranges of the points in meters.
+        theta (ndarray): Angles of the points in degrees.
+        timestamps (ndarray): Time of the frame of each point.
+
+    Methods:
+        add: Append the points of a frame.
+        segments: Return the positions in the ring of the points received within a time window.
+        window: Return the points of the frames received within a time window.
+        weights: Compute the decay weight of the points of a window.
+        sector_min_range: Compute the minimum range per sector within a time window.
+        sector_density: Compute the (decay weighted) number of points per sector within a time window.
+    """
+
+    def __init__(self, n_frames=8, max_points=MAX_POINTS):
+        """
+        Initialize the PointHistory object.
+
+        Parameters:
+            n_frames (int): Number of frames kept.
+            max_points (int): Maximum number of points per frame.
+        """
+        self.n_frames = n_frames
+        self.max_points = max_points
+        self.capacity = n_frames * max_points
+        self.r = np.zeros(self.capacity, dtype=np.float32)
+        self.theta = np.zeros(self.capacity, dtype=np.float32)
+        self.timestamps = np.full(self.capacity, -np.inf)
+        # Work buffers of the queries, aligned with the ring
+        self.sectors = np.empty(self.capacity, dtype=np.int8)
+        self.mask = np.empty(self.capacity, dtype=bool)
+
+        # Time and position (as a running total of points) of the start of each frame
+        self.frame_timestamps = np.full(n_frames, -np.inf)
+        self.frame_starts = np.zeros(n_frames, dtype=np.int64)
+        self.frame_idx = 0
+        self.total = 0
+
+    def add(self, r, theta, timestamp):
+        """
+        Append the points of a frame, overwriting the oldest frame.
+
+        Parameters:
+            r (ndarray): Ranges of the points in meters.
+            theta (ndarray): Angles of the points in degrees.
+            timestamp (float): Time of the frame in seconds.
+        """
+        n = min(len(r), self.max_points)
+        start = self.total % self.capacity
+        # Split the copy in two when the frame wraps around the end of the ring
+        first = min(n, self.capacity - start)
+        self.r[start : start + first] = r[:first]
+        self.theta[start : start + first] = theta[:first]
+        self.timestamps[start : start + first] = timestamp
+        self.r[: n - first] = r[first:n]
+        self.theta[: n - first] = theta[first:n]
+        self.timestamps[: n - first] = timestamp
+
+        self.frame_timestamps[self.frame_idx] = timestamp
+        self.frame_starts[self.frame_idx] = self.total
+        self.frame_idx = (self.frame_idx + 1) % self.n_frames
+        self.total += n
+
+    def segments(self, now, max_age):
+        """
+        Return the positions in the ring of the points of the frames received within a time window.
+
+        Parameters:
+            now (float): The current time in seconds.
+            max_age (float): Length of the window in seconds.
+
+        Returns:
+            tuple: The (start, end) slices of the ring holding the points, two if the window
+                   wraps around its end.
+        """
+        recent = self.frame_timestamps >= now - max_age
+        if not recent.any():
+            return ()
+        first = int(self.frame_starts[recent].min())
+        start = first % self.capacity
+        end = start + self.total - first
+        if end <= self.capacity:
+            return ((start, end),)
+        return ((start, self.capacity), (0, end - self.capacity))
+
+    def window(self, now, max_age):
+        """
+        Return the points of the frames received within a time window.
+
+        Parameters:
+            now (float): The current time in seconds.
+            max_age (float): Length of the window in seconds.
+
+        Returns:
+            tuple: A tuple containing the ranges, angles and timestamps of the points
+                   (views of the ring unless the window wraps around its end).
+        """
+        segments = self.segments(now, max_age)
+        if not segments:
+            empty = self.r[:0]
+            return empty, self.theta[:0], self.timestamps[:0]
+        if len(segments) == 1:
+            start, end = segments[0]
+            return self.r[start:end], self.theta[start:end], self.timestamps[start:end]
+        return tuple(
+            np.concatenate([array[start:end] for start, end in segments])
+            for array in (self.r, self.theta, self.timestamps)
+        )
+
+    @staticmethod
+    def weights(timestamps, now, tau):
+        """
+        Compute the exponential decay weight of points.
+
+        Parameters:
+            timestamps (ndarray): Time of the frame of each point.
+            now (float): The current time in seconds.
+            tau (float): Time constant of the decay in seconds.
+
+        Returns:
+            ndarray: The weight of each point, 1 for a point of the current time.
+        """
+        return np.exp((timestamps - now) / tau)
+
+    def sector_min_range(self, theta_grids, now, max_age):
+        """
+        Compute the minimum range per sector over the frames received within a time window.
+
+        Parameters:
+            theta_grids (list): Edges of the sectors in degrees.
+            now (float): The current time in seconds.
+            max_age (float): Length of the window in seconds.
+
+        Returns:
+            ndarray: The minimum range of each sector in meters, inf for sectors without points.
+        """
+        n_sectors = len(theta_grids) - 1
+        min_range = np.full(n_sectors, np.inf)
+        segment_range = np.empty(n_sectors)
+        # Bin the points in place in the ring, without copying them
+        for start, end in self.segments(now, max_age):
+            sectors = utils.sector_index(
+                self.theta[start:end],
+                theta_grids,
+                out=self.sectors[start:end],
+                mask=self.mask[start:end],
+            )
+            utils.sector_reduce(
+                self.r[start:end],
+                sectors,
+                n_sectors,
+                np.inf,
+                segment_range,
+                mask=self.mask[start:end],
+            )
+            np.minimum(min_range, segment_range, out=min_range)
+        return min_range
+
+    def sector_density(self, theta_grids, now, max_age, tau=None):
+        """
+        Compute the number of points per sector over the frames received within a time window.
+
+        Parameters:
+            theta_grids (list): Edges of the sectors in degrees.
+            now (float): The current time in seconds.
+            max_age (float): Length of the window in seconds.
+            tau (float): Optional time constant of an exponential decay weighting of the points, in seconds.
+
+        Returns:
+            ndarray: The (weighted) number of points of each sector.
+        """
+        _, theta, timestamps = self.window(now, max_age)
+        n_sectors = len(theta_grids) - 1
+        sectors = utils.sector_index(theta, theta_grids)
+        inside = (sectors >= 0) & (sectors < n_sectors)
+        weights = None if tau is None else self.weights(timestamps[inside], now, tau)
+        return np.bincount(sectors[inside], weights=weights, minlength=n_sectors)
@@ -0,0 +1,155 @@
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba_array
+from PIL import Image
+
+
+def wedge_vertices(theta_grids, r_distances, step=3):
+    """
+    Compute the polygon of every sector x level cell of the polar plot.
+
+    Parameters:
+        theta_grids (list): Edges of the sectors in degrees.
+        r_distances (list): Edges of the levels in meters.
+        step (float): Maximum angle (in degrees) between two vertices of an arc.
+
+    Returns:
+        ndarray: The (theta, r) vertices of the cells, shape (n_sectors * n_levels, n_vertices, 2),
+                 with the cell of sector i and level j at index i * n_levels + j.
+    """
+    theta_grids = np.radians(np.asarray(theta_grids, dtype=float))
+    r_distances = np.asarray(r_distances, dtype=float)
+    n_sectors = len(theta_grids) - 1
+    n_levels = len(r_distances) - 1
+    n_arc = max(2, int(np.ceil(np.degrees(np.max(np.diff(theta_grids))) / step)) + 1)
+
+    # Sample the inner arc forwards and the outer arc backwards, so each cell is a closed polygon
+    t = np.linspace(0, 1, n_arc)
+    arcs = theta_grids[:-1, None] + np.diff(theta_grids)[:, None] * t
+    vertices = np.empty((n_sectors, n_levels, 2 * n_arc, 2))
+    vertices[:, :, :n_arc, 0] = arcs[:, None, :]
+    vertices[:, :, n_arc:, 0] = arcs[:, None, ::-1]
+    vertices[:, :, :n_arc, 1] = r_distances[None, :-1, None]
+    vertices[:, :, n_arc:, 1] = r_distances[None, 1:, None]
+    return vertices.reshape(n_sectors * n_levels, 2 * n_arc, 2)
+
+
+def binned_with(state, theta_grids, r_distances):
+    """
+    Tell whether a sector state was binned with the given sectors and levels.
+
+    After a scenario is reloaded, the binner keeps publishing states binned with the previous sectors
+    and levels until it swaps in the new ones, so the sinks only switch to the new plot (and draw on it)
+    once a state binned with them arrives.
+
+    Parameters:
+        state (dict): The sector state published by the binner.
+        theta_grids (list): Edges of the sectors in degrees.
+        r_distances (list): Edges of the levels in meters.
+
+    Returns:
+        bool: Whether the state has as many sectors and levels.
+    """
+    return state["n_sectors"] == len(theta_grids) - 1 and state["n_levels"] == len(r_distances) - 1
+
+
+class PolarView:
+    """
+    The polar bar plot of the sector state over the figure of a car, drawn on a matplotlib figure.
+
+    Every sector x level cell of the plot is a polygon of a single PolyCollection, so drawing a new
+    state only takes one update of the face colors, whatever the number of sectors and levels.
+    It does not depend on pyplot, so it can be drawn on a figure of any backend.
+
+    Attributes:
+        theta_grids (list): Edges of the sectors in degrees.
+        r_distances (list): Edges of the levels in meters.
+
+    Methods:
+        draw_state: Update the plot with a sector state.
+    """
+
+    def __init__(self, fig, theta_grids, r_distances, colors, imageFileName="car.jpg"):
+        """
+        Initialize the PolarView object.
+
+        Parameters:
+            fig (Figure): The figure to draw on.
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            colors (list): Color of each level.
+            imageFileName (str): The path to the figure of the car.
+        """
+        self.theta_grids = theta_grids
+        self.r_distances = r_distances
+        self.maxdistance = r_distances[-1]
+        n_sectors = len(theta_grids) - 1
+        self.n_levels = len(r_distances) - 1
+
+        # Look-up table of the color of each level, and face colors of all cells (transparent when empty)
+        self.level_colors = to_rgba_array(colors)
+        self.facecolors = np.zeros((n_sectors * self.n_levels, 4))
+        self.cell_offsets = np.arange(n_sectors) * self.n_levels
+        self.levels = np.full(n_sectors, -1)
+
+        # Open the image file and convert it to a numpy array
+        img = Image.open(imageFileName)
+        img = np.array(img)
+
+        # Add a subplot for the image and display it without axis
+        ax2 = fig.add_subplot(212, polar=False)
+        ax2.imshow(img)
+        ax2.axis("off")
+
+        # Add a subplot for the polar plot
+        self.ax = fig.add_subplot(projection="polar")
+
+        # Set the theta grids, rorigin, theta zero location, thetamin, and thetamax for the polar plot (definition of the GUI)
+        self.ax.set_thetagrids(theta_grids)
+        self.ax.set_rorigin(-0.5)
+        self.ax.set_theta_zero_location("N")
+        self.ax.set_thetamin(theta_grids[0])
+        self.ax.set_thetamax(theta_grids[-1])
+
+        self.text_box = self.ax.text(
+            0, 2.2, "Distance: --.-- m", fontsize=13, horizontalalignment="center"
+        )
+
+        # Create the cells of every sector and level once
+        self.cells = PolyCollection(
+            wedge_vertices(theta_grids, r_distances),
+            facecolors=self.facecolors,
+            edgecolors="none",
+        )
+        self.ax.add_collection(self.cells)
+
+        # Set the radial ticks and maximum distance for the plot
+        self.ax.set_rticks(self.r_distances)
+        self.ax.set_rmax(self.maxdistance)
+
+    def draw_state(self, state):
+        """
+        Update the plot with a sector state.
+
+        Parameters:
+            state (dict): The sector state published by the binner.
+        """
+        # Color the cell of the level of each sector with an object, the others stay transparent
+        levels = np.asarray(state["levels"])
+        if not np.array_equal(levels, self.levels):
+            shown = levels != -1
+            self.facecolors[:] = 0
+            self.facecolors[self.cell_offsets[shown] + levels[shown]] = self.level_colors[
+                levels[shown]
+            ]
+            self.cells.set_facecolor(self.facecolors)
+            self.levels = levels
+
+        if state.get("sensor_lost"):
+            # Make clear that the bars do not show the scene while the radar is recovered
+            self.text_box.set_text("Sensor lost")
+        elif state["distance"] is not None:
+            self.text_box.set_text("Distance: %0.02f m" % state["distance"])
+        else:
+            # If no sector shows an object, display no objects detected
+            self.text_box.set_text("Distance: --.-- m")
@@ -0,0 +1,298 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+
+
+class ThreadProfile(cProfile.Profile):
+    """
+    cProfile profiler of one thread, whose statistics can be read from another thread while it runs.
+    """
+
+    def create_stats(self):
+        # Only the thread running the profiler can disable it, it is disabled at the end of its span
+        self.snapshot_stats()
+
+
+class Span:
+    """
+    Context manager recording the time spent in a block of code as a span of the profiler.
+    """
+
+    def __init__(self, profiler, name):
+        """
+        Initialize the Span object.
+
+        Parameters:
+            profiler (Profiler): The profiler recording the span.
+            name (str): The name of the span.
+        """
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler.disable()
+        self.profiler.record(self.name, self.start, end)
+        return False
+
+
+class NullSpan:
+    """
+    Context manager doing nothing, used while the profiler is inactive.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    """
+    A profiler of the pipeline that can be switched on at runtime, e.g. with a signal, on a device in the field.
+
+    While active, every step of the stages, and every span recorded by the main loop or the audio threads,
+    runs under a cProfile profiler of its thread and is recorded with its thread, so the stalls of any
+    thread show up. From Python 3.12, where only one cProfile profiler can be enabled at a time, a span
+    overlapping the one of another thread is recorded without its own.
+    After a given number of radar frames the profiler stops by itself and writes:
+        - <fileName>.pstats: the merged cProfile statistics of all threads (see the pstats module or snakeviz).
+        - <fileName>.trace.json: the spans in the Chrome trace event format, to open with Perfetto or chrome://tracing,
+          with the counters recorded by the stages (e.g. the points kept by the decoder) as counter tracks.
+    While inactive, the overhead is one attribute check per step.
+
+    Attributes:
+        active (bool): Whether the profiler is recording.
+        fileName (str): The path of the output files, without extension.
+
+    Methods:
+        start: Start recording for a number of frames.
+        stop: Stop recording and write the output files.
+        enable: Enable the cProfile profiler of the calling thread.
+        disable: Disable the cProfile profiler of the calling thread.
+        span: Return a context manager recording a span.
+        record: Record a span.
+        counter: Record the values of a counter.
+        run_step: Run a step of a stage, recording it while active.
+        frame: Count a radar frame.
+    """
+
+    def __init__(self):
+        """
+        Initialize the Profiler object.
+        """
+        self.active = False
+        self.fileName = None
+        self.remaining = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.session = 0
+        self.profiles = []
+        self.spans = []
+        self.counters = []
+        self.thread_names = {}
+
+    def start(self, n_frames=100, fileName="raspas-profile"):
+        """
+        Start recording for a number of frames.
+
+        Parameters:
+            n_frames (int): Number of radar frames after which the profiler stops.
+            fileName (str): The path of the output files, without extension.
+        """
+        with self.lock:
+            if self.active:
+                return
+            self.profiles = []
+            self.spans = []
+            self.counters = []
+            self.thread_names = {}
+            self.session += 1
+            self.fileName = fileName
+            self.remaining = n_frames
+            self.active = True
+
+    def stop(self):
+        """
+        Stop recording and write the output files.
+        """
+        with self.lock:
+            if not self.active:
+                return
+            self.active = False
+            profiles = list(self.profiles)
+            spans = list(self.spans)
+            counters = list(self.counters)
+            thread_names = dict(self.thread_names)
+
+        stats = None
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # Profile of a thread that was enabled but did not run any function
+                continue
+        if stats is not None:
+            stats.dump_stats(self.fileName + ".pstats")
+
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        events += [
+            {
+                "name": name,
+                "ph": "X",
+                "pid": pid,
+                "tid": tid,
+                "ts": start * 1e6,
+                "dur": (end - start) * 1e6,
+            }
+            for name, tid, start, end in spans
+        ]
+        events += [
+            {"name": name, "ph": "C", "pid": pid, "ts": timestamp * 1e6, "args": values}
+            for name, timestamp, values in counters
+        ]
+        with open(self.fileName + ".trace.json", "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def enable(self):
+        """
+        Enable the cProfile profiler of the calling thread, creating it the first time.
+
+        The calls may be nested, the profiler is only disabled by the outermost call to disable.
+        The profiler is left disabled if another one is enabled and the Python version only allows one.
+        """
+        local = self.local
+        if getattr(local, "session", None) != self.session and getattr(local, "depth", 0) == 0:
+            # First span of the thread since the profiler started
+            local.profile = ThreadProfile()
+            local.session = self.session
+            local.depth = 0
+            with self.lock:
+                self.profiles.append(local.profile)
+        if local.depth == 0:
+            try:
+                local.profile.enable()
+                local.enabled = True
+            except ValueError:
+                # From Python 3.12 only one cProfile profiler of the process can be enabled at a time: the
+                # span is recorded without it, the functions it calls show up in the one of the other thread
+                local.enabled = False
+        local.depth += 1
+
+    def disable(self):
+        """
+        Disable the cProfile profiler of the calling thread.
+        """
+        local = self.local
+        if getattr(local, "depth", 0) == 0:
+            return
+        local.depth -= 1
+        if local.depth == 0 and local.enabled:
+            local.profile.disable()
+
+    def span(self, name):
+        """
+        Return a context manager recording a span, doing nothing while inactive.
+
+        Parameters:
+            name (str): The name of the span.
+
+        Returns:
+            The context manager.
+        """
+        if not self.active:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name, start, end):
+        """
+        Record a span of the calling thread.
+
+        Parameters:
+            name (str): The name of the span.
+            start (float): The start of the span (time.perf_counter).
+            end (float): The end of the span (time.perf_counter).
+        """
+        if not self.active:
+            return
+        thread = threading.current_thread()
+        with self.lock:
+            self.spans.append((name, thread.ident, start, end))
+            self.thread_names[thread.ident] = thread.name
+
+    def counter(self, name, values):
+        """
+        Record the values of a counter, shown as a counter track of the trace.
+
+        Parameters:
+            name (str): The name of the counter.
+            values (dict): The values of its series, by name.
+        """
+        if not self.active:
+            return
+        with self.lock:
+            self.counters.append((name, time.perf_counter(), values))
+
+    def run_step(self, stage):
+        """
+        Run a step of a stage, under the cProfile profiler of its thread while active.
+
+        The span starts when the stage receives its input, so the time spent waiting for it is not
+        counted, and steps that received nothing are not recorded.
+
+        Parameters:
+            stage (Stage): The stage.
+        """
+        if not self.active:
+            stage.step()
+            return
+        subscription = getattr(stage, "input", None)
+        received = subscription.received if subscription is not None else None
+        self.enable()
+        start = time.perf_counter()
+        try:
+            stage.step()
+        finally:
+            end = time.perf_counter()
+            self.disable()
+        if subscription is not None:
+            if subscription.received == received:
+                return
+            start = max(start, subscription.received)
+        self.record(stage.span_name or type(stage).__name__, start, end)
+
+    def frame(self):
+        """
+        Count a radar frame, stopping the profiler once the requested number of frames is reached.
+        """
+        if not self.active:
+            return
+        with self.lock:
+            self.remaining -= 1
+            done = self.remaining <= 0
+        if done:
+            self.stop()
+
+
+# The profiler shared by the stages, the main loop and the audio threads
+profiler = Profiler()
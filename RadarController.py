@@ -0,0 +1,164 @@
+import time
+import AWR1843 as awr
+from Pipeline import Stage
+
+
+def configure_lines(config, framePeriodicity=None, maxRange=None, profileCfg=None):
+    """
+    Change the frame period, the range window and/or the chirp profile of configuration commands.
+
+    Parameters:
+        config (list): The configuration commands, one per line.
+        framePeriodicity (float): The new frame period in milliseconds (frameCfg).
+        maxRange (float): The new maximum range of the detected points in meters (range cfarFovCfg).
+        profileCfg (str): The new profileCfg command, e.g. to trade range resolution against maximum range.
+
+    Returns:
+        list: The changed configuration commands.
+    """
+    lines = []
+    for i in config:
+        splitWords = i.split(" ")
+        if splitWords[0] == "frameCfg" and framePeriodicity is not None:
+            splitWords[5] = "%g" % framePeriodicity
+        elif splitWords[0] == "cfarFovCfg" and splitWords[2] == "0" and maxRange is not None:
+            splitWords[4] = "%g" % maxRange
+        elif splitWords[0] == "profileCfg" and profileCfg is not None:
+            splitWords = profileCfg.split(" ")
+        lines.append(" ".join(splitWords))
+    return lines
+
+
+class RadarController(Stage):
+    """
+    Stage adapting the frame rate and the range window of the radar to the scene, without restarting the process.
+
+    The modes are tried in order: the first mode whose distance is above the distance of the closest
+    object is selected, and the last mode is used when the scene is empty. A mode typically raises the
+    frame rate and narrows the range window as the obstacles get closer. The mode only changes after
+    it has been selected for `hold` consecutive frames, and the radar is then reconfigured through the
+    CLI port with sensorStop, the changed commands and sensorStart.
+
+    The parameters derived from the new configuration are published on the "config" topic, so the
+    decoder can use them for the next packets. The configuration and the modes are replaced by the ones
+    of a Scenario published on the "scenario" topic when its profile is reloaded.
+
+    Attributes:
+        mode (int): Index of the current mode.
+        reconfigurations (int): Number of reconfigurations done.
+        last_duration (float): Duration of the last reconfiguration in seconds.
+    """
+
+    def __init__(self, bus, CLIport, config, modes, hold=4, numRxAnt=1, numTxAnt=1):
+        """
+        Initialize the RadarController object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            CLIport (Serial): The serial port for configuration.
+            config (list): The configuration commands sent to the radar at startup, one per line.
+            modes (list): The modes as (distance, settings) tuples sorted by increasing distance, where
+                          settings are keyword arguments of configure_lines. The distance of the last
+                          mode is ignored.
+            hold (int): Number of consecutive frames a new mode must be selected before switching to it.
+            numRxAnt (int): Number of receiving antennas.
+            numTxAnt (int): Number of transmitting antennas.
+        """
+        super().__init__(bus)
+        self.CLIport = CLIport
+        self.config = config
+        self.modes = modes
+        self.hold = hold
+        self.numRxAnt = numRxAnt
+        self.numTxAnt = numTxAnt
+        # The radar starts with the configuration file, which corresponds to no mode
+        self.mode = None
+        self.candidate = None
+        self.count = 0
+        self.reconfigurations = 0
+        self.last_duration = 0.0
+        self.input = bus.subscribe("sectors", depth=1)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+        self.ports_input = bus.subscribe("ports", depth=1)
+
+    def select_mode(self, distance):
+        """
+        Select the mode for the distance of the closest object.
+
+        Parameters:
+            distance (float): The distance of the closest object in meters, None if there is none.
+
+        Returns:
+            int: The index of the mode.
+        """
+        if distance is not None:
+            for i, (mode_distance, _) in enumerate(self.modes[:-1]):
+                if distance < mode_distance:
+                    return i
+        return len(self.modes) - 1
+
+    def step(self):
+        """
+        Select the mode from the latest sector state and reconfigure the radar if it changed.
+        """
+        ports = self.ports_input.latest()
+        if ports is not None:
+            self.CLIport = ports["CLIport"]
+        # The radar was reconfigured with the configuration of a reloaded scenario, which is no mode
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.config = scenario.config
+            self.modes = scenario.adaptive_modes or []
+            self.mode = None
+            self.candidate = None
+
+        state = self.input.get(timeout=0.1)
+        if state is None or not self.modes:
+            return
+        mode = self.select_mode(state["distance"])
+        if mode == self.mode:
+            self.candidate = None
+            return
+
+        # Wait for the new mode to be selected for a few frames before switching
+        if mode != self.candidate:
+            self.candidate = mode
+            self.count = 0
+        self.count += 1
+        if self.count >= self.hold:
+            self.reconfigure(mode)
+
+    def reconfigure(self, mode):
+        """
+        Reconfigure the radar for a mode and publish the new configuration parameters.
+
+        Parameters:
+            mode (int): The index of the mode.
+        """
+        start = time.monotonic()
+        config = configure_lines(self.config, **self.modes[mode][1])
+        # Only send the commands that changed between sensorStop and sensorStart
+        current = self.config
+        if self.mode is not None:
+            current = configure_lines(self.config, **self.modes[self.mode][1])
+        changed = [line for line, old in zip(config, current) if line != old]
+        self.mode = mode
+        self.candidate = None
+        if not changed:
+            return
+        try:
+            awr.sendConfig(self.CLIport, ["sensorStop"] + changed + ["sensorStart"])
+        except OSError:
+            # The radar is gone, the SensorWatchdog replays the configuration once it is back
+            self.mode = None
+            return
+
+        configParameters = awr.parseConfigLines(
+            config, numRxAnt=self.numRxAnt, numTxAnt=self.numTxAnt
+        )
+        self.reconfigurations += 1
+        self.last_duration = time.monotonic() - start
+        self.bus.publish(
+            "config",
+            {"mode": mode, "config": config, "configParameters": configParameters},
+        )
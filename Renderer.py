@@ -0,0 +1,249 @@
+import io
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+from Pipeline import Stage
+from PolarView import PolarView, binned_with
+
+
+class RenderWorker(Stage):
+    """
+    Stage rasterising the polar view of the sector state into an RGB NumPy buffer with the Agg backend,
+    off the main thread, and publishing it on the "render" topic.
+
+    It only renders the latest change of the sector state, so states are dropped instead of delaying the acquisition
+    when rendering falls behind. Each published frame is a new (height, width, 3) uint8 array.
+    """
+
+    span_name = "draw"
+
+    def __init__(
+        self, bus, theta_grids, r_distances, colors, imageFileName="car.jpg", size=(640, 480)
+    ):
+        """
+        Initialize the RenderWorker object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            colors (list): Color of each level.
+            imageFileName (str): The path to the figure of the car.
+            size (tuple): Width and height of the rendered frames in pixels.
+        """
+        super().__init__(bus)
+        # The figure is only used by the worker thread and does not depend on pyplot
+        dpi = 100
+        self.figure = Figure(figsize=(size[0] / dpi, size[1] / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.view = PolarView(self.figure, theta_grids, r_distances, colors, imageFileName)
+        self.input = bus.subscribe("changes", depth=1)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+        # A reloaded scenario waiting for the binner to swap in its sectors and levels
+        self.scenario = None
+
+    def step(self):
+        """
+        Render the latest sector state and publish the frame.
+        """
+        state = self.input.get(timeout=0.1)
+        if state is None:
+            return
+        # Skip to the newest state if more arrived while waiting
+        newer = self.input.latest()
+        if newer is not None:
+            state = newer
+
+        # Rebuild the plot for the sectors, levels and colors of a reloaded scenario, from the first state
+        # binned with them (the scenario is read after the state, as the binner swaps it in before)
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.scenario = scenario
+        if self.scenario is not None and binned_with(
+            state, self.scenario.theta_grids, self.scenario.r_distances
+        ):
+            self.figure.clear()
+            self.view = PolarView(
+                self.figure,
+                self.scenario.theta_grids,
+                self.scenario.r_distances,
+                self.scenario.colors,
+                self.scenario.imageFileName,
+            )
+            self.scenario = None
+        if not binned_with(state, self.view.theta_grids, self.view.r_distances):
+            return
+        self.view.draw_state(state)
+        self.canvas.draw()
+        rgb = np.asarray(self.canvas.buffer_rgba())[:, :, :3].copy()
+        self.bus.publish("render", {"frameNumber": state["frameNumber"], "image": rgb})
+
+
+class FramebufferSink(Stage):
+    """
+    Sink stage copying the rendered frames to a Linux framebuffer device such as /dev/fb0.
+
+    The frames are placed at the top left corner of the screen, cropped if needed, and converted
+    to the 16 (RGB565) or 32 (BGRA) bits per pixel format of the framebuffer. The lines of the
+    framebuffer are stride bytes apart, which may be more than the width of the screen (padding
+    for alignment), so the screen is a view of a buffer laid out like the framebuffer.
+    """
+
+    def __init__(self, bus, device="/dev/fb0", topic="render"):
+        """
+        Initialize the FramebufferSink object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            device (str): The path of the framebuffer device.
+            topic (str): The topic of the rendered frames, "render" or "birds_eye".
+        """
+        super().__init__(bus)
+        name = device.rsplit("/", 1)[-1]
+        with open("/sys/class/graphics/%s/virtual_size" % name) as f:
+            self.width, self.height = [int(i) for i in f.read().split(",")]
+        with open("/sys/class/graphics/%s/bits_per_pixel" % name) as f:
+            self.bits_per_pixel = int(f.read())
+        # Length of a line of the framebuffer in bytes, including its padding
+        with open("/sys/class/graphics/%s/stride" % name) as f:
+            self.stride = int(f.read())
+        self.buffer = np.zeros(self.height * self.stride, dtype=np.uint8)
+        if self.bits_per_pixel == 16:
+            self.screen = np.ndarray(
+                (self.height, self.width), dtype=np.uint16, buffer=self.buffer, strides=(self.stride, 2)
+            )
+        elif self.bits_per_pixel == 32:
+            self.screen = np.ndarray(
+                (self.height, self.width, 4),
+                dtype=np.uint8,
+                buffer=self.buffer,
+                strides=(self.stride, 4, 1),
+            )
+        else:
+            raise ValueError("Unsupported framebuffer depth: %d bits" % self.bits_per_pixel)
+        self.device = open(device, "r+b")
+        self.input = bus.subscribe(topic, depth=1)
+
+    def step(self):
+        """
+        Copy the latest rendered frame to the framebuffer.
+        """
+        frame = self.input.get(timeout=0.1)
+        if frame is None:
+            return
+        image = frame["image"][: self.height, : self.width]
+        height, width = image.shape[:2]
+        if self.bits_per_pixel == 16:
+            rgb = image.astype(np.uint16)
+            self.screen[:height, :width] = (
+                ((rgb[:, :, 0] >> 3) << 11) | ((rgb[:, :, 1] >> 2) << 5) | (rgb[:, :, 2] >> 3)
+            )
+        else:
+            self.screen[:height, :width, :3] = image[:, :, ::-1]
+            self.screen[:height, :width, 3] = 255
+        self.device.seek(0)
+        self.device.write(self.buffer)
+        self.device.flush()
+
+    def stop(self):
+        """
+        Stop the stage thread and close the device.
+        """
+        super().stop()
+        self.device.close()
+
+
+class MjpegSink(Stage):
+    """
+    Sink stage appending the rendered frames as JPEG images to a Motion JPEG stream,
+    e.g. a file or a named pipe read by `ffplay -f mjpeg`.
+    """
+
+    def __init__(self, bus, fileName, quality=80, topic="render"):
+        """
+        Initialize the MjpegSink object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            fileName (str): The path of the stream.
+            quality (int): The JPEG quality (1 to 95).
+            topic (str): The topic of the rendered frames, "render" or "birds_eye".
+        """
+        super().__init__(bus)
+        self.quality = quality
+        self.file = open(fileName, "wb")
+        self.buffer = io.BytesIO()
+        self.input = bus.subscribe(topic, depth=1)
+
+    def step(self):
+        """
+        Encode the latest rendered frame and append it to the stream.
+        """
+        frame = self.input.get(timeout=0.1)
+        if frame is None:
+            return
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        Image.fromarray(frame["image"]).save(self.buffer, format="JPEG", quality=self.quality)
+        self.file.write(self.buffer.getvalue())
+        self.file.flush()
+
+    def stop(self):
+        """
+        Stop the stage thread and close the stream.
+        """
+        super().stop()
+        self.file.close()
+
+
+class WindowSink:
+    """
+    A sink showing the rendered frames in a pygame window.
+
+    Like DisplaySink it is updated from the main thread, but it only blits the frames already
+    rendered by the RenderWorker, so the main loop never waits on a redraw.
+
+    Methods:
+        update: Show the latest rendered frame, if any.
+        pause: Wait before the next update.
+    """
+
+    def __init__(self, bus, size=(640, 480), caption="RasPAS", topic="render"):
+        """
+        Initialize the WindowSink object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            size (tuple): Width and height of the window in pixels.
+            caption (str): Title of the window.
+            topic (str): The topic of the rendered frames, "render" or "birds_eye".
+        """
+        import pygame
+
+        self.pygame = pygame
+        self.screen = pygame.display.set_mode(size)
+        pygame.display.set_caption(caption)
+        self.input = bus.subscribe(topic, depth=1)
+
+    def update(self):
+        """
+        Show the latest rendered frame, if any.
+        """
+        # Keep the window responsive
+        self.pygame.event.pump()
+        frame = self.input.latest()
+        if frame is None:
+            return
+        # pygame surfaces are indexed as [x, y]
+        self.pygame.surfarray.blit_array(self.screen, frame["image"].swapaxes(0, 1))
+        self.pygame.display.flip()
+
+    def pause(self, interval=0.05):
+        """
+        Wait before the next update.
+
+        Parameters:
+            interval (float): Time to wait in seconds.
+        """
+        self.pygame.time.wait(int(interval * 1000))
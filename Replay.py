@@ -0,0 +1,209 @@
+import struct
+import time
+import numpy as np
+import utils
+
+MAGIC_WORD = bytes([2, 1, 4, 3, 6, 5, 8, 7])
+# Types of the TLV messages of the detected points and of their side information
+MMWDEMO_UART_MSG_DETECTED_POINTS = 1
+MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO = 7
+
+
+def encode_packet(frameNumber, x, y, z, velocity, snr=None):
+    """
+    Encode detected points into a packet of the AWR1843 out-of-box demo, as parsed by readAndParseData18xx_2d.
+
+    Parameters:
+        frameNumber (int): The frame number.
+        x (ndarray): The x-coordinates of the points in meters.
+        y (ndarray): The y-coordinates of the points in meters.
+        z (ndarray): The z-coordinates of the points in meters.
+        velocity (ndarray): The radial velocity of the points in m/s.
+        snr (ndarray): Optional SNR of the points in dB, sent as their side information.
+
+    Returns:
+        bytes: The packet, header included.
+    """
+    if len(x) == 0:
+        # Like the radar, a frame without any detected point holds no TLV message
+        tlv, numTLVs = b"", 0
+    else:
+        points = np.stack([x, y, z, velocity], axis=1).astype("<f4").tobytes()
+        tlv = struct.pack("<II", MMWDEMO_UART_MSG_DETECTED_POINTS, len(points)) + points
+        numTLVs = 1
+    if snr is not None and len(x):
+        # SNR and noise of every point in 0.1 dB, the noise being left to 0
+        sideInfo = np.stack([np.round(np.asarray(snr) * 10), np.zeros(len(x))], axis=1)
+        sideInfo = sideInfo.astype("<i2").tobytes()
+        tlv += struct.pack("<II", MMWDEMO_OUTPUT_MSG_DETECTED_POINTS_SIDE_INFO, len(sideInfo))
+        tlv += sideInfo
+        numTLVs += 1
+    # Magic word, version, total packet length, platform, frame number, CPU cycles, number of detected
+    # objects, number of TLVs and subframe number
+    header = MAGIC_WORD + struct.pack(
+        "<IIIIIIII", 0x03060000, 40 + len(tlv), 0x000A1843, frameNumber, 0, len(x), numTLVs, 0
+    )
+    return header + tlv
+
+
+def split_packets(data):
+    """
+    Split a recording of the raw bytes of the data port into packets, at the magic words.
+
+    Parameters:
+        data (bytes): The recorded bytes.
+
+    Returns:
+        list: The packets, without the bytes before the first magic word.
+    """
+    starts = []
+    start = data.find(MAGIC_WORD)
+    while start != -1:
+        starts.append(start)
+        start = data.find(MAGIC_WORD, start + len(MAGIC_WORD))
+    return [data[a:b] for a, b in zip(starts, starts[1:] + [len(data)])]
+
+
+def synthetic_scene(n_frames, frame_period=0.05, n_points=6, seed=0):
+    """
+    Generate the packets of a deterministic scene: an obstacle approached down to a few centimeters and
+    left again, sweeping across the field of view, so the levels, the sectors and the notes change.
+
+    Parameters:
+        n_frames (int): Number of frames.
+        frame_period (float): Time between frames in seconds, used for the Doppler velocity of the points.
+        n_points (int): Number of points of the obstacle in each frame.
+        seed (int): Seed of the random number generator of the scatter of the points.
+
+    Returns:
+        list: The packets, one per frame, numbered from 0.
+    """
+    rng = np.random.default_rng(seed)
+    frames = np.arange(n_frames)
+    # Range of the obstacle going back and forth between 1.5 m and 0.15 m, every 100 frames
+    distance = 0.825 + 0.675 * np.cos(2 * np.pi * frames / 100)
+    speed = np.gradient(distance) / frame_period
+    # Azimuth of the obstacle sweeping between -40 and 40 degrees behind the car, every 140 frames
+    azimuth = 90 + 40 * np.sin(2 * np.pi * frames / 140)
+
+    packets = []
+    for i in frames:
+        r = distance[i] + rng.normal(0, 0.02, n_points)
+        theta = np.radians(azimuth[i] + rng.normal(0, 2, n_points))
+        x, y = utils.polar_to_position(r, theta)
+        z = rng.normal(0, 0.05, n_points)
+        velocity = np.full(n_points, speed[i]) + rng.normal(0, 0.02, n_points)
+        packets.append(encode_packet(int(i), x, y, z, velocity))
+    return packets
+
+
+class ReplayPort:
+    """
+    A file-like stand-in of the data serial port, releasing recorded or synthetic packets at the pace of
+    the radar, e.g. to run the pipeline without a radar and measure its latency.
+
+    Attributes:
+        packets (list): The packets, in order.
+        period (float): Time between packets in seconds (None releases them all at once).
+        arrivals (list): Time (time.perf_counter) at which each packet was released, None until it is.
+
+    Methods:
+        start: Start releasing the packets.
+        read: Read bytes of the released packets.
+        done: Whether every packet has been read.
+        close: Close the port.
+    """
+
+    def __init__(self, packets, period=None, max_bytes=8192):
+        """
+        Initialize the ReplayPort object.
+
+        Parameters:
+            packets (list): The packets, in order.
+            period (float): Time between packets in seconds (None releases them all at once).
+            max_bytes (int): Maximum number of bytes returned by a read, so that a burst of packets does not
+                             overflow the byte buffer of the parser.
+        """
+        self.packets = packets
+        self.period = period
+        self.max_bytes = max_bytes
+        self.arrivals = [None] * len(packets)
+        self.start_time = None
+        self.released = 0
+        self.buffer = bytearray()
+
+    @classmethod
+    def from_file(cls, fileName, period=None, max_bytes=8192):
+        """
+        Create a port replaying a recording of the raw bytes of the data port.
+
+        Parameters:
+            fileName (str): The path to the recording.
+            period (float): Time between packets in seconds (None releases them all at once).
+            max_bytes (int): Maximum number of bytes returned by a read.
+
+        Returns:
+            ReplayPort: The port.
+        """
+        with open(fileName, "rb") as f:
+            return cls(split_packets(f.read()), period=period, max_bytes=max_bytes)
+
+    def start(self):
+        """
+        Start releasing the packets.
+        """
+        self.start_time = time.perf_counter()
+
+    def release(self):
+        """
+        Release the packets that are due, recording their time of arrival.
+        """
+        if self.start_time is None:
+            return
+        now = time.perf_counter()
+        if self.period is None:
+            due = len(self.packets)
+        else:
+            due = min(len(self.packets), int((now - self.start_time) / self.period) + 1)
+        for i in range(self.released, due):
+            self.arrivals[i] = now if self.period is None else self.start_time + i * self.period
+            self.buffer += self.packets[i]
+        self.released = max(self.released, due)
+
+    @property
+    def in_waiting(self):
+        """
+        Number of bytes that can be read.
+        """
+        self.release()
+        return min(len(self.buffer), self.max_bytes)
+
+    def read(self, size=1):
+        """
+        Read bytes of the released packets.
+
+        Parameters:
+            size (int): Maximum number of bytes to read.
+
+        Returns:
+            bytes: The bytes read.
+        """
+        self.release()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def done(self):
+        """
+        Whether every packet has been read.
+
+        Returns:
+            bool: True once the last packet has been released and read.
+        """
+        return self.released == len(self.packets) and not self.buffer
+
+    def close(self):
+        """
+        Close the port.
+        """
+        self.buffer.clear()
@@ -0,0 +1,181 @@
+import numpy as np
+import utils
+
+# Attributes of the detected points, filtered together
+POINT_FIELDS = ("x", "y", "z", "velocity", "snr")
+
+
+class RoiFilter:
+    """
+    A pre-filter of the detected points, keeping the points of the region of interest and optionally
+    downsampling them on a voxel grid, so the stages after the decoder only see the points that matter.
+
+    The region is bounded by the range (in the plane of the radar), the azimuth (in degrees, 0 pointing
+    straight behind the car like the sectors), the height, the absolute radial velocity and the SNR of the
+    points, each bound being optional (None). The SNR bound only applies when the radar sends the side
+    information of the points (guiMonitor). The bounds are evaluated with vectorized comparisons in
+    preallocated masks, and the points kept are moved to the front of the arrays of the frame, in place,
+    through a preallocated buffer, so a frame is filtered without allocating memory per point.
+
+    With a voxel size, the points falling into the same cubic voxel are merged into one point, whose
+    attributes are the means of theirs, so dense reflectors do not weigh more than sparse ones.
+
+    Attributes:
+        min_range (float): Minimum range in meters.
+        max_range (float): Maximum range in meters.
+        min_azimuth (float): Minimum azimuth in degrees.
+        max_azimuth (float): Maximum azimuth in degrees.
+        min_z (float): Minimum height in meters.
+        max_z (float): Maximum height in meters.
+        min_speed (float): Minimum absolute radial velocity in m/s.
+        max_speed (float): Maximum absolute radial velocity in m/s.
+        min_snr (float): Minimum SNR in dB.
+        voxel_size (float): Edge of the voxels in meters, None keeps every point.
+
+    Methods:
+        apply: Filter the points of a frame in place.
+        downsample: Merge the points of a frame falling into the same voxel.
+    """
+
+    def __init__(
+        self,
+        min_range=None,
+        max_range=None,
+        min_azimuth=None,
+        max_azimuth=None,
+        min_z=None,
+        max_z=None,
+        min_speed=None,
+        max_speed=None,
+        min_snr=None,
+        voxel_size=None,
+        max_points=1024,
+    ):
+        """
+        Initialize the RoiFilter object.
+
+        Parameters:
+            min_range (float): Minimum range in meters, None for no bound.
+            max_range (float): Maximum range in meters, None for no bound.
+            min_azimuth (float): Minimum azimuth in degrees, None for no bound.
+            max_azimuth (float): Maximum azimuth in degrees, None for no bound.
+            min_z (float): Minimum height in meters, None for no bound.
+            max_z (float): Maximum height in meters, None for no bound.
+            min_speed (float): Minimum absolute radial velocity in m/s, None for no bound.
+            max_speed (float): Maximum absolute radial velocity in m/s, None for no bound.
+            min_snr (float): Minimum SNR in dB, None for no bound.
+            voxel_size (float): Edge of the voxels in meters, None keeps every point.
+            max_points (int): Initial size of the masks, grown if a frame holds more points.
+        """
+        if voxel_size is not None and voxel_size <= 0:
+            raise ValueError("voxel_size should be positive")
+        self.min_range = min_range
+        self.max_range = max_range
+        self.min_azimuth = min_azimuth
+        self.max_azimuth = max_azimuth
+        self.min_z = min_z
+        self.max_z = max_z
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.min_snr = min_snr
+        self.voxel_size = voxel_size
+        self.allocate(max_points)
+
+    def allocate(self, max_points):
+        """
+        Allocate the masks and the work buffers for frames of up to max_points points.
+
+        Parameters:
+            max_points (int): Maximum number of points per frame.
+        """
+        self.keep = np.empty(max_points, dtype=bool)
+        self.mask = np.empty(max_points, dtype=bool)
+        self.values = np.empty(max_points, dtype=np.float32)
+        self.index = np.empty(max_points, dtype=np.intp)
+
+    def limit(self, keep, values, low, high):
+        """
+        Clear keep where the values are out of bounds.
+
+        Parameters:
+            keep (ndarray): Whether to keep each point, updated in place.
+            values (ndarray): The values of the points.
+            low (float): Minimum value, None for no bound.
+            high (float): Maximum value, None for no bound.
+        """
+        mask = self.mask[: len(keep)]
+        if low is not None:
+            np.greater_equal(values, low, out=mask)
+            keep &= mask
+        if high is not None:
+            np.less_equal(values, high, out=mask)
+            keep &= mask
+
+    def apply(self, detObj):
+        """
+        Filter the points of a frame in place.
+
+        Parameters:
+            detObj (dict): The detected points, as returned by readAndParseData18xx_2d. Its arrays are
+                           overwritten and replaced by their front holding the points kept.
+
+        Returns:
+            dict: detObj, with the points kept.
+        """
+        if "x" not in detObj:
+            return detObj
+        x, y = detObj["x"], detObj["y"]
+        n = len(x)
+        if n > len(self.keep):
+            self.allocate(n)
+        keep = self.keep[:n]
+        values = self.values[:n]
+        keep[:] = True
+
+        if self.min_range is not None or self.max_range is not None:
+            np.hypot(x, y, out=values)
+            self.limit(keep, values, self.min_range, self.max_range)
+        if self.min_azimuth is not None or self.max_azimuth is not None:
+            # Same angle as the sectors: 0 degrees points straight behind the car
+            np.arctan2(y, x, out=values)
+            values -= np.pi / 2
+            values *= 180 / np.pi
+            self.limit(keep, values, self.min_azimuth, self.max_azimuth)
+        if "z" in detObj:
+            self.limit(keep, detObj["z"], self.min_z, self.max_z)
+        if self.min_speed is not None or self.max_speed is not None:
+            np.abs(detObj["velocity"], out=values)
+            self.limit(keep, values, self.min_speed, self.max_speed)
+        if "snr" in detObj:
+            self.limit(keep, detObj["snr"], self.min_snr, None)
+
+        fields = [field for field in POINT_FIELDS if field in detObj]
+        if not keep.all():
+            for field in fields:
+                kept = utils.compress(keep, detObj[field], self.values, self.index)
+                detObj[field][: len(kept)] = kept
+                detObj[field] = detObj[field][: len(kept)]
+        if self.voxel_size is not None and len(detObj["x"]) > 1:
+            self.downsample(detObj, fields)
+        detObj["numObj"] = len(detObj["x"])
+        return detObj
+
+    def downsample(self, detObj, fields):
+        """
+        Merge the points of a frame falling into the same voxel into their mean, in place.
+
+        Parameters:
+            detObj (dict): The detected points.
+            fields (list): The attributes of the points to merge.
+        """
+        coordinates = [detObj[axis] for axis in ("x", "y", "z") if axis in detObj]
+        voxels = np.floor(np.stack(coordinates, axis=1) / self.voxel_size).astype(np.int64)
+        _, inverse, counts = np.unique(voxels, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        n_voxels = len(counts)
+        if n_voxels == len(inverse):
+            return
+        for field in fields:
+            means = np.bincount(inverse, weights=detObj[field], minlength=n_voxels) / counts
+            detObj[field][:n_voxels] = means
+            detObj[field] = detObj[field][:n_voxels]
@@ -0,0 +1,453 @@
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import time
+import utils
+import AWR1843 as awr
+from matplotlib.colors import to_rgba_array
+from Note import Note
+from Wavetable import Wavetable, envelope_table
+from OccupancyGrid import OccupancyGrid
+from RoiFilter import RoiFilter
+from Pipeline import Stage, SectorBinner
+
+logger = logging.getLogger(__name__)
+
+# Commands of the configuration file of the radar the scenario is derived from
+REQUIRED_COMMANDS = ("profileCfg", "frameCfg", "aoaFovCfg", "cfarFovCfg")
+
+# Settings of a scenario profile, used for the ones missing from its file
+DEFAULTS = {
+    "radar": {
+        # Configuration file of the radar
+        "configFileName": "Radar_config_v3.cfg",
+        # Modes of the radar as (distance, settings) pairs, see RadarController, None keeps the configuration file
+        "adaptive_modes": None,
+        # Maximum number of detected points per frame, the size of the buffers of the stages (at start-up)
+        "max_points": 1024,
+    },
+    "grid": {
+        "n_sectors": 3,
+        "n_levels": 8,
+        # Cell size (in meters) of the occupancy grid, None uses the points instead
+        "occupancy_cell_size": None,
+    },
+    "roi": {
+        # Bounds of the points passed on by the decoder, None for no bound: range (in meters), azimuth
+        # (in degrees, None uses the field of view of the configuration file), height (in meters),
+        # absolute radial velocity (in m/s) and SNR (in dB, when the radar sends it)
+        "min_range": None,
+        "max_range": None,
+        "min_azimuth": None,
+        "max_azimuth": None,
+        "min_z": None,
+        "max_z": None,
+        "min_speed": None,
+        "max_speed": None,
+        "min_snr": None,
+        # Edge (in meters) of the voxels whose points are merged into one, None keeps every point
+        "voxel_size": None,
+    },
+    "audio": {
+        "bpm": 360,
+        # The note played without any object, then for the far, middle and close objects
+        "notes": ["rest", "c5", "e5", "g5"],
+        # "sine", "square", "triangle" or "sawtooth"
+        "waveform": "sine",
+        # (attack, decay) times in seconds of the envelope of each beat, None holds the notes
+        "note_envelope": None,
+        # Times-to-contact (in seconds) under which the notes 3, 2 and 1 are played, None uses the distance only
+        "ttc_thresholds": None,
+        # The note played while the sensor is lost, None plays no sound
+        "lost_note": "c4",
+    },
+    "display": {
+        # Color of each level, None uses red and orange for the two closest levels and green for the others
+        "colors": None,
+        "imageFileName": "car.jpg",
+    },
+}
+
+
+def load_settings(fileName):
+    """
+    Load the settings of a scenario profile, completed with the defaults.
+
+    Parameters:
+        fileName (str): The path to the profile, a JSON file with the sections of DEFAULTS.
+
+    Returns:
+        dict: The settings.
+    """
+    with open(fileName) as f:
+        profile = json.load(f)
+    settings = {}
+    for section, defaults in DEFAULTS.items():
+        values = profile.get(section, {})
+        unknown = set(values) - set(defaults)
+        if unknown:
+            raise ValueError("Unknown %s settings: %s" % (section, ", ".join(sorted(unknown))))
+        settings[section] = {**defaults, **values}
+    return settings
+
+
+class Scenario:
+    """
+    A scenario profile, one per vehicle or use case, bundling the radar configuration, the resolution of
+    the grid, the region of interest, the warning notes and the display options, with every table derived
+    from them.
+
+    Everything the stages need is built when the profile is loaded, so a reloaded scenario can be handed
+    to the stages on the "scenario" topic (see ScenarioWatcher) and swapped in between two frames.
+
+    Attributes:
+        fileName (str): The path to the profile.
+        configFileName (str): The path to the configuration file of the radar.
+        config (list): The configuration commands of the radar, one per line.
+        configParameters (dict): Radar configuration parameters.
+        adaptive_modes (list): The modes of the radar, None to keep the configuration file.
+        max_points (int): Maximum number of detected points per frame, the size of the buffers of the stages.
+        theta_grids (list): Edges of the sectors in degrees.
+        r_distances (list): Edges of the levels in meters.
+        occupancy_grid (OccupancyGrid): The occupancy grid, None to use the points instead.
+        binner_tables (dict): The tables of the SectorBinner.
+        roi (RoiFilter): The filter of the region of interest of the Decoder.
+        notes (list): The Note objects of the Track, the last one played while the sensor is lost.
+        oscillator (Wavetable): The oscillator of the AudioEngine.
+        envelope (ndarray): The envelope of the notes of the AudioEngine, None to hold the notes.
+        ttc_thresholds (list): The times-to-contact of the AudioSink, None to use the distance only.
+        colors (list): Color of each level.
+        imageFileName (str): The path to the figure of the car.
+
+    Methods:
+        from_file: Load a scenario profile.
+        watched_files: Return the files the scenario is loaded from.
+    """
+
+    def __init__(self, settings, fileName=None, numRxAnt=1, numTxAnt=1):
+        """
+        Initialize the Scenario object.
+
+        Parameters:
+            settings (dict): The settings, with the sections of DEFAULTS.
+            fileName (str): The path to the profile.
+            numRxAnt (int): Number of receiving antennas.
+            numTxAnt (int): Number of transmitting antennas.
+        """
+        radar, grid, roi, audio, display = (
+            settings["radar"],
+            settings["grid"],
+            settings["roi"],
+            settings["audio"],
+            settings["display"],
+        )
+        self.fileName = fileName
+
+        # Radar
+        self.configFileName = radar["configFileName"]
+        with open(self.configFileName) as f:
+            self.config = [line.rstrip("\r\n") for line in f]
+        missing = [
+            command
+            for command in REQUIRED_COMMANDS
+            if not any(line.startswith(command) for line in self.config)
+        ]
+        if missing:
+            raise ValueError("the configuration file misses the commands " + ", ".join(missing))
+        self.configParameters = awr.parseConfigLines(
+            self.config, numRxAnt=numRxAnt, numTxAnt=numTxAnt
+        )
+        self.adaptive_modes = (
+            [tuple(mode) for mode in radar["adaptive_modes"]]
+            if radar["adaptive_modes"] is not None
+            else None
+        )
+        thetamin, thetamax, maxdistance = awr.parseFovLines(self.config)
+        self.max_points = radar["max_points"]
+
+        # Grid
+        n_sectors, n_levels = grid["n_sectors"], grid["n_levels"]
+        if n_levels < 3:
+            raise ValueError("n_levels should be greater than 3")
+        if n_sectors < 1:
+            raise ValueError("n_sectors should be at least 1")
+        self.r_distances = utils.level_edges(maxdistance, n_levels)
+        self.theta_grids = utils.sector_edges(thetamin, thetamax, n_sectors)
+        self.occupancy_grid = (
+            OccupancyGrid(self.theta_grids, maxdistance, cell_size=grid["occupancy_cell_size"])
+            if grid["occupancy_cell_size"] is not None
+            else None
+        )
+        self.binner_tables = SectorBinner.tables(
+            self.theta_grids, self.r_distances, self.occupancy_grid
+        )
+
+        # Region of interest, within the field of view unless its azimuth is bounded
+        roi = dict(roi)
+        if roi["min_azimuth"] is None:
+            roi["min_azimuth"] = thetamin
+        if roi["max_azimuth"] is None:
+            roi["max_azimuth"] = thetamax
+        self.roi = RoiFilter(**roi, max_points=self.max_points)
+
+        # Audio
+        if len(audio["notes"]) != 4:
+            raise ValueError("notes should hold the note without any object and 3 warning notes")
+        beat = 60 / audio["bpm"]
+        self.notes = [
+            Note.rest(beat) if note == "rest" else Note(note, beat)
+            for note in audio["notes"] + [audio["lost_note"] or "rest"]
+        ]
+        self.oscillator = Wavetable(audio["waveform"])
+        self.envelope = (
+            envelope_table(beat, *audio["note_envelope"])
+            if audio["note_envelope"] is not None
+            else None
+        )
+        self.ttc_thresholds = audio["ttc_thresholds"]
+
+        # Display
+        if display["colors"] is not None:
+            if len(display["colors"]) != n_levels:
+                raise ValueError("colors should hold one color per level")
+            # Raises a ValueError for a color matplotlib does not know
+            to_rgba_array(display["colors"])
+            self.colors = list(display["colors"])
+        else:
+            self.colors = ["red", "orange"] + ["green"] * (n_levels - 2)
+        self.imageFileName = display["imageFileName"]
+
+    @classmethod
+    def from_file(cls, fileName, numRxAnt=1, numTxAnt=1):
+        """
+        Load a scenario profile.
+
+        Parameters:
+            fileName (str): The path to the profile.
+            numRxAnt (int): Number of receiving antennas.
+            numTxAnt (int): Number of transmitting antennas.
+
+        Returns:
+            Scenario: The scenario.
+        """
+        return cls(load_settings(fileName), fileName, numRxAnt=numRxAnt, numTxAnt=numTxAnt)
+
+    def watched_files(self):
+        """
+        Return the files the scenario is loaded from.
+
+        Returns:
+            list: The paths to the profile and to the configuration file of the radar.
+        """
+        return [name for name in (self.fileName, self.configFileName) if name is not None]
+
+
+class FileWatcher:
+    """
+    Wait for files to be written, with inotify on Linux and by polling their modification times elsewhere.
+
+    The directories of the files are watched rather than the files, so files replaced by an editor
+    (written to a temporary file and renamed) are still seen.
+
+    Methods:
+        watch: Set the files to watch.
+        wait: Wait for one of the files to be written.
+        close: Stop watching.
+    """
+
+    # inotify events: file closed after writing, and file moved into the directory
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, fileNames):
+        """
+        Initialize the FileWatcher object.
+
+        Parameters:
+            fileNames (list): The paths to the files.
+        """
+        self.fd = None
+        self.libc = None
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is not None:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            if hasattr(libc, "inotify_init1"):
+                fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+                if fd >= 0:
+                    self.libc = libc
+                    self.fd = fd
+        self.watches = {}
+        self.mtimes = {}
+        self.watch(fileNames)
+
+    def watch(self, fileNames):
+        """
+        Set the files to watch.
+
+        Parameters:
+            fileNames (list): The paths to the files.
+        """
+        self.fileNames = [os.path.abspath(name) for name in fileNames]
+        self.mtimes = {name: self.mtime(name) for name in self.fileNames}
+        if self.fd is None:
+            return
+        for directory in {os.path.dirname(name) for name in self.fileNames}:
+            if directory not in self.watches.values():
+                wd = self.libc.inotify_add_watch(
+                    self.fd, directory.encode(), self.IN_CLOSE_WRITE | self.IN_MOVED_TO
+                )
+                if wd >= 0:
+                    self.watches[wd] = directory
+
+    @staticmethod
+    def mtime(fileName):
+        """
+        Return the modification time of a file, None if it does not exist.
+        """
+        try:
+            return os.stat(fileName).st_mtime_ns
+        except OSError:
+            return None
+
+    def wait(self, timeout):
+        """
+        Wait for one of the files to be written.
+
+        Parameters:
+            timeout (float): Maximum time to wait in seconds.
+
+        Returns:
+            bool: Whether one of the files was written.
+        """
+        if self.fd is None:
+            time.sleep(timeout)
+            mtimes = {name: self.mtime(name) for name in self.fileNames}
+            changed = mtimes != self.mtimes
+            self.mtimes = mtimes
+            return changed
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        changed = False
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0").decode()
+            offset += length
+            if os.path.join(self.watches.get(wd, ""), name) in self.fileNames:
+                changed = True
+        return changed
+
+    def close(self):
+        """
+        Stop watching.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class ScenarioWatcher(Stage):
+    """
+    Stage reloading a scenario profile when it, or the configuration file of the radar it uses, is written.
+
+    The new scenario and all its tables are built in this thread, then published on the "scenario" topic,
+    from which each stage swaps it in between two frames, so the acquisition goes on without restarting
+    the process. If the configuration of the radar changed and the CLI port is given, the radar is
+    reconfigured and the new parameters are published on the "config" topic for the decoder.
+    A profile that cannot be loaded, whatever the error, is logged and ignored, and the current scenario
+    is kept.
+
+    Attributes:
+        scenario (Scenario): The current scenario.
+        reloads (int): Number of reloads done.
+        last_duration (float): Duration of the last reload in seconds.
+        last_error (Exception): The error of the last profile that could not be loaded, None if there is none.
+    """
+
+    def __init__(self, bus, scenario, CLIport=None, settle=0.05):
+        """
+        Initialize the ScenarioWatcher object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            scenario (Scenario): The scenario in use, loaded from its profile.
+            CLIport (Serial): Optional serial port for configuration, to send a changed configuration to the radar.
+            settle (float): Time to wait for the other writes of a save before reloading, in seconds.
+        """
+        super().__init__(bus)
+        self.scenario = scenario
+        self.CLIport = CLIport
+        self.settle = settle
+        self.files = FileWatcher(scenario.watched_files())
+        self.ports_input = bus.subscribe("ports", depth=1)
+        self.reloads = 0
+        self.last_duration = 0.0
+        self.last_error = None
+
+    def step(self):
+        """
+        Wait for the files of the scenario to be written and reload it.
+        """
+        ports = self.ports_input.latest()
+        if ports is not None:
+            self.CLIport = ports["CLIport"]
+        if not self.files.wait(0.1):
+            return
+        # Editors often write a file in several steps
+        while self.files.wait(self.settle):
+            pass
+        self.reload()
+
+    def reload(self):
+        """
+        Reload the scenario from its profile and publish it.
+        """
+        start = time.monotonic()
+        try:
+            scenario = Scenario.from_file(self.scenario.fileName)
+        except Exception as error:
+            # A stage thread must outlive any mistake in a profile being edited
+            logger.warning("Cannot load the scenario %s: %r", self.scenario.fileName, error)
+            self.last_error = error
+            return
+        self.last_error = None
+
+        if scenario.config != self.scenario.config and self.CLIport is not None:
+            # The configuration files start with sensorStop and end with sensorStart
+            try:
+                awr.sendConfig(self.CLIport, scenario.config)
+            except OSError as error:
+                # The radar is gone, the SensorWatchdog replays the published configuration once it is back
+                self.last_error = error
+            self.bus.publish(
+                "config",
+                {
+                    "mode": None,
+                    "config": scenario.config,
+                    "configParameters": scenario.configParameters,
+                },
+            )
+        self.files.watch(scenario.watched_files())
+        self.scenario = scenario
+        self.reloads += 1
+        self.last_duration = time.monotonic() - start
+        self.bus.publish("scenario", scenario)
+
+    def stop(self):
+        """
+        Stop the stage thread and the watch of the files.
+        """
+        super().stop()
+        self.files.close()
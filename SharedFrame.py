@@ -0,0 +1,272 @@
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from Pipeline import Stage
+
+# Maximum number of points stored per frame (a 2**15 bytes packet holds at most 2048 points)
+MAX_POINTS = 1024
+POINT_FIELDS = ("x", "y", "z", "velocity")
+
+# Fields of the ring header and of the metadata of each slot (all int64)
+HEADER_GENERATION, HEADER_SLOTS, HEADER_MAX_POINTS = range(3)
+META_SEQUENCE, META_GENERATION, META_FRAME_NUMBER, META_NUM_OBJ = range(4)
+
+
+class SharedFrameRing:
+    """
+    A ring of frame slots in shared memory, used to hand the detected points over to other processes without serialising them.
+
+    Each slot is protected by a seqlock: its sequence number is odd while the writer fills it and
+    even once the frame is complete. Every published frame also gets a generation number, so readers
+    can tell a new frame from one they have already seen. A reader maps a slot as NumPy views and checks
+    afterwards, with is_valid, that the writer did not start overwriting the slot in the meantime.
+    With n_slots slots a frame stays valid for n_slots - 1 frame periods.
+
+    Only one process may write to a ring. Reading processes attach to it by name.
+
+    Methods:
+        begin_write: Start writing the next slot and return its point arrays.
+        end_write: Publish the slot being written, or abandon it.
+        read: Return the newest complete frame.
+        is_valid: Check that a frame returned by read has not been overwritten.
+        close: Detach from the shared memory, removing it if this process created it.
+    """
+
+    def __init__(self, name=None, create=False, n_slots=4, max_points=MAX_POINTS):
+        """
+        Initialize the SharedFrameRing object.
+
+        Parameters:
+            name (str): Name of the shared memory block (chosen by the system if None and create is True).
+            create (bool): Whether to create the ring (writer) or attach to an existing one (readers).
+            n_slots (int): Number of frame slots (only used when creating the ring).
+            max_points (int): Maximum number of points per frame (only used when creating the ring).
+        """
+        self.create = create
+        if create:
+            size = self.layout_size(n_slots, max_points)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            try:
+                # Readers must not remove the block when they exit
+                self.shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Before Python 3.13 the block is always tracked, stop tracking it by hand
+                self.shm = shared_memory.SharedMemory(name=name)
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.name = self.shm.name
+
+        self.header = np.ndarray((3,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = (0, n_slots, max_points)
+        self.n_slots = int(self.header[HEADER_SLOTS])
+        self.max_points = int(self.header[HEADER_MAX_POINTS])
+
+        offset = self.header.nbytes
+        self.meta = np.ndarray(
+            (self.n_slots, 4), dtype=np.int64, buffer=self.shm.buf, offset=offset
+        )
+        offset += self.meta.nbytes
+        self.timestamps = np.ndarray(
+            (self.n_slots,), dtype=np.float64, buffer=self.shm.buf, offset=offset
+        )
+        offset += self.timestamps.nbytes
+        self.points = np.ndarray(
+            (self.n_slots, len(POINT_FIELDS), self.max_points),
+            dtype=np.float32,
+            buffer=self.shm.buf,
+            offset=offset,
+        )
+        if create:
+            self.meta[:] = 0
+        self.writing = None
+
+    @staticmethod
+    def layout_size(n_slots, max_points):
+        """
+        Compute the size of the shared memory block.
+
+        Parameters:
+            n_slots (int): Number of frame slots.
+            max_points (int): Maximum number of points per frame.
+
+        Returns:
+            int: The size in bytes.
+        """
+        return 8 * 3 + n_slots * (8 * 4 + 8 + 4 * len(POINT_FIELDS) * max_points)
+
+    def begin_write(self):
+        """
+        Start writing the slot following the newest frame.
+
+        Returns:
+            dict: The float32 arrays ("x", "y", "z", "velocity") of the slot, to be filled in place.
+        """
+        slot = (int(self.header[HEADER_GENERATION]) + 1) % self.n_slots
+        # An odd sequence number marks the slot as being written
+        self.meta[slot, META_SEQUENCE] += 1
+        self.writing = slot
+        return {field: self.points[slot, i] for i, field in enumerate(POINT_FIELDS)}
+
+    def end_write(self, frameNumber=0, numObj=0, timestamp=0.0, publish=True):
+        """
+        Finish writing the slot started by begin_write.
+
+        Parameters:
+            frameNumber (int): The frame number.
+            numObj (int): The number of points written.
+            timestamp (float): The time the frame was received.
+            publish (bool): Whether to publish the frame or abandon it (e.g. no complete packet was parsed).
+        """
+        slot = self.writing
+        self.writing = None
+        if publish:
+            generation = int(self.header[HEADER_GENERATION]) + 1
+            self.meta[slot, META_GENERATION] = generation
+            self.meta[slot, META_FRAME_NUMBER] = frameNumber
+            self.meta[slot, META_NUM_OBJ] = numObj
+            self.timestamps[slot] = timestamp
+        self.meta[slot, META_SEQUENCE] += 1
+        if publish:
+            self.header[HEADER_GENERATION] = generation
+
+    def write(self, frameNumber, detObj, timestamp):
+        """
+        Copy a frame of detected points into the next slot and publish it.
+
+        Parameters:
+            frameNumber (int): The frame number.
+            detObj (dict): A dictionary containing detected object information.
+            timestamp (float): The time the frame was received.
+        """
+        out = self.begin_write()
+        numObj = min(len(detObj["x"]), self.max_points)
+        for field in POINT_FIELDS:
+            out[field][:numObj] = detObj[field][:numObj]
+        self.end_write(frameNumber, numObj, timestamp)
+
+    def read(self, after=0, retries=3):
+        """
+        Return the newest complete frame as views of the shared memory.
+
+        Parameters:
+            after (int): Generation of the last frame already read (0 returns any frame).
+            retries (int): Number of attempts when the slot is being written.
+
+        Returns:
+            dict: A dictionary with the "generation", "sequence", "slot", "frameNumber", "timestamp"
+                  and "detObj" of the frame, or None if there is no newer frame.
+        """
+        for attempt in range(retries):
+            generation = int(self.header[HEADER_GENERATION])
+            if generation <= after:
+                return None
+            slot = generation % self.n_slots
+            sequence = int(self.meta[slot, META_SEQUENCE])
+            # The slot is being written or was already reused for a newer frame, try again
+            if sequence % 2 or self.meta[slot, META_GENERATION] != generation:
+                continue
+            numObj = int(self.meta[slot, META_NUM_OBJ])
+            frame = {
+                "generation": generation,
+                "sequence": sequence,
+                "slot": slot,
+                "frameNumber": int(self.meta[slot, META_FRAME_NUMBER]),
+                "timestamp": float(self.timestamps[slot]),
+                "detObj": {"numObj": numObj},
+            }
+            for i, field in enumerate(POINT_FIELDS):
+                frame["detObj"][field] = self.points[slot, i, :numObj]
+            # Torn read if the writer started on the slot while the metadata was copied
+            if self.meta[slot, META_SEQUENCE] == sequence:
+                return frame
+        return None
+
+    def is_valid(self, frame):
+        """
+        Check that the views of a frame returned by read have not been overwritten.
+
+        Parameters:
+            frame (dict): The frame returned by read.
+
+        Returns:
+            bool: True if the writer has not touched the slot since the frame was read.
+        """
+        return self.meta[frame["slot"], META_SEQUENCE] == frame["sequence"]
+
+    def close(self):
+        """
+        Detach from the shared memory, removing it if this process created it.
+        """
+        # Release the views before closing the memory block
+        self.header = self.meta = self.timestamps = self.points = None
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+class SharedFrameSource(Stage):
+    """
+    Source stage of a consumer process, publishing the frames of a SharedFrameRing on the "detections" topic.
+
+    The points of each frame are copied out of the shared memory into preallocated buffers, used in turn
+    for the published frames like in the CouplingFilter, and the frame is checked with is_valid once
+    copied: a frame whose slot the writer started overwriting during the copy (a torn read, when the
+    consumer falls more than n_slots - 1 frames behind) is counted and dropped instead of being published.
+
+    Attributes:
+        missed (int): Number of frames published by the writer and never read.
+        torn (int): Number of frames dropped because they were overwritten while copied.
+    """
+
+    def __init__(self, bus, ring, period=0.01, n_slots=32):
+        """
+        Initialize the SharedFrameSource object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            ring (SharedFrameRing): The ring to read the frames from.
+            period (float): Polling period in seconds.
+            n_slots (int): Number of buffers used in turn for the published frames.
+        """
+        super().__init__(bus, period)
+        self.ring = ring
+        self.generation = 0
+        self.missed = 0
+        self.torn = 0
+        self.slots = [
+            {field: np.empty(ring.max_points, dtype=np.float32) for field in POINT_FIELDS}
+            for _ in range(n_slots)
+        ]
+        self.slot = 0
+
+    def step(self):
+        """
+        Copy the newest frame of the ring and publish it, if there is one and it was not overwritten.
+        """
+        frame = self.ring.read(after=self.generation)
+        if frame is None:
+            return
+        # Count the frames the writer published since the last poll and that were never read
+        if self.generation:
+            self.missed += frame["generation"] - self.generation - 1
+        self.generation = frame["generation"]
+
+        numObj = frame["detObj"]["numObj"]
+        buffers = self.slots[self.slot]
+        detObj = {"numObj": numObj}
+        for field in POINT_FIELDS:
+            detObj[field] = buffers[field][:numObj]
+            detObj[field][:] = frame["detObj"][field]
+        if not self.ring.is_valid(frame):
+            # The writer reused the slot while it was copied, so the copy may mix two frames
+            self.torn += 1
+            return
+        self.slot = (self.slot + 1) % len(self.slots)
+        self.bus.publish(
+            "detections",
+            {
+                "frameNumber": frame["frameNumber"],
+                "timestamp": frame["timestamp"],
+                "detObj": detObj,
+            },
+        )
@@ -0,0 +1,334 @@
+import hashlib
+import os
+import matplotlib
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from Pipeline import Stage
+from PolarView import PolarView, binned_with
+
+
+class SpriteCache:
+    """
+    The polar view pre-rendered once into RGBA tiles: the background (figure of the car and radial grid)
+    and one tile per sector x level cell, cropped to the pixels the cell changes.
+
+    The tiles can be stored on disk, keyed by a hash of everything they depend on, so only the first start
+    with a given configuration pays for the rendering. The text of the distance, which has too many states
+    to pre-render, is rendered alone on a transparent buffer the first time each value is shown.
+
+    Attributes:
+        size (tuple): Width and height of the rendered frames in pixels.
+        cacheDir (str): Directory where the tiles are stored, None if they are kept in memory only.
+        background (ndarray): The (height, width, 4) uint8 image of the empty view.
+        bboxes (ndarray): The (top, bottom, left, right) box of the tile of each cell.
+        tiles (list): The RGBA tile of each cell, with the cell of sector i and level j at index i * n_levels + j.
+        masks (list): The pixels of each tile belonging to the cell.
+
+    Methods:
+        text: Return the tile and box of a distance text.
+    """
+
+    def __init__(
+        self, theta_grids, r_distances, colors, imageFileName="car.jpg", size=(640, 480), cacheDir=None
+    ):
+        """
+        Initialize the SpriteCache object, loading the tiles from cacheDir or rendering them.
+
+        Parameters:
+            theta_grids (list): Edges of the sectors in degrees.
+            r_distances (list): Edges of the levels in meters.
+            colors (list): Color of each level.
+            imageFileName (str): The path to the figure of the car.
+            size (tuple): Width and height of the rendered frames in pixels.
+            cacheDir (str): Directory where the tiles are stored, None keeps them in memory only.
+        """
+        self.n_sectors = len(theta_grids) - 1
+        self.n_levels = len(r_distances) - 1
+        self.size = size
+        self.cacheDir = cacheDir
+        dpi = 100
+        self.figure = Figure(figsize=(size[0] / dpi, size[1] / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.view = PolarView(self.figure, theta_grids, r_distances, colors, imageFileName)
+        self.text_cache = {}
+
+        cacheFileName = None
+        if cacheDir is not None:
+            with open(imageFileName, "rb") as f:
+                image_hash = hashlib.sha1(f.read()).hexdigest()
+            key = repr(
+                (
+                    [float(i) for i in theta_grids],
+                    [float(i) for i in r_distances],
+                    list(colors),
+                    tuple(size),
+                    image_hash,
+                    matplotlib.__version__,
+                )
+            )
+            cacheFileName = os.path.join(
+                cacheDir, "sprites-%s.npz" % hashlib.sha1(key.encode()).hexdigest()[:16]
+            )
+
+        if cacheFileName is not None and os.path.exists(cacheFileName):
+            self.load(cacheFileName)
+        else:
+            self.render()
+            if cacheFileName is not None:
+                os.makedirs(cacheDir, exist_ok=True)
+                self.save(cacheFileName)
+
+        # Draw the figure once with the text, so it can be rendered alone afterwards
+        self.view.text_box.set_visible(True)
+        self.canvas.draw()
+
+    def render_state(self, levels):
+        """
+        Render the view with the given levels and no text.
+
+        Parameters:
+            levels (ndarray): The level of each sector, -1 for none.
+
+        Returns:
+            ndarray: The (height, width, 4) uint8 image.
+        """
+        self.view.draw_state({"levels": levels, "distance": None})
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+    def render(self):
+        """
+        Render the background and the tile of every cell.
+        """
+        self.view.text_box.set_visible(False)
+        empty = np.full(self.n_sectors, -1)
+        self.background = self.render_state(empty)
+        self.bboxes = np.zeros((self.n_sectors * self.n_levels, 4), dtype=int)
+        self.tiles = []
+        self.masks = []
+        for i in range(self.n_sectors):
+            for j in range(self.n_levels):
+                levels = empty.copy()
+                levels[i] = j
+                image = self.render_state(levels)
+                # Keep the pixels changed by the cell, including the grid lines drawn over it
+                changed = np.any(image != self.background, axis=2)
+                rows = np.flatnonzero(changed.any(axis=1))
+                cols = np.flatnonzero(changed.any(axis=0))
+                if len(rows) == 0:
+                    # The cell is outside the view
+                    top, bottom, left, right = 0, 0, 0, 0
+                else:
+                    top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+                self.bboxes[i * self.n_levels + j] = top, bottom, left, right
+                self.tiles.append(image[top:bottom, left:right])
+                self.masks.append(changed[top:bottom, left:right])
+
+    def save(self, fileName):
+        """
+        Store the background and the tiles in a .npz file.
+
+        Parameters:
+            fileName (str): The path of the file.
+        """
+        arrays = {"background": self.background, "bboxes": self.bboxes}
+        for i, (tile, mask) in enumerate(zip(self.tiles, self.masks)):
+            arrays["tile%d" % i] = tile
+            arrays["mask%d" % i] = mask
+        np.savez_compressed(fileName, **arrays)
+
+    def load(self, fileName):
+        """
+        Load the background and the tiles from a .npz file.
+
+        Parameters:
+            fileName (str): The path of the file.
+        """
+        with np.load(fileName) as data:
+            self.background = data["background"]
+            self.bboxes = data["bboxes"]
+            self.tiles = [data["tile%d" % i] for i in range(len(self.bboxes))]
+            self.masks = [data["mask%d" % i] for i in range(len(self.bboxes))]
+
+    def text(self, text):
+        """
+        Return the tile of a distance text, rendering it the first time.
+
+        Parameters:
+            text (str): The text to show.
+
+        Returns:
+            tuple: The RGBA tile, with straight alpha, and its (top, bottom, left, right) box.
+        """
+        if text not in self.text_cache:
+            self.view.text_box.set_text(text)
+            renderer = self.canvas.get_renderer()
+            renderer.clear()
+            self.view.text_box.draw(renderer)
+            image = np.asarray(renderer.buffer_rgba())
+            alpha = image[:, :, 3] > 0
+            rows = np.flatnonzero(alpha.any(axis=1))
+            cols = np.flatnonzero(alpha.any(axis=0))
+            if len(rows) == 0:
+                bbox = (0, 0, 0, 0)
+            else:
+                bbox = (rows[0], rows[-1] + 1, cols[0], cols[-1] + 1)
+            self.text_cache[text] = (image[bbox[0] : bbox[1], bbox[2] : bbox[3]].copy(), bbox)
+        return self.text_cache[text]
+
+
+class SpriteRenderer(Stage):
+    """
+    Stage composing the polar view from the tiles of a SpriteCache and publishing it on the "render" topic,
+    as a drop-in replacement of the RenderWorker.
+
+    The frame is kept between sector states, and only the regions of the cells and of the text that changed
+    are restored from the background and blitted again, so the cost of a frame does not depend on the
+    size of the figure and nothing is published while the state does not change.
+    """
+
+    span_name = "draw"
+
+    def __init__(self, bus, cache):
+        """
+        Initialize the SpriteRenderer object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            cache (SpriteCache): The pre-rendered tiles.
+        """
+        super().__init__(bus)
+        self.set_cache(cache)
+        self.input = bus.subscribe("changes", depth=1)
+        self.scenario_input = bus.subscribe("scenario", depth=1)
+        # A reloaded scenario waiting for the binner to swap in its sectors and levels
+        self.scenario = None
+
+    def set_cache(self, cache):
+        """
+        Swap in the tiles of other sectors, levels or colors, starting again from the background.
+
+        Parameters:
+            cache (SpriteCache): The pre-rendered tiles.
+        """
+        self.cache = cache
+        self.frame = cache.background.copy()
+        self.levels = np.full(cache.n_sectors, -1)
+        self.text = None
+        self.text_bbox = (0, 0, 0, 0)
+
+    def cells(self, levels):
+        """
+        Return the index of the cell shown in each sector.
+
+        Parameters:
+            levels (ndarray): The level of each sector, -1 for none.
+
+        Returns:
+            ndarray: The index of the cells shown.
+        """
+        shown = np.flatnonzero(levels != -1)
+        return shown * self.cache.n_levels + levels[shown]
+
+    def compose(self, region, cells, text_tile, text_bbox):
+        """
+        Restore a region of the frame from the background and blit the tiles overlapping it.
+
+        Parameters:
+            region (tuple): The (top, bottom, left, right) box of the region.
+            cells (ndarray): The index of the cells shown.
+            text_tile (ndarray): The RGBA tile of the text.
+            text_bbox (tuple): The box of the text.
+        """
+        top, bottom, left, right = region
+        self.frame[top:bottom, left:right] = self.cache.background[top:bottom, left:right]
+        for cell in cells:
+            self.blit(region, self.cache.tiles[cell], self.cache.bboxes[cell], self.cache.masks[cell])
+        if text_tile is not None:
+            self.blit(region, text_tile, text_bbox)
+
+    def blit(self, region, tile, bbox, mask=None):
+        """
+        Blit the part of a tile inside a region of the frame.
+
+        Parameters:
+            region (tuple): The (top, bottom, left, right) box of the region.
+            tile (ndarray): The RGBA tile.
+            bbox (tuple): The box of the tile in the frame.
+            mask (ndarray): The pixels to copy, None alpha-blends the tile instead.
+        """
+        top, bottom = max(region[0], bbox[0]), min(region[1], bbox[1])
+        left, right = max(region[2], bbox[2]), min(region[3], bbox[3])
+        if top >= bottom or left >= right:
+            return
+        dst = self.frame[top:bottom, left:right]
+        src = tile[top - bbox[0] : bottom - bbox[0], left - bbox[2] : right - bbox[2]]
+        if mask is not None:
+            m = mask[top - bbox[0] : bottom - bbox[0], left - bbox[2] : right - bbox[2]]
+            dst[m] = src[m]
+        else:
+            alpha = src[:, :, 3:4].astype(np.uint16)
+            dst[:, :, :3] = (src[:, :, :3] * alpha + dst[:, :, :3] * (255 - alpha)) // 255
+
+    def step(self):
+        """
+        Update the frame with the latest sector state and publish it if it changed.
+        """
+        state = self.input.get(timeout=0.1)
+        if state is None:
+            return
+        newer = self.input.latest()
+        if newer is not None:
+            state = newer
+
+        # The tiles of a reloaded scenario are loaded or rendered here, from the first state binned with
+        # its sectors and levels (the scenario is read after the state, as the binner swaps it in before),
+        # the last frame is shown meanwhile
+        scenario = self.scenario_input.latest()
+        if scenario is not None:
+            self.scenario = scenario
+        if self.scenario is not None and binned_with(
+            state, self.scenario.theta_grids, self.scenario.r_distances
+        ):
+            self.set_cache(
+                SpriteCache(
+                    self.scenario.theta_grids,
+                    self.scenario.r_distances,
+                    self.scenario.colors,
+                    self.scenario.imageFileName,
+                    size=self.cache.size,
+                    cacheDir=self.cache.cacheDir,
+                )
+            )
+            self.scenario = None
+        if (state["n_sectors"], state["n_levels"]) != (self.cache.n_sectors, self.cache.n_levels):
+            return
+
+        levels = np.asarray(state["levels"])
+        if state.get("sensor_lost"):
+            text = "Sensor lost"
+        elif state["distance"] is not None:
+            text = "Distance: %0.02f m" % state["distance"]
+        else:
+            text = "Distance: --.-- m"
+        if np.array_equal(levels, self.levels) and text == self.text:
+            return
+
+        text_tile, text_bbox = self.cache.text(text)
+        cells = self.cells(levels)
+        # Dirty regions: the cells that appeared or disappeared and the old and new text
+        regions = [
+            tuple(self.cache.bboxes[cell])
+            for cell in np.setxor1d(self.cells(self.levels), cells)
+        ]
+        if text != self.text:
+            regions += [self.text_bbox, text_bbox]
+        for region in regions:
+            self.compose(region, cells, text_tile, text_bbox)
+        self.levels = levels
+        self.text = text
+        self.text_bbox = text_bbox
+        self.bus.publish(
+            "render", {"frameNumber": state["frameNumber"], "image": self.frame[:, :, :3].copy()}
+        )
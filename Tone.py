@@ -1,35 +1,48 @@
-import math
 import numpy
 import time
+import wave
 import pygame
-import threading
+from Profiler import profiler
 
-pygame.init()
 bits = 16
 sample_rate = 44100
-pygame.mixer.pre_init(sample_rate, bits)
 
-def sine_x(amp, freq, time):
+
+def init_mixer(rate=None):
     """
-    Generate a sine wave at a specific frequency and time.
+    Initialize the mixer for 16 bit stereo samples at the given rate, unless it is already initialized.
+    Importing the module initializes nothing, so it is only done once a buffer is played.
+
+    Without an audio device, e.g. to test the synthesis, set the SDL_AUDIODRIVER environment
+    variable to "dummy" before initializing the mixer.
 
     Parameters:
-        amp (int): Amplitude of the sine wave.
-        freq (float): Frequency of the sine wave in Hz.
-        time (float): Time in seconds.
+        rate (int): Sample rate requested in Hz, None uses sample_rate.
 
     Returns:
-        int: The value of the sine wave at the specified time.
+        int: The actual sample rate of the mixer in Hz, at which the buffers played must be rendered.
     """
-    return int(round(amp * math.sin(2 * math.pi * freq * time)))
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(rate or sample_rate, -bits, 2)
+    return pygame.mixer.get_init()[0]
+
 
 class Tone:
     """
     A class to generate and play tones.
 
+    The tones are rendered with a single vectorized call into one contiguous buffer of 16 bit stereo
+    samples, whether it holds one tone, a sequence of notes with rests or a chord, so the buffer can
+    be played, cached or exported to a WAV file.
+
     Methods:
         sine: Generate and play a sine wave tone.
         create_tone_from_list: Generate and play tones from a list of frequencies.
+        render: Render a sequence of tones into one buffer.
+        render_notes: Render a sequence of Note objects into one buffer.
+        render_chord: Render Note objects played simultaneously into one buffer.
+        play_buffer: Play a rendered buffer.
+        write_wav: Export a rendered buffer to a WAV file.
     """
 
     def sine(frequency, duration=1, speaker=None):
@@ -41,48 +54,173 @@ class Tone:
             duration (float): Duration of the tone in seconds.
             speaker (str): Speaker to play the sound from ('l' for left, 'r' for right).
         """
-        num_samples = int(round(duration * sample_rate))
+        rate = init_mixer()
+        with profiler.span("tone"):
+            buf = Tone.render([frequency], [duration], speaker=speaker, rate=rate)
+        Tone.play_buffer(buf, wait=True)
 
-        # Setup our numpy array to handle 16 bit ints, which is what we set our mixer to expect with "bits" up above
-        buf = numpy.zeros((num_samples, 2), dtype=numpy.int16)
-        amplitude = 2 ** (bits - 1) - 1
+    @staticmethod
+    def create_tone_from_list(frequency_array, duration=1, engine=None):
+        """
+        Generate and play tones from a list of frequencies.
 
-        for s in range(num_samples):
-            t = float(s) / sample_rate    # time in seconds
+        Parameters:
+            frequency_array (list): List of frequencies in Hz.
+            duration (float): Duration of each tone in seconds.
+            engine (AudioEngine): Optional streaming engine playing each tone on its own voice,
+                                  instead of one buffer mixing all tones.
+        """
+        if engine is not None:
+            for voice, freq in enumerate(frequency_array):
+                engine.set_voice(voice, freq, amplitude=1 / len(frequency_array))
+            time.sleep(duration)
+            for voice in range(len(frequency_array)):
+                engine.release(voice)
+            return
+
+        # Mix the tones into one buffer
+        n = len(frequency_array)
+        buf = Tone.render(frequency_array, [duration] * n, amplitude=1 / n, rate=init_mixer(), chord=True)
+        Tone.play_buffer(buf, wait=True)
 
-            sine = sine_x(amplitude, frequency, t)
+    @staticmethod
+    def render(
+        frequencies,
+        durations,
+        speaker=None,
+        amplitude=1.0,
+        rate=None,
+        oscillator=None,
+        chord=False,
+    ):
+        """
+        Render a sequence of tones into one buffer of 16 bit stereo samples.
 
-            # Control which speaker to play the sound from
-            if speaker == 'r':
-                buf[s][1] = sine # right
-            elif speaker == 'l':
-                buf[s][0] = sine # left
-            else:
-                buf[s][0] = sine # left
-                buf[s][1] = sine # right
+        The phase of the waveform continues from one tone to the next, and the rests are silent.
 
-        sound = pygame.sndarray.make_sound(buf)
-        one_sec = 1000 # Milliseconds
-        sound.play(loops=1, maxtime=int(duration * one_sec))
-        time.sleep(duration)
+        Parameters:
+            frequencies (list): Frequency of each tone in Hz, None (or 0) for a rest.
+            durations (list): Duration of each tone in seconds.
+            speaker (str): Speaker to play the sound from ('l' for left, 'r' for right).
+            amplitude (float): Amplitude of the tones (0 to 1).
+            rate (int): Sample rate in Hz, None uses sample_rate.
+            oscillator (Wavetable): Optional oscillator computing the waveform from the phase, None computes a sine.
+            chord (bool): Play all the tones from time 0 and mix them, instead of one after the other.
+
+        Returns:
+            ndarray: The (n_samples, 2) int16 samples.
+        """
+        rate = rate or sample_rate
+        frequencies = numpy.array([f or 0.0 for f in frequencies], dtype=float)
+        counts = numpy.round(numpy.asarray(durations, dtype=float) * rate).astype(int)
+        max_sample = 2 ** (bits - 1) - 1
+
+        if chord:
+            # Every tone starts at time 0 and is silent after its duration
+            n_samples = counts.max() if len(counts) else 0
+            t = numpy.arange(n_samples) / rate
+            phase = 2 * numpy.pi * frequencies[:, None] * t
+            gain = (numpy.arange(n_samples) < counts[:, None]) * (frequencies[:, None] > 0)
+        else:
+            # Accumulate the phase over the whole sequence, so it continues from one tone to the next
+            increment = numpy.repeat(2 * numpy.pi * frequencies / rate, counts)
+            phase = numpy.cumsum(increment) - increment
+            gain = numpy.repeat(frequencies > 0, counts)
+
+        if oscillator is not None:
+            samples = oscillator(phase, out=phase)
+        else:
+            samples = numpy.sin(phase, out=phase)
+        samples *= gain * (amplitude * max_sample)
+        if chord:
+            samples = numpy.clip(samples.sum(axis=0), -max_sample, max_sample)
+
+        buf = numpy.zeros(samples.shape + (2,), dtype=numpy.int16)
+        # Control which speaker to play the sound from
+        if speaker != "r":
+            buf[..., 0] = numpy.round(samples)  # left
+        if speaker != "l":
+            buf[..., 1] = numpy.round(samples)  # right
+        return buf
 
     @staticmethod
-    def create_tone_from_list(frequency_array, duration=1):
+    def render_notes(notes, speaker=None, rate=None, oscillator=None):
         """
-        Generate and play tones from a list of frequencies.
+        Render a sequence of Note objects, such as the notes_array of a Track, into one buffer.
 
         Parameters:
-            frequency_array (list): List of frequencies in Hz.
-            duration (float): Duration of each tone in seconds.
+            notes (list): A list of Note objects, including rests.
+            speaker (str): Speaker to play the sound from ('l' for left, 'r' for right).
+            rate (int): Sample rate in Hz, None uses sample_rate.
+            oscillator (Wavetable): Optional oscillator computing the waveform from the phase.
+
+        Returns:
+            ndarray: The (n_samples, 2) int16 samples.
         """
-        tone_threads = []
+        return Tone.render(
+            [None if note.is_resting else note.frequency for note in notes],
+            [note.duration for note in notes],
+            speaker=speaker,
+            rate=rate,
+            oscillator=oscillator,
+        )
 
-        for freq in frequency_array:
-            thread = threading.Thread(target=Tone.sine, args=[freq, duration])
-            tone_threads.append(thread)
+    @staticmethod
+    def render_chord(notes, speaker=None, rate=None, oscillator=None):
+        """
+        Render Note objects played simultaneously into one buffer.
 
-        for thread in tone_threads:
-            thread.start()
+        Parameters:
+            notes (list): A list of Note objects, including rests.
+            speaker (str): Speaker to play the sound from ('l' for left, 'r' for right).
+            rate (int): Sample rate in Hz, None uses sample_rate.
+            oscillator (Wavetable): Optional oscillator computing the waveform from the phase.
+
+        Returns:
+            ndarray: The (n_samples, 2) int16 samples, as long as the longest note (empty if there is none).
+        """
+        return Tone.render(
+            [None if note.is_resting else note.frequency for note in notes],
+            [note.duration for note in notes],
+            speaker=speaker,
+            # An empty chord is rendered as an empty buffer of silence
+            amplitude=1 / max(len(notes), 1),
+            rate=rate,
+            oscillator=oscillator,
+            chord=True,
+        )
+
+    @staticmethod
+    def play_buffer(buf, wait=False):
+        """
+        Play a rendered buffer.
 
-        for thread in tone_threads:
-            thread.join()
+        Parameters:
+            buf (ndarray): The (n_samples, 2) int16 samples.
+            wait (bool): Whether to wait until the buffer has been played.
+
+        Returns:
+            Sound: The sound playing the buffer.
+        """
+        init_mixer()
+        sound = pygame.sndarray.make_sound(buf)
+        sound.play()
+        if wait:
+            time.sleep(len(buf) / pygame.mixer.get_init()[0])
+        return sound
+
+    @staticmethod
+    def write_wav(fileName, buf, rate=None):
+        """
+        Export a rendered buffer to a WAV file.
+
+        Parameters:
+            fileName (str): The path to the WAV file.
+            buf (ndarray): The (n_samples, 2) int16 samples.
+            rate (int): Sample rate of the buffer in Hz, None uses sample_rate.
+        """
+        with wave.open(fileName, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(bits // 8)
+            f.setframerate(rate or sample_rate)
+            f.writeframes(numpy.ascontiguousarray(buf, dtype="<i2").tobytes())
@@ -1,4 +1,5 @@
 import threading
+from Profiler import profiler
 
 class Track:
     """
@@ -7,6 +8,7 @@ class Track:
     Attributes:
         notes_array (list): List of Note objects.
         speaker (str): Speaker to play the notes from ('l' for left, 'r' for right).
+        engine (AudioEngine): Optional streaming engine playing the notes on a single voice.
         note_idx (int): Index of the current note being played.
         stop_flag (bool): Flag to stop playing the notes.
 
@@ -16,17 +18,20 @@ class Track:
         note: Set the index of the current note to be played.
     """
 
-    def __init__(self, notes_array, speaker=None):
+    def __init__(self, notes_array, speaker=None, engine=None):
         """
         Initialize the Track object.
 
         Parameters:
             notes_array (list): List of Note objects.
             speaker (str): Speaker to play the notes from ('l' for left, 'r' for right).
+            engine (AudioEngine): Optional streaming engine playing the notes, so consecutive notes
+                                  continue the same waveform instead of creating a sound each.
         """
         self.notes_array = notes_array
         self.thread = None
         self.speaker = speaker
+        self.engine = engine
         self.note_idx = 0
         self.stop_flag = False
 
@@ -41,9 +46,10 @@ class Track:
             while True:
                 if self.stop_flag:
                     break
-                self.notes_array[self.note_idx].play(speaker=self.speaker)
+                with profiler.span("note"):
+                    self.notes_array[self.note_idx].play(speaker=self.speaker, engine=self.engine)
 
-        self.thread = threading.Thread(target=play_notes)
+        self.thread = threading.Thread(target=play_notes, name="Track")
         self.thread.start()
 
     def stop(self):
@@ -52,6 +58,8 @@ class Track:
         """
         self.stop_flag = True
         self.thread.join()
+        if self.engine is not None:
+            self.engine.release()
 
     def note(self, note_idx):
         """
@@ -0,0 +1,218 @@
+import threading
+import time
+import AWR1843 as awr
+from Pipeline import Stage
+
+# The frame number of the radar is a 32 bit counter
+FRAME_NUMBER_MODULO = 2**32
+
+
+class SensorWatchdog(Stage):
+    """
+    Stage supervising the radar from the frame numbers of the packets it sends (the "heartbeat" topic of the
+    Decoder, published for every packet, with or without detected points), and recovering it in the
+    background when it stops sending them, without restarting the process.
+
+    A stall is detected when no packet was decoded for stall_frames frame periods (at least min_timeout).
+    The sensor is then reported lost on the "sensor" topic, which the binner turns into a "sensor lost"
+    state for the display and the audio, and a recovery thread replays the configuration of the radar:
+    first on the open CLI port, then by reopening both serial ports (see AWR1843.openPorts), every
+    retry_period seconds until frames are decoded again. The reopened ports are published on the
+    "ports" topic for the stages using them. Each attempt holds AWR1843.cliLock, so the other stages
+    writing to the CLI port wait for it to be reopened and configured. The configuration replayed is
+    the last one published on the "config" topic, so the modes of the RadarController and the reloaded
+    scenarios are kept.
+    The sensor is thus reported lost at most max(stall_frames frame periods, min_timeout) plus one check
+    period after its last frame, and a recovery attempt is made every retry_period seconds.
+
+    Gaps (skipped frame numbers), wrap-arounds of the 32 bit frame counter and resets of the sensor
+    (frame numbers starting again from a lower value) are counted without interrupting the pipeline.
+
+    Attributes:
+        lost (bool): Whether the sensor is currently lost.
+        gaps (int): Number of frames missing between two decoded frames.
+        wraps (int): Number of wrap-arounds of the frame counter.
+        resets (int): Number of restarts of the frame counter.
+        stalls (int): Number of times the sensor was lost.
+        attempts (int): Number of recovery attempts.
+        recovery_times (list): Time in seconds from each stall detection to the first frame decoded again.
+        outages (list): Time in seconds between the last frame before each stall and the first frame after it.
+        last_error (Exception): The error of the last failed recovery attempt, None if there is none.
+    """
+
+    def __init__(
+        self,
+        bus,
+        CLIport,
+        Dataport,
+        config,
+        configParameters=None,
+        stall_frames=4,
+        min_timeout=1.0,
+        retry_period=2.0,
+        open_ports=awr.openPorts,
+        period=0.05,
+    ):
+        """
+        Initialize the SensorWatchdog object.
+
+        Parameters:
+            bus (FrameBus): The bus connecting the stages.
+            CLIport (Serial): The serial port for configuration.
+            Dataport (Serial): The serial port for data reception.
+            config (list): The configuration commands sent to the radar at startup, one per line.
+            configParameters (dict): Radar configuration parameters, for the frame period.
+            stall_frames (int): Number of frame periods without any frame after which the sensor is lost.
+            min_timeout (float): Minimum time without any frame after which the sensor is lost, in seconds.
+            retry_period (float): Time between two recovery attempts in seconds.
+            open_ports (callable): Function opening the serial ports, returning the CLI and data ports.
+            period (float): Time between two checks in seconds.
+        """
+        super().__init__(bus, period)
+        self.CLIport = CLIport
+        self.Dataport = Dataport
+        self.config = config
+        self.stall_frames = stall_frames
+        self.min_timeout = min_timeout
+        self.stall_timeout = self.timeout(configParameters)
+        self.retry_period = retry_period
+        self.open_ports = open_ports
+        self.input = bus.subscribe("heartbeat", depth=64)
+        self.config_input = bus.subscribe("config", depth=1)
+
+        self.lost = False
+        self.last_frameNumber = None
+        self.last_good = time.monotonic()
+        self.lost_since = None
+        self.gaps = 0
+        self.wraps = 0
+        self.resets = 0
+        self.stalls = 0
+        self.attempts = 0
+        self.recovery_times = []
+        self.outages = []
+        self.last_error = None
+        self.recovery = None
+
+    def timeout(self, configParameters):
+        """
+        Compute the time without any frame after which the sensor is lost.
+
+        Parameters:
+            configParameters (dict): Radar configuration parameters, None if unknown.
+
+        Returns:
+            float: The timeout in seconds.
+        """
+        if not configParameters or "framePeriodicity" not in configParameters:
+            return self.min_timeout
+        return max(self.min_timeout, self.stall_frames * configParameters["framePeriodicity"] / 1000)
+
+    def check_frame(self, frameNumber):
+        """
+        Count the gaps, wrap-arounds and resets of the frame counter from a decoded frame number.
+
+        Parameters:
+            frameNumber (int): The frame number.
+        """
+        last = self.last_frameNumber
+        self.last_frameNumber = frameNumber
+        if last is None:
+            return
+        skipped = (frameNumber - last - 1) % FRAME_NUMBER_MODULO
+        if frameNumber <= last:
+            if last - frameNumber > FRAME_NUMBER_MODULO // 2:
+                # The counter wrapped around, possibly skipping some frames
+                self.wraps += 1
+                self.gaps += skipped
+            else:
+                # The sensor restarted counting, e.g. after a reset
+                self.resets += 1
+        else:
+            self.gaps += skipped
+
+    def step(self):
+        """
+        Check the frames decoded since the last check, and report the sensor lost or recovered.
+        """
+        config = self.config_input.latest()
+        if config is not None:
+            self.config = config["config"]
+            self.stall_timeout = self.timeout(config["configParameters"])
+
+        now = time.monotonic()
+        received = False
+        while True:
+            frame = self.input.get(timeout=0)
+            if frame is None:
+                break
+            self.check_frame(frame["frameNumber"])
+            received = True
+
+        if received:
+            if self.lost:
+                self.lost = False
+                self.recovery_times.append(now - self.lost_since)
+                self.outages.append(now - self.last_good)
+                self.bus.publish(
+                    "sensor",
+                    {"status": "ok", "timestamp": now, "recovery_time": self.recovery_times[-1]},
+                )
+            self.last_good = now
+        elif not self.lost and now - self.last_good > self.stall_timeout:
+            self.lost = True
+            self.lost_since = now
+            self.stalls += 1
+            self.bus.publish(
+                "sensor",
+                {"status": "lost", "timestamp": now, "frameNumber": self.last_frameNumber or 0},
+            )
+            if self.recovery is None or not self.recovery.is_alive():
+                self.recovery = threading.Thread(
+                    target=self.recover, name="SensorRecovery", daemon=True
+                )
+                self.recovery.start()
+
+    def recover(self):
+        """
+        Replay the configuration of the radar until frames are decoded again, reopening the ports if needed.
+        """
+        reopen = False
+        while self.lost and not self.stop_flag:
+            self.attempts += 1
+            try:
+                # The other stages may not write to the CLI port while it is reopened and the
+                # configuration replayed
+                with awr.cliLock:
+                    if reopen:
+                        self.close_ports()
+                        self.CLIport, self.Dataport = self.open_ports()
+                        self.bus.publish("ports", {"CLIport": self.CLIport, "Dataport": self.Dataport})
+                    awr.sendConfig(self.CLIport, self.config)
+                self.last_error = None
+            except OSError as error:
+                # Covers the errors of pyserial, e.g. when the radar is unplugged
+                self.last_error = error
+            # Reopen the ports if replaying the configuration was not enough
+            reopen = True
+            deadline = time.monotonic() + self.retry_period
+            while self.lost and not self.stop_flag and time.monotonic() < deadline:
+                time.sleep(self.period or 0.05)
+
+    def close_ports(self):
+        """
+        Close the serial ports, ignoring the errors of ports that are already gone.
+        """
+        for port in (self.CLIport, self.Dataport):
+            try:
+                port.close()
+            except OSError:
+                pass
+
+    def stop(self):
+        """
+        Stop the stage thread and the recovery thread.
+        """
+        super().stop()
+        if self.recovery is not None:
+            self.recovery.join(timeout=1)
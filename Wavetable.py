@@ -0,0 +1,150 @@
+import numpy as np
+from utils_notes import NOTE_MAP
+
+# Number of samples of one cycle of a waveform
+TABLE_SIZE = 2048
+
+
+def waveform_table(shape="sine", size=TABLE_SIZE, harmonics=16):
+    """
+    Compute one cycle of a waveform.
+
+    The square, triangle and sawtooth waves are built from their first harmonics, so they do not alias
+    for the notes of the warning sounds.
+
+    Parameters:
+        shape (str): The waveform ('sine', 'square', 'triangle' or 'sawtooth').
+        size (int): Number of samples of the cycle.
+        harmonics (int): Number of harmonics of the non-sine waveforms.
+
+    Returns:
+        ndarray: The samples of the cycle, with a peak amplitude of 1.
+    """
+    phase = 2 * np.pi * np.arange(size) / size
+    if shape == "sine":
+        return np.sin(phase)
+    k = np.arange(1, harmonics + 1)[:, None]
+    if shape == "square":
+        table = (np.sin(k * phase) / k)[::2].sum(axis=0)
+    elif shape == "triangle":
+        odd = k[::2]
+        table = ((-1) ** ((odd - 1) // 2) * np.sin(odd * phase) / odd**2).sum(axis=0)
+    elif shape == "sawtooth":
+        table = (np.sin(k * phase) / k).sum(axis=0)
+    else:
+        raise ValueError("Unknown waveform: %s" % shape)
+    return table / np.abs(table).max()
+
+
+def envelope_table(duration, attack=0.005, decay=None, sample_rate=44100):
+    """
+    Compute the amplitude envelope of a beep: a linear attack followed by an exponential decay.
+
+    Parameters:
+        duration (float): Duration of the beep in seconds, after which the envelope is 0.
+        attack (float): Duration of the attack in seconds.
+        decay (float): Time constant of the decay in seconds, None holds the amplitude until the end.
+        sample_rate (int): Sample rate in Hz.
+
+    Returns:
+        ndarray: The gain of each sample of the beep.
+    """
+    t = np.arange(int(round(duration * sample_rate))) / sample_rate
+    envelope = np.minimum(t / attack, 1.0) if attack > 0 else np.ones(len(t))
+    if decay is not None:
+        envelope *= np.exp(-np.maximum(t - attack, 0.0) / decay)
+    # End on silence, so a beep does not click when it stops
+    envelope[-1:] = 0.0
+    return envelope
+
+
+class Wavetable:
+    """
+    An oscillator reading one precomputed cycle of a waveform by fractional index lookup.
+
+    Looking up the table with a linear interpolation between its two nearest samples replaces the
+    computation of a sin per sample, and any waveform can be used at the same cost.
+
+    Attributes:
+        table (ndarray): One cycle of the waveform, followed by its first sample.
+        size (int): Number of samples of the cycle.
+
+    Methods:
+        __call__: Compute the waveform for phases in radians.
+        render_note: Render a note of NOTE_MAP.
+    """
+
+    def __init__(self, shape="sine", size=TABLE_SIZE, table=None):
+        """
+        Initialize the Wavetable object.
+
+        Parameters:
+            shape (str): The waveform ('sine', 'square', 'triangle' or 'sawtooth').
+            size (int): Number of samples of the cycle.
+            table (ndarray): Optional cycle of a custom waveform, replacing shape and size.
+        """
+        if table is None:
+            table = waveform_table(shape, size)
+        self.size = len(table)
+        # Repeat the first sample at the end, so the interpolation never wraps around
+        self.table = np.append(table, table[0])
+        self.index = np.zeros(0, dtype=np.intp)
+        self.position = np.zeros(0)
+        self.low = np.zeros(0)
+
+    def __call__(self, phase, out):
+        """
+        Compute the waveform for phases in radians.
+
+        Parameters:
+            phase (ndarray): The phases in radians, non-negative.
+            out (ndarray): The buffer receiving the samples, may be phase itself.
+
+        Returns:
+            ndarray: out.
+        """
+        # The work buffers are only reallocated when the size of the blocks changes
+        if self.position.shape != phase.shape:
+            self.position = np.zeros(phase.shape)
+            self.index = np.zeros(phase.shape, dtype=np.intp)
+            self.low = np.zeros(phase.shape)
+
+        # Fractional position of each phase in the table
+        np.multiply(phase, self.size / (2 * np.pi), out=self.position)
+        np.mod(self.position, self.size, out=self.position)
+        np.floor(self.position, out=out)
+        self.index[...] = out
+        self.position -= out
+
+        # Linear interpolation between the two nearest samples
+        np.take(self.table, self.index, out=self.low)
+        self.index += 1
+        np.take(self.table, self.index, out=out)
+        out -= self.low
+        out *= self.position
+        out += self.low
+        return out
+
+    def render_note(self, note, duration, sample_rate=44100, amplitude=1.0, envelope=None):
+        """
+        Render a note of NOTE_MAP.
+
+        Parameters:
+            note (str): The name of the note (e.g., 'C5', 'd#4').
+            duration (float): Duration of the note in seconds.
+            sample_rate (int): Sample rate in Hz.
+            amplitude (float): Amplitude (0 to 1).
+            envelope (ndarray): Optional gain of each sample, e.g. from envelope_table.
+
+        Returns:
+            ndarray: The samples of the note.
+        """
+        frequency = NOTE_MAP[note[0].upper() + note[1:]]
+        phase = 2 * np.pi * frequency * np.arange(int(round(duration * sample_rate))) / sample_rate
+        samples = self(phase, out=np.empty(len(phase)))
+        samples *= amplitude
+        if envelope is not None:
+            n = min(len(samples), len(envelope))
+            samples[:n] *= envelope[:n]
+            samples[n:] *= envelope[-1]
+        return samples
@@ -0,0 +1,147 @@
+"""
+    Allocation check of the per-frame path of the pipeline.
+
+    Runs synthetic frames through the stages of main.py after the decoder, with the default scenario: the
+    region of interest the Decoder applies, the CouplingFilter, the EgoMotionFilter and the SectorBinner
+    following the "motion_points" topic (with and without the point history), sized for the maximum number
+    of points of the scenario. It measures with tracemalloc the memory allocated while processing each
+    frame. The points are filtered, fitted and binned in preallocated buffers, so a frame only allocates
+    a fixed set of small Python objects and arrays (the views of the buffers, the published dictionaries,
+    the NumPy scalars and the arrays of the random pairs of the fit). The check asserts, with no
+    tolerance, that:
+        - The memory allocated per frame is the same for 500 and 1000 points, i.e. nothing is allocated
+          per point (both counts are past the integers cached by Python, which would otherwise differ).
+        - The least memory in use after a frame is the same in the last block of the measured frames as
+          in the first one, after a warm-up.
+    Exits with a non-zero status otherwise.
+
+    Usage: python check_allocations.py
+"""
+
+import sys
+import tracemalloc
+import numpy as np
+import utils
+from FrameBus import FrameBus
+from Pipeline import CouplingFilter, SectorBinner
+from EgoMotion import EgoMotionFilter
+from PointHistory import PointHistory
+from Scenario import Scenario
+
+POINT_COUNTS = (500, 1000)
+
+
+def synthetic_detections(n_points, n_frames, seed=0):
+    """
+    Generate frames of detected points spread over the field of view.
+
+    Parameters:
+        n_points (int): Number of points per frame.
+        n_frames (int): Number of frames.
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        list: The frames, as published by the decoder on the "detections" topic.
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(n_frames):
+        r = rng.uniform(0.05, 2.0, n_points)
+        theta = np.radians(rng.uniform(30, 150, n_points))
+        x, y = utils.polar_to_position(r, theta)
+        detObj = {
+            "numObj": n_points,
+            "x": x.astype(np.float32),
+            "y": y.astype(np.float32),
+            "z": np.zeros(n_points, dtype=np.float32),
+            "velocity": rng.uniform(-0.5, 0.5, n_points).astype(np.float32),
+        }
+        frames.append({"frameNumber": i, "timestamp": i * 0.1, "detObj": detObj})
+    return frames
+
+
+def measure(n_points, history, n_frames=600, warmup=100, block=100):
+    """
+    Measure the memory allocated per frame by the stages following the decoder.
+
+    Parameters:
+        n_points (int): Number of points per frame.
+        history (bool): Whether the binner accumulates the points of the last frames.
+        n_frames (int): Number of measured frames.
+        warmup (int): Number of frames processed before measuring.
+        block (int): Number of frames of the first and last blocks of the measured frames.
+
+    Returns:
+        tuple: The memory allocated while processing a frame in the steady state (the least over the
+               measured frames) and at most, and the growth of the memory in use from the first to
+               the last block of the measured frames, in bytes.
+    """
+    scenario = Scenario.from_file("scenarios/default.json")
+    max_points = scenario.max_points
+    bus = FrameBus()
+    roi = scenario.roi
+    stages = [
+        CouplingFilter(bus, max_points=max_points),
+        EgoMotionFilter(bus, max_points=max_points, seed=0),
+        SectorBinner(
+            bus,
+            scenario.theta_grids,
+            scenario.r_distances,
+            history=PointHistory(n_frames=8, max_points=max_points) if history else None,
+            window=0.5,
+            topic="motion_points",
+            max_points=max_points,
+        ),
+    ]
+    frames = synthetic_detections(n_points, warmup + n_frames)
+
+    def process(frames):
+        # The least and most memory allocated while processing a frame, and the least memory in use
+        # after a frame, which the objects held from one frame to the next only raise when they grow
+        least = most = floor = None
+        for frame in frames:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            # The region of interest is applied by the Decoder to the points it decoded, before it
+            # publishes the frame
+            detObj = roi.apply(dict(frame["detObj"]))
+            bus.publish("detections", {**frame, "detObj": detObj})
+            for stage in stages:
+                stage.step()
+            in_use, peak = tracemalloc.get_traced_memory()
+            least = peak - before if least is None else min(least, peak - before)
+            most = peak - before if most is None else max(most, peak - before)
+            floor = in_use if floor is None else min(floor, in_use)
+        return least, most, floor
+
+    # Trace from the start, so the frames still held by the queues after the warm-up are accounted for.
+    # The results of the blocks are stored in a preallocated array, so that the memory in use during the
+    # last block does not include the results of the previous ones
+    results = np.zeros((3, 3), dtype=np.int64)
+    tracemalloc.start()
+    process(frames[:warmup])
+    results[0] = process(frames[warmup : warmup + block])
+    results[1] = process(frames[warmup + block : -block])
+    results[2] = process(frames[-block:])
+    tracemalloc.stop()
+    return int(results[:, 0].min()), int(results[:, 1].max()), int(results[2, 2] - results[0, 2])
+
+
+if __name__ == "__main__":
+    failed = False
+    for history in (False, True):
+        mode = "history" if history else "previous frame"
+        (small, _, small_growth), (large, most, large_growth) = (
+            measure(n_points, history) for n_points in POINT_COUNTS
+        )
+        print(
+            "%s: %d B per frame with %d points, %d B with %d points (at most %d B), growth %d B"
+            % (mode, small, POINT_COUNTS[0], large, POINT_COUNTS[1], most, max(small_growth, large_growth))
+        )
+        if large != small:
+            print("  the memory allocated per frame depends on the number of points")
+            failed = True
+        if small_growth or large_growth:
+            print("  the memory in use grows from frame to frame")
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,46 @@
+"""
+    Check of the audio modules without an audio device.
+
+    Imports the audio modules and checks that importing them initializes neither pygame nor its mixer, so
+    the headless tools importing them (daemon.py, the checks) do not open an audio device. Then plays a
+    tone with utils_notes.play_tone through the dummy SDL audio driver, on a mixer already initialized at
+    another sample rate than the one requested, and checks that the tone lasts its duration, which it
+    only does when it is rendered at the actual sample rate of the mixer.
+    Exits with a non-zero status otherwise.
+
+    Usage: python check_audio_import.py
+"""
+
+import importlib
+import os
+import sys
+
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+import pygame
+
+# Modules of the audio, imported by the headless tools too
+AUDIO_MODULES = ("Wavetable", "Tone", "utils_notes", "Note", "Track", "AudioEngine")
+
+# Sample rate of the mixer, other than the one play_tone requests by default
+MIXER_RATE = 22050
+DURATION = 0.2
+
+
+if __name__ == "__main__":
+    failed = False
+
+    modules = {name: importlib.import_module(name) for name in AUDIO_MODULES}
+    initialized = [
+        name for name, init in (("pygame", pygame.get_init()), ("mixer", pygame.mixer.get_init())) if init
+    ]
+    print("import: %s initialized" % (", ".join(initialized) or "nothing"))
+    failed = failed or bool(initialized)
+
+    pygame.mixer.init(MIXER_RATE, -16, 2)
+    rate = pygame.mixer.get_init()[0]
+    sound = modules["utils_notes"].play_tone(440, duration=DURATION)
+    length = sound.get_length()
+    print("tone of %.2f s on a mixer at %d Hz: played for %.3f s" % (DURATION, rate, length))
+    failed = failed or abs(length - DURATION) > 0.01
+    pygame.quit()
+    sys.exit(1 if failed else 0)
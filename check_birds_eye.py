@@ -0,0 +1,108 @@
+"""
+    Cost check of the bird's-eye view.
+
+    Measures the time taken to add the points of a frame to a BirdsEyeView and compose its frame, for
+    frames of few and of many points, next to the time taken to draw the same points with a matplotlib
+    scatter plot (Agg backend). The view rasterises the points into fixed-size images, so its cost must
+    not depend on the number of points. Exits with a non-zero status if it does.
+
+    Usage: python check_birds_eye.py
+"""
+
+import sys
+import time
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import utils
+from BirdsEye import BirdsEyeView
+
+# Maximum ratio of the time per frame of the view between large and small frames
+MAX_RATIO = 1.5
+POINT_COUNTS = (16, 1000)
+
+
+def synthetic_frames(n_points, n_frames=50, seed=0):
+    """
+    Generate frames of filtered points spread over the field of view.
+
+    Parameters:
+        n_points (int): Number of points per frame.
+        n_frames (int): Number of frames.
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        list: The (r, theta) float32 arrays of each frame.
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        (
+            rng.uniform(0, 1.5, n_points).astype(np.float32),
+            rng.uniform(-45, 45, n_points).astype(np.float32),
+        )
+        for _ in range(n_frames)
+    ]
+
+
+def time_view(frames):
+    """
+    Measure the time per frame of the bird's-eye view.
+
+    Parameters:
+        frames (list): The points of each frame.
+
+    Returns:
+        float: The median time per frame in milliseconds.
+    """
+    view = BirdsEyeView(utils.sector_edges(-45, 45, 3), utils.level_edges(1.5, 8))
+    times = []
+    for r, theta in frames:
+        start = time.perf_counter()
+        view.add(r, theta)
+        view.render()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+def time_scatter(frames):
+    """
+    Measure the time per frame of a matplotlib scatter plot of the points.
+
+    Parameters:
+        frames (list): The points of each frame.
+
+    Returns:
+        float: The median time per frame in milliseconds.
+    """
+    figure = Figure(figsize=(3.2, 2.4), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    ax.set_xlim(-1.5, 1.5)
+    ax.set_ylim(0, 1.5)
+    scatter = ax.scatter([], [], s=4)
+    times = []
+    for r, theta in frames:
+        start = time.perf_counter()
+        angle = np.radians(theta)
+        scatter.set_offsets(np.stack([-r * np.sin(angle), r * np.cos(angle)], axis=1))
+        canvas.draw()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+if __name__ == "__main__":
+    view_times = []
+    for n_points in POINT_COUNTS:
+        frames = synthetic_frames(n_points)
+        view_time, scatter_time = time_view(frames), time_scatter(frames)
+        view_times.append(view_time)
+        print(
+            "%d points: bird's-eye view %.2f ms per frame, scatter plot %.2f ms"
+            % (n_points, view_time, scatter_time)
+        )
+
+    ratio = view_times[-1] / view_times[0]
+    failed = ratio > MAX_RATIO
+    if failed:
+        print("  the cost of the view grows with the number of points: x%.2f > x%.2f" % (ratio, MAX_RATIO))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+"""
+    Check of the messages published by the daemon to its IPC subscribers.
+
+    Runs the stages of daemon.py (with --points) on a replayed synthetic scene, connects a subscriber to
+    the socket, and goes through:
+        - The scene, with an obstacle in the field of view.
+        - An empty scene, in which the radar sends packets without any detected point: the subscriber must
+          receive a state without any object for it, instead of keeping the last detected one.
+        - A restart of the frame counter of the radar, as after a recovery of the sensor: the subscriber
+          must keep receiving the points of the frames after it.
+    Exits with a non-zero status if a check fails.
+
+    Usage: python check_ipc.py
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import time
+import numpy as np
+import utils
+import AWR1843 as awr
+from FrameBus import FrameBus
+from Replay import ReplayPort, encode_packet, synthetic_scene
+from Pipeline import RadarSource, Decoder, CouplingFilter, SectorBinner
+from IpcPublisher import IpcPublisher, decode_message
+
+FRAME_PERIOD = 0.05
+
+
+def receive(client, duration):
+    """
+    Receive the messages published for a while.
+
+    Parameters:
+        client (socket): The subscriber socket.
+        duration (float): Time to receive in seconds.
+
+    Returns:
+        list: The decoded messages.
+    """
+    messages = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            messages.append(decode_message(client.recv(65536)))
+        except socket.timeout:
+            pass
+    return messages
+
+
+if __name__ == "__main__":
+    configFileName = "Radar_config_v3.cfg"
+    configParameters = awr.parseConfigFile(configFileName=configFileName, numRxAnt=1, numTxAnt=1)
+    thetamin, thetamax, maxdistance = awr.parseFovConfig(configFileName)
+
+    # The scene, an empty scene, then the scene again with the frame counter restarted from 0
+    scene = synthetic_scene(40, frame_period=FRAME_PERIOD)
+    none = np.zeros(0)
+    empty = [encode_packet(40 + i, none, none, none, none) for i in range(20)]
+    restarted = synthetic_scene(40, frame_period=FRAME_PERIOD)
+    port = ReplayPort(scene + empty + restarted, period=FRAME_PERIOD)
+
+    socketPath = os.path.join(tempfile.mkdtemp(), "raspas.sock")
+    awr.byteBufferLength = 0
+    bus = FrameBus()
+    stages = [
+        RadarSource(bus, port),
+        Decoder(bus, configParameters),
+        CouplingFilter(bus),
+        SectorBinner(
+            bus, utils.sector_edges(thetamin, thetamax, 3), utils.level_edges(maxdistance, 8)
+        ),
+        IpcPublisher(bus, socketPath, send_points=True),
+    ]
+    for stage in stages:
+        stage.start()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    client.connect(socketPath)
+    client.settimeout(0.1)
+    time.sleep(0.2)
+
+    port.start()
+    messages = receive(client, (len(port.packets) + 10) * FRAME_PERIOD)
+    for stage in stages:
+        stage.stop()
+    client.close()
+
+    failed = False
+    # The messages of each part, told apart by the restart of the frame numbers
+    restart = next(
+        (i for i in range(1, len(messages)) if messages[i]["frameNumber"] < messages[i - 1]["frameNumber"]),
+        len(messages),
+    )
+    before, after = messages[:restart], messages[restart:]
+    in_empty = [message for message in before if message["frameNumber"] >= 40]
+    cleared = bool(in_empty) and not in_empty[-1]["detected"] and (in_empty[-1]["levels"] == -1).all()
+    with_points = [message for message in after if len(message["points"])]
+    print(
+        "%d messages: %d in the empty scene (%s), %d after the restart of the frame counter, %d with points"
+        % (
+            len(messages),
+            len(in_empty),
+            "cleared" if cleared else "not cleared",
+            len(after),
+            len(with_points),
+        )
+    )
+    if not cleared:
+        print("  the empty scene did not clear the state")
+        failed = True
+    if len(after) < 20 or len(with_points) < len(after) // 2:
+        print("  the points were not paired with the states after the restart of the frame counter")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,256 @@
+"""
+    End-to-end latency and throughput check of the pipeline.
+
+    Replays a deterministic synthetic scene through a ReplayPort in place of the data serial port, and runs
+    the pipeline of main.py with the default scenario, as built by build_pipeline, headless (Agg backend for
+    the display, dummy SDL driver for the audio, a CLI port discarding the commands sent to the radar):
+        - At the pace of the radar, it measures the time from the arrival of each packet to the change of
+          the sector state it causes (publication on the "changes" topic), and to the change of the note
+          of the Track.
+        - With every packet available at once, it measures the number of frames processed per second.
+    Exits with a non-zero status if the 99th percentile of a latency or the throughput regresses past the
+    thresholds stored in latency_thresholds.json.
+
+    Usage: python check_latency.py [--frames 300] [--period 0.05] [--update]
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import matplotlib
+
+matplotlib.use("Agg")
+import numpy as np
+import pygame
+import AWR1843 as awr
+from FrameBus import FrameBus
+from Replay import ReplayPort, synthetic_scene
+from Track import Track
+from AudioEngine import AudioEngine
+from Scenario import Scenario
+from PipelineBuilder import build_pipeline
+
+# Ratios applied to the measurements when the thresholds are updated, to absorb the noise of the measure
+LATENCY_MARGIN = 3.0
+THROUGHPUT_MARGIN = 0.5
+
+
+class NullCLIPort:
+    """
+    A stand-in of the CLI serial port of the radar, discarding the commands written to it.
+    """
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class ProbeBus(FrameBus):
+    """
+    A FrameBus recording the time at which each frame is published on the probed topics.
+    """
+
+    def __init__(self, topics=("changes", "sectors")):
+        """
+        Initialize the ProbeBus object.
+
+        Parameters:
+            topics (tuple): The probed topics.
+        """
+        super().__init__()
+        self.published = {topic: [] for topic in topics}
+
+    def publish(self, topic, frame):
+        if topic in self.published:
+            self.published[topic].append((time.perf_counter(), frame["frameNumber"]))
+        super().publish(topic, frame)
+
+
+class ProbeTrack(Track):
+    """
+    A Track recording the time at which its note changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changes = []
+
+    def note(self, note_idx):
+        if note_idx != self.note_idx:
+            self.changes.append(time.perf_counter())
+        super().note(note_idx)
+
+
+def run(port, scenarioFileName="scenarios/default.json", duration_after=0.5, timeout=60):
+    """
+    Run the pipeline of main.py on a replay port until every packet has been processed.
+
+    Parameters:
+        port (ReplayPort): The port replaying the packets.
+        scenarioFileName (str): The scenario profile of the run.
+        duration_after (float): Time to keep running after the last packet has been read in seconds.
+        timeout (float): Maximum duration of the run in seconds.
+
+    Returns:
+        tuple: The ProbeBus and the ProbeTrack of the run.
+    """
+    scenario = Scenario.from_file(scenarioFileName)
+
+    # Start from an empty byte buffer of the parser
+    awr.byteBufferLength = 0
+
+    engine = AudioEngine(oscillator=scenario.oscillator, envelope=scenario.envelope)
+    engine.start()
+    track = ProbeTrack(scenario.notes, engine=engine)
+    track.play()
+
+    bus = ProbeBus()
+    CLIport = NullCLIPort()
+    stages, display, _ = build_pipeline(
+        bus, scenario, track, CLIport, port, open_ports=lambda: (CLIport, port), seed=0
+    )
+    for stage in stages:
+        stage.start()
+
+    # Main loop of main.py, until every packet has been processed
+    port.start()
+    start = time.perf_counter()
+    end = None
+    while time.perf_counter() - start < timeout:
+        display.update()
+        display.pause(0.05)
+        if end is None and port.done():
+            end = time.perf_counter()
+        if end is not None and time.perf_counter() - end > duration_after:
+            break
+
+    for stage in stages:
+        stage.stop()
+    track.stop()
+    engine.stop()
+    return bus, track
+
+
+def percentile_ms(latencies, q=99):
+    """
+    Compute a percentile of latencies in milliseconds.
+
+    Parameters:
+        latencies (list): The latencies in seconds.
+        q (float): The percentile.
+
+    Returns:
+        float: The percentile in milliseconds, nan if there is no latency.
+    """
+    if not latencies:
+        return float("nan")
+    return float(np.percentile(latencies, q)) * 1000
+
+
+def measure_latency(n_frames, period):
+    """
+    Measure the latency of the sector state and of the note at the pace of the radar.
+
+    Parameters:
+        n_frames (int): Number of frames.
+        period (float): Time between frames in seconds.
+
+    Returns:
+        tuple: The latencies in seconds of the changes of the sector state and of the note.
+    """
+    port = ReplayPort(synthetic_scene(n_frames, frame_period=period), period=period)
+    bus, track = run(port)
+    arrivals = port.arrivals
+
+    # Time from the arrival of a packet to the change of the sector state it caused
+    changes = bus.published["changes"]
+    sector_latencies = [t - arrivals[frameNumber] for t, frameNumber in changes]
+
+    # The note changes on the last change of the sector state published before it
+    change_times = [t for t, _ in changes]
+    note_latencies = []
+    for t in track.changes:
+        i = bisect.bisect_right(change_times, t) - 1
+        if i >= 0:
+            note_latencies.append(t - arrivals[changes[i][1]])
+    return sector_latencies, note_latencies
+
+
+def measure_throughput(n_frames):
+    """
+    Measure the number of frames processed per second with every packet available at once.
+
+    Parameters:
+        n_frames (int): Number of frames.
+
+    Returns:
+        tuple: The number of frames per second and the number of frames processed.
+    """
+    port = ReplayPort(synthetic_scene(n_frames))
+    bus, _ = run(port, duration_after=0.2)
+    sectors = bus.published["sectors"]
+    if not sectors:
+        return 0.0, 0
+    elapsed = sectors[-1][0] - port.arrivals[0]
+    return len(sectors) / elapsed, len(sectors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end latency and throughput check")
+    parser.add_argument("--frames", type=int, default=300, help="number of replayed frames")
+    parser.add_argument("--period", type=float, default=0.05, help="time between frames in seconds")
+    parser.add_argument("--thresholds", default="latency_thresholds.json", help="file of the thresholds")
+    parser.add_argument("--update", action="store_true", help="store new thresholds from this run")
+    args = parser.parse_args()
+
+    pygame.init()
+    sector_latencies, note_latencies = measure_latency(args.frames, args.period)
+    fps, processed = measure_throughput(args.frames)
+    pygame.quit()
+
+    results = {
+        "sector_change_p99_ms": percentile_ms(sector_latencies),
+        "note_change_p99_ms": percentile_ms(note_latencies),
+        "throughput_fps": fps,
+    }
+    print(
+        "sector state: %d changes, p50 %.1f ms, p99 %.1f ms"
+        % (len(sector_latencies), percentile_ms(sector_latencies, 50), results["sector_change_p99_ms"])
+    )
+    print(
+        "note: %d changes, p50 %.1f ms, p99 %.1f ms"
+        % (len(note_latencies), percentile_ms(note_latencies, 50), results["note_change_p99_ms"])
+    )
+    print("throughput: %.0f frames per second (%d of %d frames)" % (fps, processed, args.frames))
+
+    if args.update:
+        thresholds = {
+            "sector_change_p99_ms": round(results["sector_change_p99_ms"] * LATENCY_MARGIN, 1),
+            "note_change_p99_ms": round(results["note_change_p99_ms"] * LATENCY_MARGIN, 1),
+            "min_throughput_fps": round(fps * THROUGHPUT_MARGIN, 1),
+        }
+        with open(args.thresholds, "w") as f:
+            json.dump(thresholds, f, indent=4)
+            f.write("\n")
+        print("thresholds stored in %s" % args.thresholds)
+        sys.exit(0)
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    failed = False
+    for key in ("sector_change_p99_ms", "note_change_p99_ms"):
+        # A latency that could not be measured is a regression too
+        if not results[key] <= thresholds[key]:
+            print("  %s regressed: %.1f ms > %.1f ms" % (key, results[key], thresholds[key]))
+            failed = True
+    if fps < thresholds["min_throughput_fps"]:
+        print("  throughput regressed: %.0f < %.0f frames per second" % (fps, thresholds["min_throughput_fps"]))
+        failed = True
+    sys.exit(1 if failed else 0)
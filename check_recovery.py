@@ -0,0 +1,267 @@
+"""
+    Recovery check of the sensor watchdog.
+
+    Runs the acquisition stages on a simulated radar, whose data port replays a synthetic scene, through
+    an empty scene, in which the radar keeps sending packets without any detected point and must not be
+    reported lost, through corrupt packets, which the decoder must drop while it goes on decoding the
+    next ones, and then through two outages:
+        - The radar stops streaming, as when the UART stalls, until its configuration is sent again.
+        - The radar is unplugged: the ports fail until they are reopened, which fails a few times.
+    Checks that the sensor is reported lost and recovered each time, with the "sensor lost" state
+    published for the display and the audio, and that the recovery time stays within its bound.
+    Exits with a non-zero status otherwise.
+
+    Usage: python check_recovery.py
+"""
+
+import struct
+import sys
+import time
+import numpy as np
+import utils
+import AWR1843 as awr
+from FrameBus import FrameBus
+from Replay import ReplayPort, encode_packet, synthetic_scene
+from Pipeline import RadarSource, Decoder, CouplingFilter, SectorBinner
+from Watchdog import SensorWatchdog
+
+FRAME_PERIOD = 0.05
+STALL_TIMEOUT = 0.3
+RETRY_PERIOD = 0.5
+
+
+class SimulatedRadar:
+    """
+    A radar streaming packets at a fixed period while started, whose ports can stall or be unplugged.
+    """
+
+    def __init__(self):
+        """
+        Initialize the SimulatedRadar object.
+        """
+        self.packets = synthetic_scene(10000, frame_period=FRAME_PERIOD)
+        self.next_packet = 0
+        self.unplugged = False
+        self.failed_opens = 0
+        self.CLIport = SimulatedCLIPort(self)
+        self.Dataport = SimulatedDataPort(self)
+
+    def start(self):
+        """
+        Start streaming from the next packet, as after sensorStart.
+        """
+        self.Dataport.port = ReplayPort(self.packets[self.next_packet :], period=FRAME_PERIOD)
+        self.Dataport.port.start()
+
+    def empty_scene(self, duration):
+        """
+        Stream packets without any detected point for a while, then the scene again.
+
+        Parameters:
+            duration (float): Duration of the empty scene in seconds.
+        """
+        self.next_packet += self.Dataport.port.released
+        none = np.zeros(0)
+        empty = [
+            encode_packet(self.next_packet + i, none, none, none, none)
+            for i in range(int(duration / FRAME_PERIOD))
+        ]
+        # The port starts from the next packet, as in start, so stall counts the packets released alike
+        packets = empty + self.packets[self.next_packet + len(empty) :]
+        self.Dataport.port = ReplayPort(packets, period=FRAME_PERIOD)
+        self.Dataport.port.start()
+
+    def corrupt(self, count):
+        """
+        Stream the next packets with a wrong number of objects, every other one, then the scene again.
+
+        Parameters:
+            count (int): Number of corrupt packets.
+        """
+        self.next_packet += self.Dataport.port.released
+        packets = self.packets[self.next_packet :]
+        for i in range(0, 2 * count, 2):
+            packet = bytearray(packets[i])
+            # Number of detected objects of the header, far more than the packet holds
+            struct.pack_into("<I", packet, 28, 100000)
+            packets[i] = bytes(packet)
+        self.Dataport.port = ReplayPort(packets, period=FRAME_PERIOD)
+        self.Dataport.port.start()
+
+    def stall(self):
+        """
+        Stop streaming, as when the UART stalls.
+        """
+        self.next_packet += self.Dataport.port.released
+        self.Dataport.port = ReplayPort([])
+
+    def open_ports(self):
+        """
+        Reopen the ports, failing while the radar is unplugged.
+        """
+        if self.unplugged:
+            self.failed_opens += 1
+            if self.failed_opens < 3:
+                raise OSError("could not open port /dev/ttyACM0")
+            self.unplugged = False
+        self.CLIport = SimulatedCLIPort(self)
+        self.Dataport = SimulatedDataPort(self)
+        return self.CLIport, self.Dataport
+
+
+class SimulatedCLIPort:
+    """
+    The CLI port of the simulated radar, starting the stream on sensorStart.
+    """
+
+    def __init__(self, radar):
+        self.radar = radar
+        self.closed = False
+
+    def write(self, data):
+        if self.closed or self.radar.unplugged:
+            raise OSError("write failed")
+        if data == b"sensorStart\n":
+            self.radar.start()
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedDataPort:
+    """
+    The data port of the simulated radar.
+    """
+
+    def __init__(self, radar):
+        self.radar = radar
+        self.port = ReplayPort([])
+        self.closed = False
+
+    @property
+    def in_waiting(self):
+        if self.closed or self.radar.unplugged:
+            raise OSError("read failed")
+        return self.port.in_waiting
+
+    def read(self, size=1):
+        return self.port.read(size)
+
+    def close(self):
+        self.closed = True
+
+
+def wait(condition, timeout):
+    """
+    Wait for a condition to hold.
+
+    Parameters:
+        condition (callable): The condition.
+        timeout (float): Maximum time to wait in seconds.
+
+    Returns:
+        bool: Whether the condition holds.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+if __name__ == "__main__":
+    configFileName = "Radar_config_v3.cfg"
+    config = ["sensorStop", "sensorStart"]
+    configParameters = awr.parseConfigFile(configFileName=configFileName, numRxAnt=1, numTxAnt=1)
+    thetamin, thetamax, maxdistance = awr.parseFovConfig(configFileName)
+
+    radar = SimulatedRadar()
+    bus = FrameBus()
+    lost_states = bus.subscribe("changes", depth=1024)
+    watchdog = SensorWatchdog(
+        bus,
+        radar.CLIport,
+        radar.Dataport,
+        config,
+        min_timeout=STALL_TIMEOUT,
+        retry_period=RETRY_PERIOD,
+        open_ports=radar.open_ports,
+    )
+    decoder = Decoder(bus, configParameters)
+    stages = [
+        RadarSource(bus, radar.Dataport),
+        decoder,
+        CouplingFilter(bus),
+        SectorBinner(
+            bus, utils.sector_edges(thetamin, thetamax, 3), utils.level_edges(maxdistance, 8)
+        ),
+        watchdog,
+    ]
+    for stage in stages:
+        stage.start()
+    awr.sendConfig(radar.CLIport, config)
+
+    failed = False
+    # An empty scene longer than the stall timeout is not an outage: the radar keeps sending packets
+    time.sleep(1.0)
+    stalls, attempts = watchdog.stalls, watchdog.attempts
+    radar.empty_scene(3 * STALL_TIMEOUT)
+    time.sleep(3 * STALL_TIMEOUT + 0.5)
+    reported = watchdog.stalls > stalls or watchdog.attempts > attempts
+    print("empty scene: sensor %s" % ("reported lost" if reported else "kept alive"))
+    failed = failed or reported
+
+    # Corrupt packets are dropped, the decoder goes on with the next ones and the sensor is not lost
+    stalls, frameNumber = watchdog.stalls, watchdog.last_frameNumber
+    radar.corrupt(3)
+    time.sleep(1.0)
+    decoding = decoder.thread.is_alive() and watchdog.last_frameNumber > frameNumber + 6
+    print(
+        "corrupt packets: %d dropped, decoder %s, sensor %s"
+        % (
+            decoder.errors,
+            "decoding" if decoding else "stopped",
+            "reported lost" if watchdog.stalls > stalls else "kept alive",
+        )
+    )
+    failed = failed or decoder.errors != 3 or not decoding or watchdog.stalls > stalls
+
+    # Each outage must be recovered within the detection, the attempts needed and the restart of the stream
+    for name, outage, attempts in (("stall", radar.stall, 1), ("unplug", None, 3)):
+        time.sleep(1.0)
+        stalls = watchdog.stalls
+        if outage is not None:
+            outage()
+        else:
+            radar.unplugged = True
+            radar.stall()
+        bound = STALL_TIMEOUT + attempts * RETRY_PERIOD + 4 * FRAME_PERIOD
+        lost = wait(lambda: watchdog.stalls > stalls, STALL_TIMEOUT + 0.5)
+        recovered = lost and wait(lambda: not watchdog.lost, bound + 1.0)
+        states = []
+        while True:
+            state = lost_states.get(timeout=0)
+            if state is None:
+                break
+            states.append(state)
+        shown = any(state.get("sensor_lost") for state in states)
+        if not recovered:
+            print("%s: not recovered (lost: %s, attempts: %d)" % (name, lost, watchdog.attempts))
+            failed = True
+            continue
+        recovery_time = watchdog.recovery_times[-1]
+        print(
+            "%s: recovered in %.2f s (bound %.2f s), outage %.2f s, sensor lost state %s"
+            % (name, recovery_time, bound, watchdog.outages[-1], "shown" if shown else "missing")
+        )
+        if recovery_time > bound or not shown:
+            failed = True
+
+    for stage in stages:
+        stage.stop()
+    print(
+        "%d stalls, %d recovery attempts, %d frames missing, %d resets"
+        % (watchdog.stalls, watchdog.attempts, watchdog.gaps, watchdog.resets)
+    )
+    sys.exit(1 if failed else 0)
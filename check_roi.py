@@ -0,0 +1,150 @@
+"""
+    Check of the region of interest pre-filter of the decoder.
+
+    Decodes synthetic packets whose points are partly out of the region of interest (behind the field of
+    view, too far, too high, static or with a low SNR) with a RoiFilter, and checks that the points
+    published are exactly the ones within every bound, computed point by point. Then checks that the
+    voxel downsampling leaves at most one point per voxel, within the bounds of the points it merges.
+    Prints the reduction ratio and exits with a non-zero status if a check fails.
+
+    Usage: python check_roi.py
+"""
+
+import sys
+import numpy as np
+import AWR1843 as awr
+from FrameBus import FrameBus
+from Pipeline import Decoder
+from Replay import encode_packet
+from RoiFilter import RoiFilter
+
+BOUNDS = {
+    "min_range": 0.1,
+    "max_range": 2.0,
+    "min_azimuth": -60.0,
+    "max_azimuth": 60.0,
+    "min_z": -0.3,
+    "max_z": 0.5,
+    "min_speed": 0.05,
+    "max_speed": None,
+    "min_snr": 12.0,
+}
+
+
+def synthetic_points(n_frames, n_points=64, seed=0):
+    """
+    Generate points spread around the car, partly out of the region of interest.
+
+    Parameters:
+        n_frames (int): Number of frames.
+        n_points (int): Number of points per frame.
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        list: The (x, y, z, velocity, snr) float32 arrays of each frame.
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n_frames):
+        r = rng.uniform(0, 3, n_points)
+        theta = np.radians(rng.uniform(-180, 180, n_points))
+        x = (r * np.cos(theta)).astype(np.float32)
+        y = (r * np.sin(theta)).astype(np.float32)
+        z = rng.normal(0, 0.4, n_points).astype(np.float32)
+        velocity = rng.normal(0, 0.3, n_points).astype(np.float32)
+        # The side information holds the SNR in 0.1 dB
+        snr = (np.round(rng.uniform(0, 30, n_points) * 10) / 10).astype(np.float32)
+        frames.append((x, y, z, velocity, snr))
+    return frames
+
+
+def reference_keep(x, y, z, velocity, snr):
+    """
+    Compute point by point whether each point is within the bounds.
+
+    Returns:
+        list: Whether each point is kept.
+    """
+    keep = []
+    for i in range(len(x)):
+        r = np.hypot(np.float32(x[i]), np.float32(y[i]))
+        azimuth = np.degrees(np.arctan2(y[i], x[i]) - np.pi / 2)
+        keep.append(
+            BOUNDS["min_range"] <= r <= BOUNDS["max_range"]
+            and BOUNDS["min_azimuth"] <= azimuth <= BOUNDS["max_azimuth"]
+            and BOUNDS["min_z"] <= z[i] <= BOUNDS["max_z"]
+            and abs(velocity[i]) >= BOUNDS["min_speed"]
+            and snr[i] >= BOUNDS["min_snr"]
+        )
+    return keep
+
+
+def decode(frames, roi):
+    """
+    Decode the packets of the frames with a Decoder.
+
+    Parameters:
+        frames (list): The points of each frame.
+        roi (RoiFilter): The filter of the region of interest.
+
+    Returns:
+        tuple: The Decoder and the frames it published.
+    """
+    configParameters = awr.parseConfigFile("Radar_config_v3.cfg", numRxAnt=1, numTxAnt=1)
+    awr.byteBufferLength = 0
+    bus = FrameBus()
+    decoder = Decoder(bus, configParameters, roi=roi)
+    detections = bus.subscribe("detections", depth=len(frames) + 1)
+    for frameNumber, points in enumerate(frames):
+        bus.publish("raw", (0.0, encode_packet(frameNumber, *points[:4], snr=points[4])))
+        decoder.step()
+    published = []
+    while True:
+        frame = detections.get(timeout=0)
+        if frame is None:
+            break
+        published.append(frame)
+    return decoder, published
+
+
+if __name__ == "__main__":
+    frames = synthetic_points(50)
+    failed = False
+
+    decoder, published = decode(frames, RoiFilter(**BOUNDS))
+    if len(published) != len(frames):
+        print("%d of %d frames decoded" % (len(published), len(frames)))
+        failed = True
+    mismatches = 0
+    for points, frame in zip(frames, published):
+        detObj = frame["detObj"]
+        keep = np.array(reference_keep(*points))
+        for field, values in zip(("x", "y", "z", "velocity", "snr"), points):
+            if not np.allclose(detObj[field], values[keep], atol=1e-6):
+                mismatches += 1
+        if frame["numRaw"] != len(points[0]) or detObj["numObj"] != np.count_nonzero(keep):
+            mismatches += 1
+    print(
+        "region of interest: %d of %d points kept, reduction %.0f %%, %d mismatches"
+        % (decoder.points_kept, decoder.points_in, 100 * decoder.reduction, mismatches)
+    )
+    failed = failed or mismatches > 0
+
+    voxel_size = 0.25
+    decoder, published = decode(frames, RoiFilter(**BOUNDS, voxel_size=voxel_size))
+    errors = 0
+    for points, frame in zip(frames, published):
+        detObj = frame["detObj"]
+        keep = np.array(reference_keep(*points))
+        x, y, z = (values[keep] for values in points[:3])
+        # One point per occupied voxel, at the mean of the points of the voxel
+        voxels = np.unique(np.floor(np.stack([x, y, z], axis=1) / voxel_size), axis=0)
+        merged = np.floor(np.stack([detObj["x"], detObj["y"], detObj["z"]], axis=1) / voxel_size)
+        if len(merged) != len(voxels) or not np.array_equal(np.unique(merged, axis=0), voxels):
+            errors += 1
+    print(
+        "voxel downsampling (%.2f m): %d of %d points kept, reduction %.0f %%, %d errors"
+        % (voxel_size, decoder.points_kept, decoder.points_in, 100 * decoder.reduction, errors)
+    )
+    failed = failed or errors > 0
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,192 @@
+"""
+    Check of the shared memory ring between two processes.
+
+    A consumer process attaches to a SharedFrameRing and reads it with a SharedFrameSource, while this
+    process writes frames whose points are a function of their frame number, so the consumer can tell a
+    frame mixing the points of two frames:
+        - Through the Decoder of the pipeline, at the pace of the radar, as daemon.py --shm does: every
+          frame must be received whole, and so must the frames the Decoder publishes on the bus, read
+          once all of them are queued (long after their slots of the ring were written again).
+        - With ring.write in a tight loop on a ring of 2 slots of large frames, so the writer now and then
+          laps the consumer while it copies a frame: the torn frames must be dropped (and counted) and
+          every frame published must still be whole.
+    The consumer is a separate interpreter, attached to the ring by name like the clients of daemon.py.
+    Exits with a non-zero status if a frame received is not whole, or if no frame is received.
+
+    Usage: python check_shared_frames.py
+"""
+
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import AWR1843 as awr
+from FrameBus import FrameBus
+from Replay import ReplayPort, encode_packet
+from Pipeline import RadarSource, Decoder
+from SharedFrame import SharedFrameRing, SharedFrameSource
+
+FRAME_PERIOD = 0.01
+# Points per frame of the stress case, large enough for the writer to lap the consumer during a copy
+STRESS_POINTS = 100000
+
+
+def frame_points(frameNumber, max_points=1000):
+    """
+    Generate the points of a frame, whose number (held by all the x) changes from one frame to the next.
+
+    Parameters:
+        frameNumber (int): The frame number.
+        max_points (int): Maximum number of points.
+
+    Returns:
+        tuple: The x, y, z and velocity arrays of the points.
+    """
+    n = max_points - frameNumber % 64
+    index = np.arange(n, dtype=np.float32)
+    return np.full(n, n, dtype=np.float32), index, -index, index / 2
+
+
+def is_whole(frame):
+    """
+    Check that the points of a received frame all belong to the same frame, as generated by frame_points.
+
+    Parameters:
+        frame (dict): The frame published on the "detections" topic.
+
+    Returns:
+        bool: Whether the frame is whole.
+    """
+    detObj = frame["detObj"]
+    x, index = detObj["x"], np.arange(detObj["numObj"], dtype=np.float32)
+    return (
+        (x == detObj["numObj"]).all()
+        and np.array_equal(detObj["y"], index)
+        and np.array_equal(detObj["z"], -index)
+        and np.array_equal(detObj["velocity"], index / 2)
+    )
+
+
+def consume(name):
+    """
+    Read the ring, as a consumer process, until the standard input is closed, and print what was received.
+
+    Parameters:
+        name (str): The name of the ring.
+    """
+    ring = SharedFrameRing(name=name)
+    bus = FrameBus()
+    detections = bus.subscribe("detections", depth=1024)
+    source = SharedFrameSource(bus, ring, period=0.0005)
+    done = threading.Event()
+    threading.Thread(target=lambda: (sys.stdin.read(), done.set()), daemon=True).start()
+    source.start()
+    print("ready", flush=True)
+    received = broken = 0
+    while True:
+        frame = detections.get(timeout=0.05)
+        if frame is None:
+            if done.is_set():
+                break
+            continue
+        received += 1
+        if not is_whole(frame):
+            broken += 1
+    source.stop()
+    print(received, broken, source.missed, source.torn, flush=True)
+    ring.close()
+
+
+def run(ring, write):
+    """
+    Run a consumer process, a separate interpreter attached to the ring by name, while frames are written.
+
+    Parameters:
+        ring (SharedFrameRing): The ring, created by this process.
+        write (callable): Function writing the frames.
+
+    Returns:
+        list: The number of frames received, broken, missed and torn by the consumer.
+    """
+    command = [sys.executable, __file__, "--consume", ring.name]
+    consumer = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    consumer.stdout.readline()
+    write()
+    time.sleep(0.2)
+    output, _ = consumer.communicate(timeout=30)
+    return [int(count) for count in output.split()]
+
+
+def write_decoded(ring, queued, n_frames=200):
+    """
+    Write frames through the Decoder of the pipeline, at the pace of the radar.
+
+    Parameters:
+        ring (SharedFrameRing): The ring.
+        queued (list): List the frames published on the bus are appended to, once all are written.
+    """
+    configParameters = awr.parseConfigFile("Radar_config_v3.cfg", numRxAnt=1, numTxAnt=1)
+    port = ReplayPort(
+        [encode_packet(i, *frame_points(i)) for i in range(1, n_frames + 1)], period=FRAME_PERIOD
+    )
+    bus = FrameBus()
+    detections = bus.subscribe("detections", depth=1024)
+    stages = [RadarSource(bus, port, period=FRAME_PERIOD / 2), Decoder(bus, configParameters, ring=ring)]
+    for stage in stages:
+        stage.start()
+    port.start()
+    while not port.done():
+        time.sleep(FRAME_PERIOD)
+    time.sleep(0.1)
+    for stage in stages:
+        stage.stop()
+    frame = detections.get(timeout=0)
+    while frame is not None:
+        queued.append(frame)
+        frame = detections.get(timeout=0)
+
+
+def write_fast(ring, duration=2.0):
+    """
+    Write frames of as many points as the ring holds in a tight loop, so that writing the next two frames
+    takes about as long as copying one out.
+    """
+    frames = [
+        dict(zip(("x", "y", "z", "velocity"), frame_points(i, ring.max_points))) for i in range(64)
+    ]
+    frameNumber = 1
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        ring.write(frameNumber, frames[frameNumber % len(frames)], 0.0)
+        frameNumber += 1
+
+
+if __name__ == "__main__":
+    if "--consume" in sys.argv:
+        consume(sys.argv[sys.argv.index("--consume") + 1])
+        sys.exit(0)
+    failed = False
+
+    ring = SharedFrameRing(create=True)
+    queued = []
+    received, broken, missed, torn = run(ring, lambda: write_decoded(ring, queued))
+    ring.close()
+    print(
+        "decoder, %d slots: %d frames received, %d broken, %d missed, %d torn"
+        % (ring.n_slots, received, broken, missed, torn)
+    )
+    failed = failed or broken > 0 or received == 0
+    queued_broken = sum(not is_whole(frame) for frame in queued)
+    print("decoder, bus: %d frames queued, %d broken" % (len(queued), queued_broken))
+    failed = failed or queued_broken > 0 or len(queued) == 0
+
+    ring = SharedFrameRing(create=True, n_slots=2, max_points=STRESS_POINTS)
+    received, broken, missed, torn = run(ring, lambda: write_fast(ring))
+    ring.close()
+    print(
+        "tight loop, %d slots: %d frames received, %d broken, %d missed, %d torn and dropped"
+        % (ring.n_slots, received, broken, missed, torn)
+    )
+    failed = failed or broken > 0 or received == 0
+    sys.exit(1 if failed else 0)
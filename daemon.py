@@ -0,0 +1,132 @@
+"""
+    Headless RasPAS daemon.
+
+    Runs the acquisition and sector binning of main.py without any graphical interface and publishes
+    the sector state of every frame to the local processes connected to a UNIX domain socket
+    (see IpcPublisher.decode_message for the message format).
+
+    Usage: python daemon.py [--config Radar_config_v3.cfg] [--socket /tmp/raspas.sock] [--points] [--audio]
+                            [--min-snr DB] [--voxel-size M] [--shm NAME] [--max-points N]
+                            [--profile N]
+
+    With --shm, the detected points of every frame are also written in place into a SharedFrameRing that
+    other processes attach to by its name, reading it with SharedFrameSource.
+
+    Sending SIGUSR1 to the daemon profiles the next frames (see Profiler).
+"""
+
+import argparse
+import signal
+import threading
+import utils
+import AWR1843 as awr
+from FrameBus import FrameBus
+from Pipeline import RadarSource, Decoder, CouplingFilter, SectorBinner, AudioSink
+from IpcPublisher import IpcPublisher
+from RoiFilter import RoiFilter
+from SharedFrame import SharedFrameRing
+from Profiler import profiler
+from Watchdog import SensorWatchdog
+
+parser = argparse.ArgumentParser(description="Headless RasPAS daemon")
+parser.add_argument("--config", default="Radar_config_v3.cfg", help="radar configuration file")
+parser.add_argument("--socket", default="/tmp/raspas.sock", help="path of the UNIX domain socket")
+parser.add_argument("--sectors", type=int, default=3, help="number of azimuth sectors")
+parser.add_argument("--levels", type=int, default=8, help="number of levels of each sector")
+parser.add_argument("--points", action="store_true", help="append the points to each message")
+parser.add_argument("--min-snr", type=float, help="minimum SNR of the points in dB")
+parser.add_argument("--voxel-size", type=float, help="edge of the voxels merging the points in meters")
+parser.add_argument("--audio", action="store_true", help="also play the warning notes")
+parser.add_argument("--shm", metavar="NAME", help="also write the points into the shared memory ring NAME")
+parser.add_argument(
+    "--max-points", type=int, default=1024, help="maximum number of points per frame (size of the buffers)"
+)
+parser.add_argument("--profile", type=int, metavar="N", help="profile the first N frames")
+parser.add_argument("--profile-file", default="raspas-profile", help="path of the profile files, without extension")
+args = parser.parse_args()
+
+if args.levels < 3:
+    raise ValueError("n_levels should be greater than 3")
+if args.sectors < 1:
+    raise ValueError("n_sectors should be at least 1")
+
+# Configure serial ports and parse radar configuration parameters
+CLIport, Dataport = awr.serialConfig(args.config)
+configParameters = awr.parseConfigFile(configFileName=args.config, numRxAnt=1, numTxAnt=1)
+thetamin, thetamax, maxdistance = awr.parseFovConfig(args.config)
+r_distances = utils.level_edges(maxdistance, args.levels)
+theta_grids = utils.sector_edges(thetamin, thetamax, args.sectors)
+
+# Other processes attach to the ring by its name (see SharedFrameSource)
+ring = SharedFrameRing(name=args.shm, create=True, max_points=args.max_points) if args.shm else None
+
+# Build the pipeline without any display sink
+bus = FrameBus()
+stages = [
+    RadarSource(bus, Dataport),
+    Decoder(
+        bus,
+        configParameters,
+        ring=ring,
+        roi=RoiFilter(
+            min_azimuth=thetamin,
+            max_azimuth=thetamax,
+            min_snr=args.min_snr,
+            voxel_size=args.voxel_size,
+            max_points=args.max_points,
+        ),
+    ),
+    CouplingFilter(bus, max_points=args.max_points),
+    SectorBinner(bus, theta_grids, r_distances, max_points=args.max_points),
+    IpcPublisher(bus, args.socket, send_points=args.points),
+]
+# Report the sensor lost and recover it when it stops sending frames
+config = [line.rstrip("\r\n") for line in open(args.config)]
+watchdog = SensorWatchdog(bus, CLIport, Dataport, config, configParameters)
+stages.append(watchdog)
+
+track = None
+if args.audio:
+    # Import the sound modules only when needed, so the daemon runs on boards without audio
+    import pygame
+
+    pygame.init()
+    from Note import Note
+    from Track import Track
+    from AudioEngine import AudioEngine
+
+    beat = 60 / 360
+    notes = [Note.rest(beat), Note("c5", beat), Note("e5", beat), Note("g5", beat), Note("c4", beat)]
+    engine = AudioEngine()
+    engine.start()
+    track = Track(notes, engine=engine)
+    track.play()
+    stages.append(AudioSink(bus, track))
+
+profile_frames = args.profile or 100
+signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.start(profile_frames, args.profile_file))
+if args.profile:
+    profiler.start(profile_frames, args.profile_file)
+for stage in stages:
+    stage.start()
+
+# Run until SIGINT or SIGTERM is received
+stop_event = threading.Event()
+signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+while not stop_event.is_set():
+    stop_event.wait(1)
+
+for stage in stages:
+    stage.stop()
+try:
+    watchdog.CLIport.write(("sensorStop\n").encode())
+except OSError:
+    pass
+watchdog.close_ports()
+if ring is not None:
+    ring.close()
+if track is not None:
+    track.stop()
+    engine.stop()
+    pygame.quit()
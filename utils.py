@@ -44,16 +44,16 @@ def rad_to_deg(rad):
     Convert radians to degrees.
 
     Parameters:
-        rad (float): The angle in radians.
+        rad (float or ndarray): The angle(s) in radians.
 
     Returns:
-        float: The angle converted to degrees.
+        float or ndarray: The angle(s) converted to degrees, with the dtype of rad for float arrays.
 
     """
-    deg = rad * 180 / np.pi
-    if deg > 180:
-        deg = 360 - deg
-    return deg
+    deg = rad * (180 / np.pi)
+    deg = np.where(deg > 180, 360 - deg, deg)
+    # Return a scalar for a scalar angle
+    return deg[()]
 
 
 def deg_to_rad(deg):
@@ -61,14 +61,195 @@ def deg_to_rad(deg):
     Convert degrees to radians.
 
     Parameters:
-        deg (float): The angle in degrees.
+        deg (float or ndarray): The angle(s) in degrees.
 
     Returns:
-        float: The angle converted to radians.
+        float or ndarray: The angle(s) converted to radians, with the dtype of deg for float arrays.
 
     """
-    rad = deg * np.pi / 180
-    if rad > np.pi:
-        rad = 2 * np.pi - rad
-    return rad
-    
\ No newline at end of file
+    rad = deg * (np.pi / 180)
+    rad = np.where(rad > np.pi, 2 * np.pi - rad, rad)
+    # Return a scalar for a scalar angle
+    return rad[()]
+
+
+def cartesian_to_display_polar(x, y, offset=0.1, range_bias=0.01, out=None, work=None):
+    """
+    Convert the Cartesian coordinates of the detected points to the polar coordinates of the graphical
+    representation, removing the points resulting from the noise coupling between antennas.
+
+    The range is shortened by offset, the points with a negative range are removed and range_bias is
+    added to the others. The angle is shifted by -90 degrees, so 0 points straight behind the car.
+    Every step is done in place, in the dtype of the coordinates (float32 for the radar data).
+
+    Parameters:
+        x (ndarray): The x-coordinates of the points.
+        y (ndarray): The y-coordinates of the points.
+        offset (float): Points closer than this distance (in meters) are removed.
+        range_bias (float): Offset added to the range of the remaining points (in meters).
+        out (tuple): Optional (r, theta, keep) buffers holding at least len(x) elements, the two first
+                     of the dtype of the coordinates and the last one boolean.
+        work (tuple): Optional (values, index) work buffers of the size of out, the first one like r and
+                      the second one of integers (np.intp), with which no memory is allocated per point.
+
+    Returns:
+        tuple: A tuple containing:
+            - r (ndarray): The ranges of the remaining points in meters.
+            - theta (ndarray): The angles of the remaining points in degrees.
+            - keep (ndarray): Whether each point was kept, e.g. to filter its other attributes.
+
+    """
+    n = len(x)
+    if out is None:
+        dtype = np.result_type(x, y, np.float16)
+        out = (np.empty(n, dtype), np.empty(n, dtype), np.empty(n, bool))
+    keep = out[2][:n]
+    # Compute the values of every point in the work buffer, or in place in the output buffers
+    values = work[0][:n] if work is not None else out[0][:n]
+
+    # Removal of points resulted from the noise coupling between antennas
+    np.hypot(x, y, out=values)
+    values -= offset
+    np.greater_equal(values, 0, out=keep)
+    r = compress(keep, values, out[0], work[1] if work is not None else None)
+    r += range_bias
+
+    # Convert theta from radians to degrees and adjust it by -90 degrees (to align with graphical representation).
+    # arctan2 is within [-180, 180] degrees, so the angle never exceeds 180 degrees and needs no wrapping.
+    values = work[0][:n] if work is not None else out[1][:n]
+    np.arctan2(y, x, out=values)
+    values -= np.pi / 2
+    values *= 180 / np.pi
+    theta = compress(keep, values, out[1], work[1] if work is not None else None)
+    return r, theta, keep
+
+
+def compress(keep, values, out, index=None):
+    """
+    Copy the values where keep is True to the front of a buffer, like np.compress.
+
+    Parameters:
+        keep (ndarray): Whether to keep each value (left unchanged).
+        values (ndarray): The values, which may be the front of out itself.
+        out (ndarray): The buffer receiving the values kept, holding at least len(values) elements.
+        index (ndarray): Optional integer (np.intp) work buffer holding at least len(values) elements,
+                         with which no memory is allocated per value. values must not overlap out then.
+
+    Returns:
+        ndarray: The values kept, at the front of out.
+
+    """
+    n = len(values)
+    if index is None:
+        count = np.count_nonzero(keep)
+        return np.compress(keep, values, out=out[:count])
+
+    # Destination of each value kept, from the running count of the values kept
+    index = index[:n]
+    np.copyto(index, keep)
+    np.add.accumulate(index, out=index)
+    count = int(index[-1]) if n else 0
+    index -= 1
+    # The values removed are all written to the last element of out, past the values kept
+    np.logical_not(keep, out=keep)
+    np.copyto(index, len(out) - 1, where=keep)
+    np.logical_not(keep, out=keep)
+    out.put(index, values)
+    return out[:count]
+
+
+def sector_edges(thetamin, thetamax, n_sectors=3):
+    """
+    Split the azimuth field of view into sectors of equal width.
+
+    Parameters:
+        thetamin (float): The minimum azimuth angle in degrees.
+        thetamax (float): The maximum azimuth angle in degrees.
+        n_sectors (int): The number of sectors.
+
+    Returns:
+        list: The n_sectors + 1 edges of the sectors in degrees.
+
+    """
+    width = (thetamax - thetamin) / n_sectors
+    return [thetamin + i * width for i in range(n_sectors)] + [thetamax]
+
+
+def level_edges(maxdistance, n_levels):
+    """
+    Split the range up to the maximum distance into levels of equal height.
+
+    Parameters:
+        maxdistance (float): The maximum distance in meters.
+        n_levels (int): The number of levels.
+
+    Returns:
+        list: The n_levels + 1 edges of the levels in meters.
+
+    """
+    height = maxdistance / n_levels
+    return [i * height for i in range(0, n_levels + 1)]
+
+
+def sector_index(theta, theta_grids, out=None, mask=None):
+    """
+    Find the sector of each angle.
+
+    Parameters:
+        theta (ndarray): The angles in degrees.
+        theta_grids (list): The edges of the sectors in degrees.
+        out (ndarray): Optional int8 buffer holding at least len(theta) elements, receiving the sectors
+                       without allocating memory per angle (for at most 126 sectors).
+        mask (ndarray): Optional boolean work buffer of the same size as out.
+
+    Returns:
+        ndarray: The sector of each angle, -1 or n_sectors for angles outside the sectors.
+
+    """
+    if out is None:
+        # An angle on the edge between two sectors belongs to the lower one
+        sectors = np.searchsorted(theta_grids, theta, side="left") - 1
+        sectors[theta == theta_grids[0]] = 0
+        return sectors
+
+    # Count the edges below each angle, one comparison per edge, in the buffers
+    # (the mask is added as int8, since adding it as bool would need a cast through a temporary buffer)
+    n = len(theta)
+    out = out[:n]
+    mask = mask[:n] if mask is not None else np.empty(n, dtype=bool)
+    count = mask.view(np.int8)
+    out.fill(-1)
+    np.greater_equal(theta, theta_grids[0], out=mask)
+    out += count
+    for edge in theta_grids[1:]:
+        np.greater(theta, edge, out=mask)
+        out += count
+    return out
+
+
+def sector_reduce(values, sectors, n_sectors, initial, out, reduce=np.min, mask=None, valid=None):
+    """
+    Compute the minimum (or maximum) value of each sector without allocating memory per point.
+
+    Parameters:
+        values (ndarray): The value of each point.
+        sectors (ndarray): The sector of each point, see sector_index.
+        n_sectors (int): The number of sectors.
+        initial (float): The value of the sectors without any point.
+        out (ndarray): The buffer receiving the value of each sector.
+        reduce (function): np.min or np.max.
+        mask (ndarray): Optional boolean work buffer holding at least len(values) elements.
+        valid (ndarray): Optional mask of the points to take into account.
+
+    Returns:
+        ndarray: out.
+
+    """
+    n = len(values)
+    mask = mask[:n] if mask is not None else np.empty(n, dtype=bool)
+    for i in range(n_sectors):
+        np.equal(sectors, i, out=mask)
+        if valid is not None:
+            mask &= valid
+        out[i] = reduce(values, where=mask, initial=initial)
+    return out